@@ -0,0 +1,101 @@
+"""Single-flight de-duplication and idempotent replay of triage requests
+
+Client retries and webhook double-deliveries send the same ticket again
+within milliseconds. Requests are keyed by ticket_id when the client sets
+one, else by a hash of (user_id, query, pipeline_mode, token_budget):
+
+- a duplicate of a request still in flight waits for that request's graph
+  run and gets the same response (single flight), under its own ticket_id
+- a duplicate ticket_id arriving within TRIAGE_IDEMPOTENCY_TTL_S of a
+  successful triage gets the stored response without running the graph
+
+Failures are not stored, so a retry after an error runs again.
+"""
+import asyncio
+import hashlib
+import os
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from pydantic import BaseModel
+
+from src.cache import TTLCache, MISSING
+from src.metrics import DEDUPLICATED
+
+TRIAGE_DEDUP_ENABLED = os.getenv("TRIAGE_DEDUP_ENABLED", "true").lower() == "true"
+TRIAGE_IDEMPOTENCY_TTL_S = float(os.getenv("TRIAGE_IDEMPOTENCY_TTL_S", "300"))
+TRIAGE_IDEMPOTENCY_SIZE = int(os.getenv("TRIAGE_IDEMPOTENCY_SIZE", "10000"))
+
+def request_key(ticket: BaseModel) -> Hashable:
+    """ticket_id if the client set one, else a hash of what the ticket says."""
+    if ticket.ticket_id:
+        return ("ticket_id", ticket.ticket_id)
+    digest = hashlib.sha256(
+        "\x00".join(map(str, (ticket.user_id, ticket.query, ticket.pipeline_mode, ticket.token_budget))).encode()
+    )
+    return ("content", digest.hexdigest())
+
+class TriageDeduplicator:
+    """
+    Coalesces identical in-flight triage requests onto one execution and
+    replays finished results by ticket_id.
+    
+    The shared execution runs in its own task, so a caller that goes away
+    (or times out) does not cancel it for the others.
+    """
+    
+    def __init__(self, ttl: float = TRIAGE_IDEMPOTENCY_TTL_S, maxsize: int = TRIAGE_IDEMPOTENCY_SIZE,
+                 enabled: bool = TRIAGE_DEDUP_ENABLED):
+        self.enabled = enabled
+        self.results = TTLCache("idempotency", maxsize=maxsize, ttl=ttl)
+        self.coalesced = 0
+        self.replayed = 0
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+    
+    async def run(self, ticket: BaseModel, execute: Callable[[], Awaitable[BaseModel]],
+                  ticket_id: Optional[str] = None) -> BaseModel:
+        """
+        Response for ticket: stored, shared with an identical request in
+        flight, or from execute(). With ticket_id, a response shared from
+        another request is returned as a copy carrying this caller's ID.
+        """
+        if not self.enabled:
+            return await execute()
+    
+        key = request_key(ticket)
+        stored = self.results.get(key)
+        if stored is not MISSING:
+            self.replayed += 1
+            DEDUPLICATED.labels("completed").inc()
+            return stored
+    
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            DEDUPLICATED.labels("inflight").inc()
+        else:
+            task = self._inflight[key] = asyncio.create_task(execute())
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # shield: cancelling one waiter must not cancel the shared run
+        result = await asyncio.shield(task)
+        if ticket_id is not None and result.ticket_id != ticket_id:
+            # Matched on content: the shared response has the first request's ID
+            return result.model_copy(update={"ticket_id": ticket_id})
+        return result
+    
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        # Only client-chosen ticket IDs are replayed later; content keys
+        # just coalesce requests that overlap in time
+        if key[0] == "ticket_id":
+            self.results.set(key, task.result())
+    
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._inflight),
+            "coalesced": self.coalesced,
+            "replayed": self.replayed,
+            "stored_results": len(self.results)
+        }
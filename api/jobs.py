@@ -0,0 +1,201 @@
+"""Asynchronous triage jobs: bounded queue drained by a pool of workers
+
+POST /triage/jobs puts tickets on an asyncio.Queue and returns job IDs
+at once; JOB_WORKERS worker tasks take jobs off the queue and run them
+through the agent graph. The queue holds at most JOB_QUEUE_SIZE jobs, so
+a burst larger than that is refused (429) instead of growing memory or
+holding connections open.
+
+Queued and running jobs are kept until they finish; finished jobs stay
+pollable for JOB_RESULT_TTL_S seconds (at most JOB_RESULT_MAX finished
+jobs). A job with a callback_url has its final status POSTed there from
+a separate task, so a slow or broken webhook never holds up a worker.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+from pydantic import BaseModel
+
+from src.cache import TTLCache, MISSING
+from src.log import get_logger
+from src.metrics import JOB_QUEUE_DEPTH, JOB_WAIT, JOBS
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "20"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "1000"))
+JOB_RESULT_TTL_S = float(os.getenv("JOB_RESULT_TTL_S", "3600"))
+JOB_RESULT_MAX = int(os.getenv("JOB_RESULT_MAX", "100000"))
+JOB_CALLBACK_TIMEOUT_S = float(os.getenv("JOB_CALLBACK_TIMEOUT_S", "5"))
+
+logger = get_logger(__name__)
+
+class QueueFull(Exception):
+    """Not enough room in the job queue for the submitted tickets."""
+
+class Job:
+    """One ticket's trip through the queue."""
+    
+    def __init__(self, ticket: BaseModel, callback_url: Optional[str] = None,
+                 prefetched_context: Optional[Dict] = None):
+        self.job_id = f"job_{uuid.uuid4().hex[:12]}"
+        self.ticket = ticket
+        # Assigned now so it can be reported before the job runs. The
+        # ticket itself keeps ticket_id unset, so de-duplication still
+        # keys it by content rather than by this fresh ID.
+        self.ticket_id = ticket.ticket_id or f"ticket_{uuid.uuid4().hex[:8]}"
+        self.callback_url = callback_url
+        # CRM context bulk-fetched at submit time for this ticket's user
+        self.prefetched_context = prefetched_context
+        self.status = "queued"
+        self.submitted_at = datetime.utcnow().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.result: Optional[BaseModel] = None
+        self.error: Optional[str] = None
+        self._enqueued = time.perf_counter()
+    
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "ticket_id": self.ticket_id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result.model_dump() if self.result is not None else None,
+            "error": self.error
+        }
+
+class JobQueue:
+    """
+    Bounded job queue and the worker pool that drains it.
+    
+    handler runs one ticket (the same coroutine POST /triage uses), given
+    the ticket, its prefetched CRM context and the job's ticket ID, and
+    returns its response model; an exception marks the job failed.
+    """
+    
+    def __init__(self, handler: Callable[[BaseModel, Optional[Dict], str], Awaitable[BaseModel]], workers: int = JOB_WORKERS,
+                 maxsize: int = JOB_QUEUE_SIZE, result_ttl: float = JOB_RESULT_TTL_S,
+                 result_max: int = JOB_RESULT_MAX):
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._callbacks: Set[asyncio.Task] = set()
+        self._active: Dict[str, Job] = {}
+        self._finished = TTLCache("jobs", maxsize=result_max, ttl=result_ttl)
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    async def start(self):
+        """Create the queue and start the workers (on the running event loop)."""
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._client = httpx.AsyncClient(timeout=JOB_CALLBACK_TIMEOUT_S)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"triage-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info("Job workers started", extra={"workers": self.workers, "queue_size": self.maxsize})
+    
+    async def stop(self):
+        """Cancel the workers and pending callbacks; jobs still queued are dropped."""
+        tasks = self._tasks + list(self._callbacks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._callbacks.clear()
+        if self._client is not None:
+            await self._client.aclose()
+    
+    def submit(self, tickets: List[BaseModel], callback_url: Optional[str] = None,
+               prefetched: Optional[Dict[str, Dict]] = None) -> List[Job]:
+        """
+        Queue one job per ticket, all or none: raises QueueFull if the
+        queue can't take every ticket, so a bulk import is never half queued.
+        prefetched maps user_id to CRM context fetched for the whole submission.
+        """
+        self.check_room(len(tickets))
+    
+        prefetched = prefetched or {}
+        jobs = [Job(ticket, callback_url, prefetched.get(ticket.user_id)) for ticket in tickets]
+        for job in jobs:
+            self._active[job.job_id] = job
+            self._queue.put_nowait(job)
+        JOBS.labels("queued").inc(len(jobs))
+        JOB_QUEUE_DEPTH.set(self._queue.qsize())
+        return jobs
+    
+    def check_room(self, count: int):
+        """Raise QueueFull unless count more jobs fit in the queue."""
+        if self._queue is None:
+            raise RuntimeError("JobQueue.start() has not been called")
+        if self.maxsize - self._queue.qsize() < count:
+            raise QueueFull(f"Job queue has room for {self.maxsize - self._queue.qsize()} of {count} tickets")
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._active.get(job_id)
+        if job is not None:
+            return job
+        job = self._finished.get(job_id)
+        return None if job is MISSING else job
+    
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.maxsize,
+            "running": sum(job.status == "running" for job in self._active.values()),
+            "finished_retained": len(self._finished)
+        }
+    
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            JOB_QUEUE_DEPTH.set(self._queue.qsize())
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # One bad job must never take a worker down with it
+                logger.exception("Job worker error", extra={"job_id": job.job_id})
+            finally:
+                self._queue.task_done()
+    
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = datetime.utcnow().isoformat()
+        JOB_WAIT.observe(time.perf_counter() - job._enqueued)
+        try:
+            job.result = await self.handler(job.ticket, job.prefetched_context, job.ticket_id)
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # HTTPException from the handler carries the message in detail
+            job.error = getattr(e, "detail", None) or str(e)
+            job.status = "failed"
+        job.finished_at = datetime.utcnow().isoformat()
+        JOBS.labels(job.status).inc()
+    
+        self._finished.set(job.job_id, job)
+        self._active.pop(job.job_id, None)
+    
+        if job.callback_url:
+            task = asyncio.create_task(self._callback(job))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callbacks.discard)
+    
+    async def _callback(self, job: Job):
+        try:
+            response = await self._client.post(job.callback_url, json=job.to_dict())
+            response.raise_for_status()
+        except Exception as e:
+            # Bad URLs (e.g. an invalid port) raise more than httpx.HTTPError
+            logger.warning("Job callback failed: %r", e, extra={"job_id": job.job_id, "callback_url": job.callback_url})
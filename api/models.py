@@ -1,6 +1,6 @@
 """API request and response models"""
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from pydantic import AnyHttpUrl, BaseModel, Field
+from typing import Optional, Dict, Any, List, Literal
 from datetime import datetime
 
 class TicketRequest(BaseModel):
@@ -10,6 +10,15 @@ class TicketRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=5000, description="The support ticket text")
     user_email: Optional[str] = Field(None, description="User's email address")
     user_name: Optional[str] = Field(None, description="User's name")
+    pipeline_mode: Optional[Literal["standard", "fused"]] = Field(
+        None,
+        description="'standard' (classify/extract/route as separate LLM calls) or 'fused' (one LLM call). Defaults to the PIPELINE_MODE env var"
+    )
+    token_budget: Optional[int] = Field(
+        None,
+        ge=0,
+        description="Max LLM tokens for this ticket; once spent, remaining nodes use their non-LLM path. Defaults to TOKEN_BUDGET_PER_REQUEST (0 = unlimited)"
+    )
     
     class Config:
         json_schema_extra = {
@@ -33,15 +42,35 @@ class TicketResponse(BaseModel):
     
     # Extracted entities
     entities: Dict[str, Any] = Field(default_factory=dict, description="Extracted entities from the query")
+    entity_extraction_path: Optional[str] = Field(
+        None,
+        description="How entities were extracted: rules, rules+llm, llm or fused"
+    )
     
     # Routing decision
     action: str = Field(..., description="Action to take: auto_resolve or escalate")
     team: Optional[str] = Field(None, description="Team to escalate to (if action=escalate)")
     priority: str = Field(..., description="Priority: low, medium, high, critical")
+    routing_path: Optional[str] = Field(
+        None,
+        description="How the routing decision was made: policy, llm, fallback, budget or fused"
+    )
     
     # Metadata
     timestamp: str
     processing_time_ms: float = Field(..., description="Time taken to process in milliseconds")
+    pipeline_mode: str = Field("standard", description="Pipeline mode used: standard or fused")
+    cache_hits: List[str] = Field(default_factory=list, description="Steps answered from the triage cache")
+    node_timings_ms: Dict[str, float] = Field(default_factory=dict, description="Wall time per graph node in milliseconds")
+    total_tokens: int = Field(0, description="LLM tokens used for this ticket (input + output)")
+    token_usage: Dict[str, Dict[str, int]] = Field(
+        default_factory=dict,
+        description="Input and output tokens per LLM node"
+    )
+    budget_fallbacks: List[str] = Field(
+        default_factory=list,
+        description="Nodes that skipped their LLM call because the token budget was spent"
+    )
     
     # Observability
     trace_url: Optional[str] = Field(None, description="LangSmith trace URL for debugging")
@@ -55,15 +84,50 @@ class TicketResponse(BaseModel):
                 "confidence": 0.95,
                 "reasoning": "Clear billing inquiry about unexpected charge",
                 "entities": {"amount": 199.0, "order_id": None},
+                "entity_extraction_path": "rules",
                 "action": "escalate",
                 "team": "billing_tier1",
                 "priority": "medium",
+                "routing_path": "policy",
                 "timestamp": "2024-12-28T10:30:00Z",
                 "processing_time_ms": 1250.5,
+                "pipeline_mode": "standard",
+                "total_tokens": 412,
+                "token_usage": {"classifier": {"input_tokens": 356, "output_tokens": 56}},
                 "trace_url": "https://smith.langchain.com/..."
             }
         }
 
+class JobSubmission(BaseModel):
+    """Tickets to triage asynchronously"""
+    tickets: List[TicketRequest] = Field(..., min_length=1, description="Tickets to queue, one job each")
+    callback_url: Optional[AnyHttpUrl] = Field(
+        None,
+        description="http(s) URL the final job status is POSTed to when each job finishes"
+    )
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "tickets": [
+                    {"user_id": "user_1234", "query": "Why was I charged $199 when my plan is $99?"},
+                    {"user_id": "user_5678", "query": "Dashboard won't load"}
+                ],
+                "callback_url": "https://helpdesk.example.com/hooks/triage"
+            }
+        }
+
+class JobStatus(BaseModel):
+    """Status of one asynchronous triage job"""
+    job_id: str
+    ticket_id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    submitted_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Optional[TicketResponse] = Field(None, description="Triage result, once succeeded")
+    error: Optional[str] = Field(None, description="Why the job failed")
+
 class HealthResponse(BaseModel):
     """Health check response"""
     status: str
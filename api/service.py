@@ -1,32 +1,58 @@
 """FastAPI service for support triage agent"""
+import asyncio
+import json
 import os
 import time
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
 from contextvars import ContextVar
 
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from langsmith import Client
 from langsmith.run_helpers import get_current_run_tree
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from api.models import TicketRequest, TicketResponse, HealthResponse, ErrorResponse
-from src.agent.graph import agent
+from api.dedup import TriageDeduplicator
+from api.jobs import JobQueue, QueueFull
+from api.models import TicketRequest, TicketResponse, HealthResponse, ErrorResponse, JobSubmission, JobStatus
+from src.agent.graph import get_agent, DEFAULT_PIPELINE_MODE
 from src.agent.state import TicketState
+from src.agent.classifier import get_cascade_stats
+from src.agent.entity_extractor import get_extraction_stats
+from src.agent.router import get_routing_stats
+from src.agent.model_tiers import get_escalation_stats
+from src.agent.triage_cache import get_cache_stats
+from src.agent.context_retriever import aprefetch_crm_context, aprefetch_faqs
+from src.tools.crm_cache import crm_cache
+from src.log import get_logger, ticket_id_var
+from src.analysis.trace_files import TraceExporter, ticket_records
+from src.metrics import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS
 
 # Load environment variables
 load_dotenv()
 
+logger = get_logger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Job workers run on the server's event loop
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Support Triage Agent API",
     description="AI-powered customer support ticket classification and routing with full observability",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -41,6 +67,33 @@ app.add_middleware(
 # Initialize LangSmith client
 langsmith_client = Client() if os.getenv("LANGCHAIN_API_KEY") else None
 
+# Per-node timing records for offline analysis (python -m
+# src.analysis.trace_analyzer --files ...); unset = not written
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+trace_exporter = TraceExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None
+
+# Batch limits
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "20"))
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    """Request latency, in-flight count and status codes per route."""
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (/cache/crm/{user_id}), not the raw path
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        HTTP_LATENCY.labels(path).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(path, request.method, str(status)).inc()
+        HTTP_IN_FLIGHT.dec()
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -103,114 +156,317 @@ async def triage_ticket(ticket: TicketRequest):
     4. Makes routing decision (auto-resolve vs escalate)
     5. Returns complete triage results
     
+    With pipeline_mode="fused", steps 1, 2 and 4 are done by a single LLM
+    call after context retrieval.
+    
     All processing is automatically traced in LangSmith for observability.
     """
+    return await _run_triage(ticket)
+
+def _initial_state(ticket: TicketRequest, ticket_id: str, prefetched_context: Optional[dict] = None) -> TicketState:
+    return {
+        "ticket_id": ticket_id,
+        "user_id": ticket.user_id,
+        "query": ticket.query,
+        "user_email": ticket.user_email,
+        "user_name": ticket.user_name,
+        "intent": None,
+        "confidence": None,
+        "reasoning": None,
+        "entities": None,
+        "extraction_path": None,
+        "context": None,
+        "prefetched_context": prefetched_context,
+        "action": None,
+        "team": None,
+        "priority": None,
+        "routing_path": None,
+        "response": None,
+        "timestamp": datetime.utcnow().isoformat(),
+        "model_used": "",
+        "total_tokens": 0,
+        "token_usage": {},
+        "token_budget": ticket.token_budget,
+        "budget_fallbacks": [],
+        "cache_hits": [],
+        "node_timings": {}
+    }
+
+def _graph_config(ticket: TicketRequest, ticket_id: str, pipeline_mode: str) -> dict:
+    """Run metadata and tags for the agent graph"""
+    return {
+        "metadata": {
+            "ticket_id": ticket_id,
+            "user_id": ticket.user_id,
+            "api_version": "1.0.0",
+            "pipeline_mode": pipeline_mode
+        },
+        "tags": ["api", "production"]
+    }
+
+def _current_trace_url() -> Optional[str]:
+    try:
+        run_tree = get_current_run_tree()
+        if run_tree and run_tree.id:
+            return get_trace_url(str(run_tree.id))
+    except:
+        # If we can't get run tree, that's okay
+        pass
+    return None
+
+def _build_response(final_state: dict, pipeline_mode: str, start_time: float,
+                    trace_url: Optional[str] = None) -> TicketResponse:
+    """TicketResponse from the graph's final state"""
+    return TicketResponse(
+        ticket_id=final_state["ticket_id"],
+        user_id=final_state["user_id"],
+        intent=final_state["intent"],
+        confidence=final_state["confidence"],
+        reasoning=final_state["reasoning"],
+        entities=final_state.get("entities", {}),
+        entity_extraction_path=final_state.get("extraction_path"),
+        action=final_state["action"],
+        team=final_state.get("team"),
+        priority=final_state["priority"],
+        routing_path=final_state.get("routing_path"),
+        timestamp=final_state["timestamp"],
+        processing_time_ms=(time.time() - start_time) * 1000,
+        pipeline_mode=pipeline_mode,
+        cache_hits=final_state.get("cache_hits") or [],
+        node_timings_ms=final_state.get("node_timings") or {},
+        total_tokens=final_state.get("total_tokens") or 0,
+        token_usage=final_state.get("token_usage") or {},
+        budget_fallbacks=final_state.get("budget_fallbacks") or [],
+        trace_url=trace_url
+    )
+
+# token_usage is keyed by the LLM component, node timings by graph node
+_GRAPH_NODES = {"classifier": "classify", "entity_extractor": "extract", "router": "route"}
+
+def _export_trace(ticket: TicketRequest, ticket_id: str, pipeline_mode: str, start_time: float,
+                  response: Optional[TicketResponse] = None, error: Optional[Exception] = None):
+    if not trace_exporter:
+        return
+    if response is not None:
+        trace_exporter.export(ticket_records(
+            ticket_id, start_time, response.processing_time_ms / 1000, response.node_timings_ms,
+            node_tokens={_GRAPH_NODES.get(name, name): usage for name, usage in response.token_usage.items()},
+            pipeline_mode=pipeline_mode, user_id=ticket.user_id
+        ))
+    else:
+        trace_exporter.export(ticket_records(
+            ticket_id, start_time, time.time() - start_time, {},
+            error=str(error), pipeline_mode=pipeline_mode, user_id=ticket.user_id
+        ))
+
+# Coalesces duplicate tickets in flight and replays recent results by ticket_id
+deduplicator = TriageDeduplicator()
+
+async def _run_triage(ticket: TicketRequest, prefetched_context: Optional[dict] = None,
+                      ticket_id: Optional[str] = None) -> TicketResponse:
+    """
+    Triage one ticket. Batch callers pass the CRM context they already
+    bulk-fetched for this user; jobs pass the ticket ID they reported
+    when the client didn't set one.
     
+    A duplicate of a request still in flight (same client ticket_id, or
+    same user, query and options) shares its graph run, and gets its
+    response under its own ticket ID; a ticket_id triaged in the last
+    TRIAGE_IDEMPOTENCY_TTL_S seconds gets the stored response.
+    """
+    # Generate ticket ID if not provided
+    ticket_id = ticket.ticket_id or ticket_id or f"ticket_{uuid.uuid4().hex[:8]}"
+    return await deduplicator.run(
+        ticket, lambda: _execute_triage(ticket, prefetched_context, ticket_id), ticket_id
+    )
+
+async def _execute_triage(ticket: TicketRequest, prefetched_context: Optional[dict] = None,
+                          ticket_id: Optional[str] = None) -> TicketResponse:
+    """Run one ticket through the agent graph."""
     start_time = time.time()
     
     # Generate ticket ID if not provided
-    ticket_id = ticket.ticket_id or f"ticket_{uuid.uuid4().hex[:8]}"
+    ticket_id = ticket.ticket_id or ticket_id or f"ticket_{uuid.uuid4().hex[:8]}"
+    pipeline_mode = ticket.pipeline_mode or DEFAULT_PIPELINE_MODE
+    # Each request (and each batch item) runs in its own task, so this
+    # only tags this ticket's log records
+    ticket_id_var.set(ticket_id)
     
     try:
-        # Create initial state
-        initial_state: TicketState = {
-            "ticket_id": ticket_id,
-            "user_id": ticket.user_id,
-            "query": ticket.query,
-            "user_email": ticket.user_email,
-            "user_name": ticket.user_name,
-            "intent": None,
-            "confidence": None,
-            "reasoning": None,
-            "entities": None,
-            "context": None,
-            "action": None,
-            "team": None,
-            "priority": None,
-            "response": None,
-            "timestamp": datetime.utcnow().isoformat(),
-            "model_used": "",
-            "total_tokens": 0
-        }
-        
-        # Run the agent graph with metadata
-        config = {
-            "metadata": {
-                "ticket_id": ticket_id,
-                "user_id": ticket.user_id,
-                "api_version": "1.0.0"
-            },
-            "tags": ["api", "production"]
-        }
-        
-        final_state = agent.invoke(initial_state, config=config)
+        initial_state = _initial_state(ticket, ticket_id, prefetched_context)
+        config = _graph_config(ticket, ticket_id, pipeline_mode)
         
-        # Try to get the trace URL
-        trace_url = None
-        try:
-            run_tree = get_current_run_tree()
-            if run_tree and run_tree.id:
-                trace_url = get_trace_url(str(run_tree.id))
-        except:
-            # If we can't get run tree, that's okay
-            pass
+        # ainvoke runs the async node versions, so the event loop stays
+        # free to serve other requests while this ticket waits on I/O
+        final_state = await get_agent(pipeline_mode).ainvoke(initial_state, config=config)
         
-        # Calculate processing time
-        processing_time_ms = (time.time() - start_time) * 1000
-        
-        # Build response
-        response = TicketResponse(
-            ticket_id=final_state["ticket_id"],
-            user_id=final_state["user_id"],
-            intent=final_state["intent"],
-            confidence=final_state["confidence"],
-            reasoning=final_state["reasoning"],
-            entities=final_state.get("entities", {}),
-            action=final_state["action"],
-            team=final_state.get("team"),
-            priority=final_state["priority"],
-            timestamp=final_state["timestamp"],
-            processing_time_ms=processing_time_ms,
-            trace_url=trace_url
-        )
+        response = _build_response(final_state, pipeline_mode, start_time, _current_trace_url())
+        _export_trace(ticket, ticket_id, pipeline_mode, start_time, response=response)
         
         return response
         
     except Exception as e:
         # Log error and return 500
-        print(f"Error processing ticket {ticket_id}: {e}")
+        logger.exception("Error processing ticket: %s", e)
+        _export_trace(ticket, ticket_id, pipeline_mode, start_time, error=e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process ticket: {str(e)}"
         )
 
+# Async jobs run the same coroutine as POST /triage
+job_queue = JobQueue(_run_triage)
+
+# State keys streamed to clients, under their TicketResponse names
+_STREAMED_FIELDS = {
+    "intent": "intent",
+    "confidence": "confidence",
+    "reasoning": "reasoning",
+    "entities": "entities",
+    "extraction_path": "entity_extraction_path",
+    "action": "action",
+    "team": "team",
+    "priority": "priority",
+    "routing_path": "routing_path",
+    "cache_hits": "cache_hits",
+    "token_usage": "token_usage",
+    "budget_fallbacks": "budget_fallbacks"
+}
+
+def _context_summary(context: dict) -> dict:
+    """What the UI needs from retrieved context, without the raw CRM records"""
+    return {
+        "user_tier": context.get("user_profile", {}).get("tier"),
+        "previous_tickets": len(context.get("ticket_history", [])),
+        "recent_orders": len(context.get("orders", [])),
+        "relevant_faqs": [faq.get("question") for faq in context.get("relevant_faqs", [])],
+        "missing_sources": context.get("missing_sources", [])
+    }
+
+def _node_event(node: str, update: dict) -> dict:
+    """One node's partial result, as sent in its SSE event"""
+    event = {
+        _STREAMED_FIELDS[key]: value
+        for key, value in update.items()
+        if key in _STREAMED_FIELDS
+    }
+    if update.get("context") is not None:
+        event["context"] = _context_summary(update["context"])
+    event["node_time_ms"] = (update.get("node_timings") or {}).get(node)
+    return event
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _stream_triage(ticket: TicketRequest) -> AsyncIterator[str]:
+    """
+    Run one ticket through the agent graph, yielding an SSE event as each
+    node finishes and the full TicketResponse at the end.
+    """
+    start_time = time.time()
+    ticket_id = ticket.ticket_id or f"ticket_{uuid.uuid4().hex[:8]}"
+    pipeline_mode = ticket.pipeline_mode or DEFAULT_PIPELINE_MODE
+    ticket_id_var.set(ticket_id)
+    
+    yield _sse("start", {"ticket_id": ticket_id, "pipeline_mode": pipeline_mode})
+    
+    try:
+        initial_state = _initial_state(ticket, ticket_id)
+        config = _graph_config(ticket, ticket_id, pipeline_mode)
+        
+        # "updates" gives each node's output as it completes; "values" the
+        # merged state after each step, the last of which is the final state
+        final_state = None
+        async for mode, chunk in get_agent(pipeline_mode).astream(
+            initial_state, config=config, stream_mode=["updates", "values"]
+        ):
+            if mode == "values":
+                final_state = chunk
+                continue
+            for node, update in chunk.items():
+                yield _sse(node, _node_event(node, update))
+        
+        response = _build_response(final_state, pipeline_mode, start_time, _current_trace_url())
+        _export_trace(ticket, ticket_id, pipeline_mode, start_time, response=response)
+        yield _sse("result", response.model_dump())
+        
+    except Exception as e:
+        # Headers are already sent, so the failure is reported as an event
+        logger.exception("Error processing ticket: %s", e)
+        _export_trace(ticket, ticket_id, pipeline_mode, start_time, error=e)
+        yield _sse("error", {
+            "ticket_id": ticket_id,
+            "error": f"Failed to process ticket: {str(e)}",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+@app.post("/triage/stream", tags=["Triage"])
+async def triage_ticket_stream(ticket: TicketRequest):
+    """
+    Triage a support ticket, streaming results as server-sent events
+    
+    Emits a "start" event with the ticket ID, then one event per graph
+    node as it completes (classify, extract, retrieve, route; or retrieve,
+    fused_triage) carrying that node's results, then a "result" event
+    with the same body as POST /triage. Failures end the stream with an
+    "error" event.
+    
+    The intent and priority can be shown after the first LLM call rather
+    than after the whole pipeline.
+    """
+    return StreamingResponse(
+        _stream_triage(ticket),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/triage/batch", tags=["Triage"])
 async def triage_batch(tickets: list[TicketRequest]):
     """
     Triage multiple tickets in batch
     
-    Processes up to 10 tickets at once.
+    Tickets are processed concurrently, at most BATCH_CONCURRENCY at a
+    time, so batch latency is close to the slowest ticket rather than the
+    sum. Accepts up to MAX_BATCH_SIZE tickets.
+    
+    CRM context is prefetched for all unique users in the batch with bulk
+    lookups, so CRM round trips do not grow with the number of tickets.
+    Fused-mode tickets retrieve before classification, so their FAQs are
+    searched up front too, in one batch knowledge base query.
     """
     
-    if len(tickets) > 10:
+    if len(tickets) > MAX_BATCH_SIZE:
         raise HTTPException(
             status_code=400,
-            detail="Maximum 10 tickets per batch request"
+            detail=f"Maximum {MAX_BATCH_SIZE} tickets per batch request"
         )
     
-    results = []
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    prefetched, faqs = await asyncio.gather(
+        aprefetch_crm_context(ticket.user_id for ticket in tickets),
+        aprefetch_faqs({
+            i: ticket.query for i, ticket in enumerate(tickets)
+            if (ticket.pipeline_mode or DEFAULT_PIPELINE_MODE) == "fused"
+        })
+    )
+    
+    async def triage_one(i: int, ticket: TicketRequest):
+        context = prefetched.get(ticket.user_id)
+        if i in faqs:
+            context = {**(context or {}), "relevant_faqs": faqs[i]}
+        async with semaphore:
+            try:
+                return await _run_triage(ticket, context)
+            except Exception as e:
+                # Continue processing other tickets even if one fails
+                return {
+                    "ticket_id": ticket.ticket_id or "unknown",
+                    "error": str(e),
+                    "timestamp": datetime.utcnow().isoformat()
+                }
     
-    for ticket in tickets:
-        try:
-            result = await triage_ticket(ticket)
-            results.append(result)
-        except Exception as e:
-            # Continue processing other tickets even if one fails
-            results.append({
-                "ticket_id": ticket.ticket_id or "unknown",
-                "error": str(e),
-                "timestamp": datetime.utcnow().isoformat()
-            })
+    # gather preserves input order, so results line up with the request
+    results = await asyncio.gather(*(triage_one(i, ticket) for i, ticket in enumerate(tickets)))
     
     return {
         "total": len(tickets),
@@ -218,17 +474,98 @@ async def triage_batch(tickets: list[TicketRequest]):
         "results": results
     }
 
+@app.post("/triage/jobs", status_code=202, tags=["Jobs"])
+async def submit_triage_jobs(submission: JobSubmission):
+    """
+    Queue tickets for asynchronous triage
+    
+    Returns a job ID per ticket immediately; poll GET /triage/jobs/{job_id}
+    or pass callback_url to have each final status POSTed back. A pool of
+    JOB_WORKERS workers drains the queue. When the queue (JOB_QUEUE_SIZE)
+    can't take every ticket in the request, none are queued and the
+    response is 429.
+    
+    CRM context is prefetched for all unique users in the submission with
+    bulk lookups before the jobs are queued, as in /triage/batch.
+    """
+    if len(submission.tickets) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {MAX_BATCH_SIZE} tickets per job request"
+        )
+    
+    tickets = submission.tickets
+    
+    # Like /triage/batch: one bulk CRM lookup per source for the whole
+    # submission, carried in each job. Skipped when the queue is full anyway.
+    callback_url = str(submission.callback_url) if submission.callback_url else None
+    try:
+        job_queue.check_room(len(tickets))
+        prefetched = await aprefetch_crm_context(ticket.user_id for ticket in tickets)
+        jobs = job_queue.submit(tickets, callback_url, prefetched)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    
+    return {
+        "total": len(jobs),
+        "jobs": [
+            {"job_id": job.job_id, "ticket_id": job.ticket_id, "status": job.status}
+            for job in jobs
+        ]
+    }
+
+@app.get("/triage/jobs/{job_id}", response_model=JobStatus, tags=["Jobs"])
+async def get_triage_job(job_id: str):
+    """
+    Status of an asynchronous triage job
+    
+    queued, running, succeeded (with the same result as POST /triage) or
+    failed (with the error). Finished jobs are kept for JOB_RESULT_TTL_S.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job '{job_id}'")
+    return job.to_dict()
+
+@app.delete("/cache/crm/{user_id}", tags=["Cache"])
+async def invalidate_crm_cache(user_id: str):
+    """
+    Drop cached CRM data for a user
+    
+    Call this when a profile, order or ticket changes upstream so the
+    next ticket from this user sees fresh data instead of waiting for TTL.
+    """
+    removed = crm_cache.invalidate(user_id)
+    return {"user_id": user_id, "invalidated": removed}
+
 @app.get("/metrics", tags=["Observability"])
 async def get_metrics():
     """
-    Get basic metrics
+    Prometheus metrics
+    
+    Latency histograms, in-flight gauges and error counters for HTTP
+    requests, graph nodes, CRM/KB tools and LLM calls, plus LLM tokens
+    by node and model and cache hit ratios, in Prometheus text format.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/metrics/summary", tags=["Observability"])
+async def get_metrics_summary():
+    """
+    Decision-path and cache counters as JSON
     
-    In production, this would connect to your metrics store.
-    For now, it returns static info.
+    Detailed traces are available in LangSmith.
     """
     
     return {
         "message": "Detailed metrics available in LangSmith",
+        "intent_classification": get_cascade_stats(),
+        "entity_extraction": get_extraction_stats(),
+        "routing": get_routing_stats(),
+        "model_escalations": get_escalation_stats(),
+        "jobs": job_queue.stats(),
+        "deduplication": deduplicator.stats(),
+        "caches": {**get_cache_stats(), "crm": crm_cache.stats()},
         "langsmith_project": os.getenv("LANGCHAIN_PROJECT"),
         "langsmith_url": "https://smith.langchain.com/",
         "timestamp": datetime.utcnow().isoformat()
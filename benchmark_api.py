@@ -0,0 +1,239 @@
+"""Load-test and benchmark the triage API
+
+Drives /triage and /triage/batch at a configurable concurrency and
+arrival rate, and reports throughput, p50/p95/p99 latency per endpoint
+and per graph node, and error rate. Results are written as JSON so runs
+can be compared across commits.
+
+In-process (default): the FastAPI app runs in this process behind an
+httpx ASGI transport, with the mock CRM/KB and the replay LLM backend,
+so no network or API key is needed:
+
+    python benchmark_api.py --requests 500 --concurrency 50
+    python benchmark_api.py --rate 20 --duration 30 --endpoint triage
+
+Over HTTP, against a server started with LLM_BACKEND=replay:
+
+    python benchmark_api.py --url http://localhost:8000 --concurrency 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Stub the LLM before the app (and its nodes) are imported
+os.environ.setdefault("LLM_BACKEND", "replay")
+os.environ.setdefault("LANGCHAIN_TRACING_V2", "false")
+# Per-ticket log records would drown the report (and cost time)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Tickets are drawn from a small set, so concurrent duplicates would share
+# graph runs and overstate throughput; set TRIAGE_DEDUP_ENABLED=true to measure that
+os.environ.setdefault("TRIAGE_DEDUP_ENABLED", "false")
+
+import httpx
+import numpy as np
+
+TICKETS_PATH = "src/data/test_tickets.json"
+
+def load_tickets(path: str = TICKETS_PATH) -> List[Dict]:
+    with open(path, "r") as f:
+        return [
+            {"user_id": t["user_id"], "query": t["query"]}
+            for t in json.load(f)
+        ]
+
+def summarize(latencies_ms: List[float]) -> Dict:
+    if not latencies_ms:
+        return {"count": 0}
+    values = np.asarray(latencies_ms)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(values.max()), 2)
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Recorder:
+    """Collects per-request outcomes for one endpoint."""
+    
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.tickets = 0
+        self.ticket_errors = 0
+        self.node_timings = defaultdict(list)
+    
+    def add_ticket(self, result: Dict):
+        self.tickets += 1
+        if "error" in result:
+            self.ticket_errors += 1
+            return
+        for node, ms in (result.get("node_timings_ms") or {}).items():
+            self.node_timings[node].append(ms)
+    
+    def report(self, elapsed_s: float) -> Dict:
+        requests = len(self.latencies) + self.errors
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": self.errors / requests if requests else 0.0,
+            "tickets": self.tickets,
+            "ticket_errors": self.ticket_errors,
+            "throughput_rps": round(len(self.latencies) / elapsed_s, 2) if elapsed_s else 0.0,
+            "throughput_tickets_per_s": round((self.tickets - self.ticket_errors) / elapsed_s, 2) if elapsed_s else 0.0,
+            "latency": summarize(self.latencies),
+            "nodes": {node: summarize(values) for node, values in sorted(self.node_timings.items())}
+        }
+
+async def send(client: httpx.AsyncClient, endpoint: str, tickets: List[Dict], args,
+               recorder: Recorder, scheduled_at: float):
+    if endpoint == "triage":
+        path, payload = "/triage", {**random.choice(tickets), "pipeline_mode": args.pipeline_mode}
+    else:
+        path = "/triage/batch"
+        payload = [{**random.choice(tickets), "pipeline_mode": args.pipeline_mode} for _ in range(args.batch_size)]
+    
+    try:
+        response = await client.post(path, json=payload)
+        # Measured from the scheduled arrival, so time spent waiting for a
+        # free slot counts (no coordinated omission in open-loop runs)
+        latency_ms = (time.perf_counter() - scheduled_at) * 1000
+        if response.status_code != 200:
+            recorder.errors += 1
+            return
+        recorder.latencies.append(latency_ms)
+        body = response.json()
+        for result in (body["results"] if endpoint == "batch" else [body]):
+            recorder.add_ticket(result)
+    except httpx.HTTPError:
+        recorder.errors += 1
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, tickets: List[Dict], args) -> Dict:
+    recorder = Recorder()
+    slots = asyncio.Semaphore(args.concurrency)
+    total = args.requests if endpoint == "triage" else max(1, args.requests // args.batch_size)
+    
+    async def one(scheduled_at: Optional[float] = None):
+        async with slots:
+            # Closed loop measures from when the request actually starts
+            await send(client, endpoint, tickets, args, recorder, scheduled_at or time.perf_counter())
+    
+    start = time.perf_counter()
+    tasks = []
+    
+    if args.rate > 0:
+        # Open loop: Poisson arrivals at --rate per second
+        deadline = start + args.duration if args.duration else None
+        next_at = start
+        while (deadline is None and len(tasks) < total) or (deadline is not None and next_at < deadline):
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            tasks.append(asyncio.create_task(one(next_at)))
+            next_at += random.expovariate(args.rate)
+    else:
+        # Closed loop: keep --concurrency requests in flight
+        for _ in range(total):
+            tasks.append(asyncio.create_task(one()))
+    
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    
+    report = recorder.report(elapsed)
+    report["elapsed_s"] = round(elapsed, 3)
+    return report
+
+def make_client(args) -> httpx.AsyncClient:
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.url:
+        return httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits)
+    
+    from api.service import app
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://benchmark",
+        timeout=timeout
+    )
+
+def print_report(endpoint: str, report: Dict):
+    latency = report["latency"]
+    print(f"\n{'='*60}")
+    print(f"📈 {endpoint}: {report['requests']} requests in {report['elapsed_s']}s")
+    print(f"{'='*60}")
+    print(f"   Throughput: {report['throughput_rps']} req/s, {report['throughput_tickets_per_s']} tickets/s")
+    print(f"   Errors: {report['errors']} requests ({report['error_rate']:.1%}), {report['ticket_errors']} tickets")
+    if latency["count"]:
+        print(f"   Latency: p50 {latency['p50_ms']}ms | p95 {latency['p95_ms']}ms | p99 {latency['p99_ms']}ms")
+    print(f"\n   {'Node':<15} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for node, stats in report["nodes"].items():
+        print(f"   {node:<15} {stats['p50_ms']:>8}ms {stats['p95_ms']:>8}ms {stats['p99_ms']:>8}ms")
+
+async def main(args):
+    tickets = load_tickets(args.tickets)
+    random.seed(args.seed)
+    endpoints = ["triage", "batch"] if args.endpoint == "both" else [args.endpoint]
+    
+    results = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            **vars(args),
+            "llm_backend": os.getenv("LLM_BACKEND") if not args.url else "server",
+            "python": platform.python_version()
+        },
+        "endpoints": {}
+    }
+    
+    async with make_client(args) as client:
+        if args.verbose and not args.url:
+            from src.log import configure
+            configure(level="INFO")
+    
+        if args.warmup:
+            warmup = argparse.Namespace(**{**vars(args), "requests": args.warmup, "rate": 0, "duration": 0})
+            await run_endpoint(client, "triage", tickets, warmup)
+    
+        for endpoint in endpoints:
+            report = await run_endpoint(client, endpoint, tickets, args)
+            results["endpoints"][endpoint] = report
+            print_report(endpoint, report)
+    
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the triage API")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--endpoint", choices=["triage", "batch", "both"], default="both")
+    parser.add_argument("--requests", type=int, default=200, help="Tickets per endpoint (closed loop)")
+    parser.add_argument("--concurrency", type=int, default=20, help="Max requests in flight")
+    parser.add_argument("--rate", type=float, default=0, help="Open-loop arrival rate (req/s); 0 = closed loop")
+    parser.add_argument("--duration", type=float, default=0, help="Open-loop run time in seconds (default: --requests arrivals)")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--pipeline-mode", choices=["standard", "fused"], default="standard")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed /triage requests before measuring")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--tickets", default=TICKETS_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--verbose", action="store_true", help="Log the agent's per-ticket output (INFO)")
+    asyncio.run(main(parser.parse_args()))
@@ -1,15 +1,23 @@
 """Intent classification node with observability"""
 import json
 import os
+import time
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 from dotenv import load_dotenv
 
-from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import SystemMessage, HumanMessage
 from langsmith import traceable
 
+from src.agent.llm import get_llm
+from src.agent.model_tiers import (
+    ESCALATION_THRESHOLD, TieredResponse, ainvoke_tiered, escalation_llm, invoke_tiered, node_model
+)
 from src.agent.state import TicketState, IntentType
+from src.agent.local_classifier import get_local_model
+from src.agent import triage_cache
+from src.agent.token_budget import budget_fallback, can_afford
+from src.log import get_logger
 from src.prompts.intent_classifier import (
     INTENT_CLASSIFICATION_SYSTEM,
     get_classification_prompt
@@ -18,98 +26,256 @@ from src.prompts.intent_classifier import (
 # Load environment variables FIRST
 load_dotenv()
 
+logger = get_logger(__name__)
+
 # NOW initialize the LLM after env vars are loaded
-llm = ChatAnthropic(
-    model=os.getenv("DEFAULT_MODEL", "claude-sonnet-4-20250514"),
-    temperature=0,  # Deterministic for classification
-    api_key=os.getenv("ANTHROPIC_API_KEY")  # Explicitly pass the key
-)
+CLASSIFIER_MODEL = node_model("CLASSIFIER_MODEL")
+llm = get_llm("classifier", CLASSIFIER_MODEL)
+# Re-runs low-confidence or unparseable answers (None if llm already is it)
+escalation = escalation_llm("classifier", CLASSIFIER_MODEL)
 
-@traceable(
-    name="classify_intent",
-    metadata={"step": "classification", "version": "v1.0"}
-)
-def classify_intent(state: TicketState) -> TicketState:
-    """
-    Classify the intent of a support ticket.
+# "cascade" = local model first, LLM only below LOCAL_CLASSIFIER_THRESHOLD
+# "llm"     = always call the LLM
+CLASSIFIER_MODE = os.getenv("INTENT_CLASSIFIER_MODE", "cascade")
+LOCAL_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.85"))
+LOCAL_MODEL_NAME = "local-intent-model"
+
+# Loaded once at startup; None if the model has not been trained/exported
+local_model = get_local_model() if CLASSIFIER_MODE == "cascade" else None
+
+# Per cascade tier: how many tickets it answered and total time spent
+cascade_stats = {
+    "local": {"count": 0, "total_ms": 0.0},
+    "llm": {"count": 0, "total_ms": 0.0}
+}
+
+def _record_tier(tier: str, started: float):
+    cascade_stats[tier]["count"] += 1
+    cascade_stats[tier]["total_ms"] += (time.perf_counter() - started) * 1000
+
+def get_cascade_stats() -> Dict:
+    """Tickets answered and average latency per cascade tier (local, llm)."""
+    total = sum(tier["count"] for tier in cascade_stats.values())
+    return {
+        name: {
+            "count": tier["count"],
+            "share": tier["count"] / total if total else 0.0,
+            "avg_ms": tier["total_ms"] / tier["count"] if tier["count"] else 0.0
+        }
+        for name, tier in cascade_stats.items()
+    }
+
+def _cached_classification(state: TicketState) -> Optional[Dict]:
+    """Previous LLM classification of a query with the same canonical form."""
+    cached = triage_cache.get_classification(state["query"])
+    if cached is None:
+        return None
     
-    This function is automatically traced by LangSmith via @traceable decorator.
-    All LLM calls, inputs, outputs, and timing will be captured.
+    logger.info("Classification complete", extra={"path": "cache", "intent": cached["intent"]})
+    
+    return {**cached, "cache_hits": ["classify"]}
+
+def _local_classification(state: TicketState) -> Optional[Dict]:
+    """
+    Classify with the local model. Returns None when the model is not
+    loaded or not confident enough, so the caller falls through to the LLM.
     """
+    if local_model is None:
+        return None
+    
+    started = time.perf_counter()
+    intent, confidence = local_model.predict(state["query"])
+    if confidence < LOCAL_THRESHOLD:
+        return None
     
-    print(f"\n{'='*60}")
-    print(f"🔍 Classifying ticket: {state['ticket_id']}")
-    print(f"📝 Query: {state['query'][:100]}...")
-    print(f"{'='*60}\n")
+    _record_tier("local", started)
+    logger.info("Classification complete", extra={"path": "local", "intent": intent, "confidence": round(confidence, 3)})
     
-    # Prepare messages
-    messages = [
+    return {
+        "intent": intent,
+        "confidence": confidence,
+        "reasoning": f"Local intent model ({confidence:.2f} >= {LOCAL_THRESHOLD:.2f} threshold)",
+        "model_used": LOCAL_MODEL_NAME
+    }
+
+def _build_messages(state: TicketState) -> list:
+    """Build the classification prompt for a ticket."""
+    return [
         SystemMessage(content=INTENT_CLASSIFICATION_SYSTEM),
         HumanMessage(content=get_classification_prompt(state["query"]))
     ]
+
+def _parse_response(response) -> Dict:
+    """The JSON object in an LLM response (raises JSONDecodeError)."""
+    # Claude sometimes wraps JSON in markdown, so let's handle that
+    content = response.content.strip()
+    if content.startswith("```json"):
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif content.startswith("```"):
+        content = content.split("```")[1].split("```")[0].strip()
     
+    return json.loads(content)
+
+def _apply_classification(tiered: TieredResponse, query: str) -> Dict:
+    """
+    Parse the LLM response into a classification state update.
+    Shared by the sync and async nodes. Successful classifications are
+    stored in the triage cache under the canonicalized query.
+    """
+    response = tiered.response
     try:
-        # Invoke LLM - this call is automatically traced
-        response = llm.invoke(messages)
-        
-        # Parse JSON response
-        # Claude sometimes wraps JSON in markdown, so let's handle that
-        content = response.content.strip()
-        if content.startswith("```json"):
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif content.startswith("```"):
-            content = content.split("```")[1].split("```")[0].strip()
-        
-        result = json.loads(content)
+        result = _parse_response(response)
         
         # Validate intent
         valid_intents = ["billing", "technical", "account", "sales", "general"]
         intent = result.get("intent", "general")
         if intent not in valid_intents:
-            print(f"⚠️  Invalid intent '{intent}', defaulting to 'general'")
+            logger.warning("Invalid intent %r, defaulting to 'general'", intent)
             intent = "general"
         
         confidence = float(result.get("confidence", 0.5))
         reasoning = result.get("reasoning", "No reasoning provided")
         
-        # Log results
-        print(f"✅ Classification complete:")
-        print(f"   Intent: {intent}")
-        print(f"   Confidence: {confidence:.2%}")
-        print(f"   Reasoning: {reasoning}")
+        # Only return the keys this node owns, so it can run in parallel
+        # with entity extraction without conflicting writes
+        update = {
+            "intent": intent,
+            "confidence": confidence,
+            "reasoning": reasoning,
+            "model_used": tiered.model
+        }
         
-        # Update state with results
-        state["intent"] = intent
-        state["confidence"] = confidence
-        state["reasoning"] = reasoning
-        state["model_used"] = os.getenv("DEFAULT_MODEL", "claude-sonnet-4-20250514")
+        # Token usage of every call made (small model and any escalation)
+        update.update(tiered.update)
         
-        # Track token usage from response metadata
-        if hasattr(response, 'response_metadata'):
-            usage = response.response_metadata.get('usage', {})
-            state["total_tokens"] = usage.get('input_tokens', 0) + usage.get('output_tokens', 0)
-            print(f"   Tokens used: {state['total_tokens']}")
+        logger.info("Classification complete", extra={
+            "path": "llm",
+            "model": tiered.model,
+            "intent": intent,
+            "confidence": round(confidence, 3),
+            "tokens": update.get("total_tokens", 0)
+        })
+        logger.debug("Classification reasoning: %s", reasoning)
         
-        return state
+        triage_cache.put_classification(query, update)
+        
+        return update
         
     except json.JSONDecodeError as e:
-        print(f"❌ Failed to parse JSON response: {e}")
-        print(f"   Raw response: {response.content[:200]}...")
+        logger.error("Failed to parse JSON response: %s", e, extra={"raw_response": response.content[:200]})
         
         # Fallback to general with low confidence
-        state["intent"] = "general"
-        state["confidence"] = 0.3
-        state["reasoning"] = f"JSON parse error: {str(e)}"
-        return state
-        
+        return {
+            "intent": "general",
+            "confidence": 0.3,
+            "reasoning": f"JSON parse error: {str(e)}",
+            **tiered.update
+        }
+
+def _apply_error(error: Exception) -> Dict:
+    """Fallback classification when the LLM call itself fails."""
+    logger.error("Classification error: %s", error)
+    
+    return {
+        "intent": "general",
+        "confidence": 0.0,
+        "reasoning": f"Error: {str(error)}"
+    }
+
+def _budget_classification(state: TicketState) -> Dict:
+    """
+    The request's token budget cannot cover an LLM call: take the local
+    model's answer whatever its confidence, or 'general' without it.
+    """
+    update = budget_fallback("classifier", state)
+    # Loaded on demand, so this also works with INTENT_CLASSIFIER_MODE=llm
+    model = get_local_model()
+    if model is None:
+        return {**update, "intent": "general", "confidence": 0.0, "reasoning": "Token budget exhausted"}
+    
+    intent, confidence = model.predict(state["query"])
+    return {
+        **update,
+        "intent": intent,
+        "confidence": confidence,
+        "reasoning": f"Local intent model ({confidence:.2f}), token budget exhausted",
+        "model_used": LOCAL_MODEL_NAME
+    }
+
+def _log_banner(state: TicketState):
+    logger.debug("Classifying ticket", extra={"query": state["query"][:100]})
+
+@traceable(
+    name="classify_intent",
+    metadata={"step": "classification", "version": "v1.0"}
+)
+def classify_intent(state: TicketState) -> Dict:
+    """
+    Classify the intent of a support ticket.
+    
+    This function is automatically traced by LangSmith via @traceable decorator.
+    All LLM calls, inputs, outputs, and timing will be captured.
+    
+    Returns a partial state update with the classification fields.
+    The local model answers first, then the triage cache; the LLM is only
+    called when both miss, on CLASSIFIER_MODEL first and on the
+    escalation model if that answer is unsure or malformed.
+    """
+    _log_banner(state)
+    
+    update = _local_classification(state) or _cached_classification(state)
+    if update is not None:
+        return update
+    
+    messages = _build_messages(state)
+    if not can_afford(state, messages):
+        return _budget_classification(state)
+    started = time.perf_counter()
+    
+    try:
+        # Invoke LLM - this call is automatically traced
+        tiered = invoke_tiered(
+            "classifier", CLASSIFIER_MODEL, llm, escalation, messages, state,
+            _parse_response, ESCALATION_THRESHOLD
+        )
+        return _apply_classification(tiered, state["query"])
     except Exception as e:
-        print(f"❌ Classification error: {e}")
-        
-        # Fallback
-        state["intent"] = "general"
-        state["confidence"] = 0.0
-        state["reasoning"] = f"Error: {str(e)}"
-        return state
+        return _apply_error(e)
+    finally:
+        _record_tier("llm", started)
+
+@traceable(
+    name="classify_intent",
+    metadata={"step": "classification", "version": "v1.0"}
+)
+async def aclassify_intent(state: TicketState) -> Dict:
+    """
+    Async version of classify_intent.
+    
+    Awaits the LLM call so the event loop can serve other tickets
+    while this one waits on the API.
+    """
+    _log_banner(state)
+    
+    update = _local_classification(state) or _cached_classification(state)
+    if update is not None:
+        return update
+    
+    messages = _build_messages(state)
+    if not can_afford(state, messages):
+        return _budget_classification(state)
+    started = time.perf_counter()
+    
+    try:
+        tiered = await ainvoke_tiered(
+            "classifier", CLASSIFIER_MODEL, llm, escalation, messages, state,
+            _parse_response, ESCALATION_THRESHOLD
+        )
+        return _apply_classification(tiered, state["query"])
+    except Exception as e:
+        return _apply_error(e)
+    finally:
+        _record_tier("llm", started)
 
 def validate_classification(state: TicketState, ground_truth: str = None) -> Dict:
     """
@@ -130,8 +296,8 @@ def validate_classification(state: TicketState, ground_truth: str = None) -> Dic
     }
     
     if is_correct:
-        print(f"✅ Correct classification!")
+        logger.info("Correct classification", extra={"intent": state["intent"]})
     else:
-        print(f"❌ Misclassification: predicted '{state['intent']}', actual '{ground_truth}'")
+        logger.warning("Misclassification: predicted %r, actual %r", state["intent"], ground_truth)
     
     return result
\ No newline at end of file
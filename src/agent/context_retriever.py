@@ -1,48 +1,232 @@
 """Retrieve context from CRM and knowledge base"""
+import asyncio
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterable, List
+
 from langsmith import traceable
+from langsmith.utils import ContextThreadPoolExecutor
 from src.agent.state import TicketState
-from src.tools.mock_crm import get_user_profile, get_order_history, get_ticket_history
-from src.tools.mock_knowledge_base import search_knowledge_base
+from src.log import get_logger
+from src.tools.mock_crm import (
+    get_user_profile,
+    get_order_history,
+    get_ticket_history,
+    aget_user_profile,
+    aget_order_history,
+    aget_ticket_history,
+    aget_user_profiles_bulk,
+    aget_order_histories_bulk,
+    aget_ticket_histories_bulk,
+)
+from src.tools.mock_knowledge_base import (
+    search_knowledge_base,
+    asearch_knowledge_base,
+    asearch_knowledge_base_batch,
+)
+
+logger = get_logger(__name__)
+
+# Max time to wait for any single CRM/KB lookup before giving up on it
+SOURCE_TIMEOUT_S = float(os.getenv("CONTEXT_SOURCE_TIMEOUT_S", "1.0"))
+
+# FAQs retrieved per ticket
+FAQ_TOP_K = 2
+
+# Shared pool for the sync path. ContextThreadPoolExecutor keeps the
+# LangSmith run tree, so tool calls still nest under retrieve_context.
+_executor = ContextThreadPoolExecutor(
+    max_workers=int(os.getenv("CONTEXT_THREAD_POOL_SIZE", "32")),
+    thread_name_prefix="context"
+)
+
+def _fallback_profile(user_id: str) -> Dict:
+    """Minimal profile used when the CRM does not answer in time."""
+    return {
+        "user_id": user_id,
+        "name": "Unknown User",
+        "tier": "unknown",
+        "account_status": "unknown",
+        "total_tickets": 0
+    }
+
+def _sources(state: TicketState) -> Dict[str, tuple]:
+    """
+    Lookups to run for this ticket, as name -> (sync_fn, async_fn, kwargs, default).
+    None of them depend on each other, so they can all run at once.
+    """
+    user_id = state["user_id"]
+    sources = {
+        "user_profile": (get_user_profile, aget_user_profile, {"user_id": user_id}, _fallback_profile(user_id)),
+        "ticket_history": (get_ticket_history, aget_ticket_history, {"user_id": user_id}, []),
+        "relevant_faqs": (
+            search_knowledge_base,
+            asearch_knowledge_base,
+            {"intent": state["intent"], "query": state["query"], "top_k": FAQ_TOP_K},
+            []
+        ),
+    }
+    
+    # Get order history if billing-related. In fused mode retrieval runs
+    # before classification (intent is None), so fetch orders anyway.
+    if state["intent"] in (None, "billing"):
+        sources["orders"] = (get_order_history, aget_order_history, {"user_id": user_id}, [])
+    
+    return sources
+
+def _prefetched(state: TicketState, sources: Dict[str, tuple]) -> Dict:
+    """
+    Take sources already fetched for this user by a batch prefetch out of
+    the lookup list, and return their values.
+    """
+    prefetched = state.get("prefetched_context") or {}
+    found = {name: prefetched[name] for name in list(sources) if name in prefetched}
+    for name in found:
+        del sources[name]
+    return found
+
+@traceable(name="prefetch_crm_context")
+async def aprefetch_crm_context(user_ids: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Fetch CRM context for a whole batch of tickets up front.
+    
+    User IDs are de-duplicated and each source is one bulk call, so CRM
+    round trips scale with unique users rather than tickets. Returns
+    {user_id: {"user_profile", "orders", "ticket_history"}} to pass to
+    each ticket as state["prefetched_context"]. A source that fails or
+    times out is left out, and retrieve_context fetches it per ticket.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    
+    bulk = {
+        "user_profile": aget_user_profiles_bulk,
+        "orders": aget_order_histories_bulk,
+        "ticket_history": aget_ticket_histories_bulk,
+    }
+    results = await asyncio.gather(
+        *(asyncio.wait_for(fn(user_ids), timeout=SOURCE_TIMEOUT_S) for fn in bulk.values()),
+        return_exceptions=True
+    )
+    
+    prefetched = {user_id: {} for user_id in user_ids}
+    for name, result in zip(bulk, results):
+        if isinstance(result, BaseException):
+            logger.warning("Bulk %s prefetch failed: %r", name, result)
+            continue
+        for user_id, value in result.items():
+            prefetched[user_id][name] = value
+    
+    logger.info("Prefetched CRM context", extra={"users": len(user_ids), "bulk_calls": len(bulk)})
+    return prefetched
+
+@traceable(name="prefetch_faqs")
+async def aprefetch_faqs(queries: Dict[Any, str]) -> Dict[Any, List[Dict]]:
+    """
+    Search the knowledge base for a batch of fused-mode tickets in one call.
+    
+    Fused mode retrieves before classification (intent=None), so a
+    ticket's FAQs depend only on its query and can be searched up front.
+    Takes {key: query} and returns {key: faqs}; add each to the ticket's
+    state["prefetched_context"] as "relevant_faqs". Returns {} if the
+    search fails or times out, and retrieve_context searches per ticket.
+    """
+    if not queries:
+        return {}
+    
+    try:
+        results = await asyncio.wait_for(
+            asearch_knowledge_base_batch(list(queries.values()), top_k=FAQ_TOP_K),
+            timeout=SOURCE_TIMEOUT_S
+        )
+    except Exception as e:
+        logger.warning("Batch FAQ prefetch failed: %r", e)
+        return {}
+    
+    logger.info("Prefetched FAQs", extra={"queries": len(queries)})
+    return dict(zip(queries, results))
+
+def _log_summary(context: dict):
+    logger.info("Context retrieved", extra={
+        "tier": context["user_profile"].get("tier"),
+        "previous_tickets": len(context["ticket_history"]),
+        "faqs": len(context["relevant_faqs"])
+    })
+    if context["missing_sources"]:
+        logger.warning("Missing context sources (timed out or failed): %s", ", ".join(context["missing_sources"]))
 
 @traceable(name="retrieve_context", metadata={"step": "context_retrieval"})
-def retrieve_context(state: TicketState) -> TicketState:
+def retrieve_context(state: TicketState) -> Dict:
     """
     Fetch relevant context from CRM and knowledge base.
     All sub-calls (CRM, KB) are automatically traced.
+    
+    Lookups run concurrently on a thread pool. A source that fails or
+    exceeds SOURCE_TIMEOUT_S is replaced by its default value and listed
+    in context["missing_sources"]. Sources present in
+    state["prefetched_context"] are not fetched again.
     """
-    print(f"\n{'='*60}")
-    print(f"📊 Retrieving context...")
-    print(f"{'='*60}\n")
+    logger.debug("Retrieving context")
     
-    context = {}
+    sources = _sources(state)
+    context = {"missing_sources": [], **_prefetched(state, sources)}
+    futures = {
+        name: _executor.submit(fn, **kwargs)
+        for name, (fn, _, kwargs, _) in sources.items()
+    }
     
-    # Get user profile from CRM
-    user_profile = get_user_profile(state["user_id"])
-    context["user_profile"] = user_profile
+    # Every lookup started at the same time, so one shared deadline
+    # gives each source the same timeout
+    deadline = time.monotonic() + SOURCE_TIMEOUT_S
     
-    # Get order history if billing-related
-    if state["intent"] == "billing":
-        orders = get_order_history(state["user_id"])
-        context["orders"] = orders
+    for name, future in futures.items():
+        default = sources[name][3]
+        try:
+            context[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logger.warning("%s timed out after %ss", name, SOURCE_TIMEOUT_S)
+            context[name] = default
+            context["missing_sources"].append(name)
+        except Exception as e:
+            logger.error("%s failed: %s", name, e)
+            context[name] = default
+            context["missing_sources"].append(name)
     
-    # Get ticket history
-    ticket_history = get_ticket_history(state["user_id"])
-    context["ticket_history"] = ticket_history
+    _log_summary(context)
     
-    # Search knowledge base for relevant FAQs
-    faqs = search_knowledge_base(
-        intent=state["intent"],
-        query=state["query"],
-        top_k=2
-    )
-    context["relevant_faqs"] = faqs
+    return {"context": context}
+
+async def _afetch(name: str, afn: Callable, kwargs: dict, default: Any, context: dict):
+    try:
+        context[name] = await asyncio.wait_for(afn(**kwargs), timeout=SOURCE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        logger.warning("%s timed out after %ss", name, SOURCE_TIMEOUT_S)
+        context[name] = default
+        context["missing_sources"].append(name)
+    except Exception as e:
+        logger.error("%s failed: %s", name, e)
+        context[name] = default
+        context["missing_sources"].append(name)
+
+@traceable(name="retrieve_context", metadata={"step": "context_retrieval"})
+async def aretrieve_context(state: TicketState) -> Dict:
+    """
+    Async version of retrieve_context.
+    All lookups are awaited concurrently, so the node costs the slowest
+    source (capped at SOURCE_TIMEOUT_S) instead of the sum of all of them.
+    """
+    logger.debug("Retrieving context")
+    
+    sources = _sources(state)
+    context = {"missing_sources": [], **_prefetched(state, sources)}
     
-    print(f"\n✅ Context retrieved:")
-    print(f"   User tier: {user_profile.get('tier')}")
-    print(f"   Previous tickets: {len(ticket_history)}")
-    print(f"   Relevant FAQs: {len(faqs)}")
+    await asyncio.gather(*(
+        _afetch(name, afn, kwargs, default, context)
+        for name, (_, afn, kwargs, default) in sources.items()
+    ))
     
-    # Add context to state
-    state["context"] = context
+    _log_summary(context)
     
-    return state
\ No newline at end of file
+    return {"context": context}
@@ -1,20 +1,32 @@
 """Extract entities from support tickets"""
 import json
 import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import SystemMessage, HumanMessage
 from langsmith import traceable
 
+from src.agent.llm import get_llm
+from src.agent.model_tiers import ainvoke_tiered, escalation_llm, invoke_tiered, node_model
 from src.agent.state import TicketState
+from src.agent.token_budget import budget_fallback, can_afford
+from src.log import get_logger
 
 load_dotenv()
 
-llm = ChatAnthropic(
-    model=os.getenv("DEFAULT_MODEL", "claude-sonnet-4-20250514"),
-    temperature=0,
-    api_key=os.getenv("ANTHROPIC_API_KEY")
-)
+logger = get_logger(__name__)
+
+ENTITY_MODEL = node_model("ENTITY_MODEL")
+llm = get_llm("entity_extractor", ENTITY_MODEL)
+# Re-runs answers that don't parse (None if llm already is it)
+escalation = escalation_llm("entity_extractor", ENTITY_MODEL)
+
+# "hybrid" = rules first, LLM only for unresolved fields
+# "rules"  = never call the LLM
+# "llm"    = always call the LLM (previous behaviour)
+EXTRACTION_MODE = os.getenv("ENTITY_EXTRACTION_MODE", "hybrid")
 
 ENTITY_EXTRACTION_SYSTEM = """You are an expert at extracting structured information from support tickets.
 
@@ -35,43 +47,227 @@ Return JSON format:
   "has_urgent_language": true/false
 }"""
 
-@traceable(name="extract_entities", metadata={"step": "entity_extraction"})
-def extract_entities(state: TicketState) -> TicketState:
+# Precompiled patterns for the rule-based extractor
+ORDER_ID_PATTERN = re.compile(
+    r"(?:#\s?|\border\s+(?:id\s+|number\s+|no\.?\s+)?#?\s?)(\d{4,})",
+    re.IGNORECASE
+)
+AMOUNT_PATTERN = re.compile(r"\$\s?(\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)")
+HTTP_ERROR_PATTERN = re.compile(r"\b([45]\d\d)\s+(?:error|status|response)\b", re.IGNORECASE)
+ERROR_CODE_PATTERN = re.compile(r"\berror(?:\s+code)?\s*[:#]?\s*([A-Z][A-Z0-9_]{2,}|\d{3,})\b")
+QUOTED_PATTERN = re.compile(r"[\"'“‘]([^\"'”’]{3,80})[\"'”’]")
+DATE_PATTERN = re.compile(r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b|\b\d{1,2}:\d{2}(?:\s?[ap]m)?\b", re.IGNORECASE)
+NUMBER_WITH_UNIT_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\s?(?:kb|mb|gb|tb|ms|s|sec|seconds|mins?|minutes|hours?|days?|%|x)\b", re.IGNORECASE)
+BARE_NUMBER_PATTERN = re.compile(r"(?<![\w$#.])\d+(?:\.\d+)?(?![\w.])")
+WORD_PATTERN = re.compile(r"[a-z']+")
+ERROR_HINT_PATTERN = re.compile(r"\b(?:error|exception|crash(?:es|ed|ing)?|fail(?:s|ed|ing|ure)?)\b", re.IGNORECASE)
+PRODUCT_HINT_PATTERN = re.compile(r"\b(?:feature|integration|plugin|module|add-?on|app)\b", re.IGNORECASE)
+
+URGENCY_KEYWORDS = frozenset({
+    "urgent", "urgently", "asap", "emergency", "critical", "down",
+    "immediately", "outage", "blocker", "blocking",
+})
+
+# Lower-cased phrase -> canonical product name. Longest phrases are
+# matched first so "pro plan" wins over "pro".
+PRODUCT_LEXICON = {
+    "enterprise plan": "Enterprise plan",
+    "business plan": "Business plan",
+    "pro plan": "Pro plan",
+    "free plan": "Free plan",
+    "enterprise": "Enterprise plan",
+    "dashboard": "Dashboard",
+    "api": "API",
+    "file upload": "File upload",
+    "upload": "File upload",
+    "invoice": "Invoicing",
+    "billing portal": "Billing portal",
+}
+PRODUCT_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(p) for p in sorted(PRODUCT_LEXICON, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+
+# How often each extraction path was taken, to measure avoided LLM calls
+extraction_stats = Counter()
+
+def get_extraction_stats() -> Dict[str, int]:
+    """Counts of tickets per extraction path (rules, rules+llm, llm)."""
+    return dict(extraction_stats)
+
+def extract_entities_rule_based(query: str) -> Tuple[Dict, List[str]]:
     """
-    Extract structured entities from the ticket query.
+    Extract entities with regexes and keyword sets, no LLM involved.
+    
+    Returns (entities, unresolved) where unresolved lists the fields the
+    rules could not decide, e.g. a bare number that could be an order ID
+    or an amount, or error wording without a recognisable error message.
     """
-    print(f"\n{'='*60}")
-    print(f"🔍 Extracting entities from ticket...")
-    print(f"{'='*60}\n")
+    unresolved = []
+    
+    order_match = ORDER_ID_PATTERN.search(query)
+    order_id = order_match.group(1) if order_match else None
+    
+    amount_match = AMOUNT_PATTERN.search(query)
+    amount = float(amount_match.group(1).replace(",", "")) if amount_match else None
+    
+    error_message = None
+    http_match = HTTP_ERROR_PATTERN.search(query)
+    code_match = ERROR_CODE_PATTERN.search(query)
+    if http_match:
+        error_message = f"{http_match.group(1)} error"
+    elif code_match:
+        error_message = code_match.group(1)
+    elif ERROR_HINT_PATTERN.search(query):
+        quoted = QUOTED_PATTERN.search(query)
+        if quoted:
+            error_message = quoted.group(1)
+        else:
+            unresolved.append("error_message")
+    
+    product_match = PRODUCT_PATTERN.search(query)
+    product_name = PRODUCT_LEXICON[product_match.group(1).lower()] if product_match else None
+    if product_name is None and PRODUCT_HINT_PATTERN.search(query):
+        unresolved.append("product_name")
+    
+    # Numbers not explained by the patterns above are ambiguous: an order
+    # number without '#' or an amount without '$'
+    leftover = query
+    for pattern in (ORDER_ID_PATTERN, AMOUNT_PATTERN, HTTP_ERROR_PATTERN, ERROR_CODE_PATTERN,
+                    DATE_PATTERN, NUMBER_WITH_UNIT_PATTERN):
+        leftover = pattern.sub(" ", leftover)
+    if BARE_NUMBER_PATTERN.search(leftover):
+        if order_id is None:
+            unresolved.append("order_id")
+        if amount is None:
+            unresolved.append("amount")
     
-    messages = [
+    words = WORD_PATTERN.findall(query.lower())
+    urgency_keywords = sorted({w for w in words if w in URGENCY_KEYWORDS})
+    
+    entities = {
+        "order_id": order_id,
+        "amount": amount,
+        "product_name": product_name,
+        "error_message": error_message,
+        "urgency_keywords": urgency_keywords,
+        "has_urgent_language": bool(urgency_keywords)
+    }
+    
+    return entities, unresolved
+
+def _build_messages(state: TicketState, fields: Optional[List[str]] = None) -> list:
+    """Build the entity extraction prompt, optionally narrowed to some fields."""
+    prompt = f"Extract entities from: \"{state['query']}\""
+    if fields:
+        prompt += f"\nOnly these fields are needed: {', '.join(fields)}"
+    
+    return [
         SystemMessage(content=ENTITY_EXTRACTION_SYSTEM),
-        HumanMessage(content=f"Extract entities from: \"{state['query']}\"")
+        HumanMessage(content=prompt)
     ]
+
+def _parse_entities(response) -> Dict:
+    """Parse the LLM JSON response into an entities dict."""
+    # Parse JSON
+    content = response.content.strip()
+    if content.startswith("```json"):
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif content.startswith("```"):
+        content = content.split("```")[1].split("```")[0].strip()
+    
+    return json.loads(content)
+
+def _merge(rule_entities: Dict, llm_entities: Dict, fields: List[str]) -> Dict:
+    """Fill only the unresolved fields from the LLM; rule results win elsewhere."""
+    merged = dict(rule_entities)
+    for field in fields:
+        if llm_entities.get(field) is not None:
+            merged[field] = llm_entities[field]
+    return merged
+
+def _result(entities: Dict, path: str, tiered=None) -> Dict:
+    extraction_stats[path] += 1
+    
+    logger.info("Entities extracted", extra={"path": path, "entities": entities})
+    
+    update = {"entities": entities, "extraction_path": path}
+    if tiered is not None:
+        # Token usage of every call made (small model and any escalation)
+        update.update(tiered.update)
+    return update
+
+def _budget_result(state: TicketState, entities: Optional[Dict]) -> Dict:
+    """Over the token budget: keep what the rules found (running them if needed)."""
+    if entities is None:
+        entities, _ = extract_entities_rule_based(state["query"])
+    return {**_result(entities, "rules"), **budget_fallback("entity_extractor", state)}
+
+@traceable(name="extract_entities", metadata={"step": "entity_extraction"})
+def extract_entities(state: TicketState) -> Dict:
+    """
+    Extract structured entities from the ticket query.
+    
+    Does not depend on the classification, so the graph runs it in
+    parallel with classify_intent. Returns the "entities" key and the
+    "extraction_path" used: "rules", "rules+llm" or "llm".
+    """
+    logger.debug("Extracting entities")
+    
+    if EXTRACTION_MODE != "llm":
+        entities, unresolved = extract_entities_rule_based(state["query"])
+        if not unresolved or EXTRACTION_MODE == "rules":
+            return _result(entities, "rules")
+    else:
+        entities, unresolved = None, None
     
+    messages = _build_messages(state, unresolved)
+    if not can_afford(state, messages):
+        return _budget_result(state, entities)
+    
+    tiered = None
+    try:
+        tiered = invoke_tiered(
+            "entity_extractor", ENTITY_MODEL, llm, escalation, messages, state, _parse_entities
+        )
+        llm_entities = _parse_entities(tiered.response)
+    except Exception as e:
+        logger.error("Entity extraction error: %s", e)
+        # Keep whatever the rules found (a response that failed to parse still used tokens)
+        return _result(entities or {}, "rules" if unresolved else "llm", tiered)
+    
+    if unresolved:
+        return _result(_merge(entities, llm_entities, unresolved), "rules+llm", tiered)
+    return _result(llm_entities, "llm", tiered)
+
+@traceable(name="extract_entities", metadata={"step": "entity_extraction"})
+async def aextract_entities(state: TicketState) -> Dict:
+    """
+    Async version of extract_entities.
+    """
+    logger.debug("Extracting entities")
+    
+    if EXTRACTION_MODE != "llm":
+        entities, unresolved = extract_entities_rule_based(state["query"])
+        if not unresolved or EXTRACTION_MODE == "rules":
+            return _result(entities, "rules")
+    else:
+        entities, unresolved = None, None
+    
+    messages = _build_messages(state, unresolved)
+    if not can_afford(state, messages):
+        return _budget_result(state, entities)
+    
+    tiered = None
     try:
-        response = llm.invoke(messages)
-        
-        # Parse JSON
-        content = response.content.strip()
-        if content.startswith("```json"):
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif content.startswith("```"):
-            content = content.split("```")[1].split("```")[0].strip()
-        
-        entities = json.loads(content)
-        
-        print(f"✅ Entities extracted:")
-        for key, value in entities.items():
-            if value:
-                print(f"   {key}: {value}")
-        
-        # Add entities to state
-        state["entities"] = entities
-        
-        return state
-        
+        tiered = await ainvoke_tiered(
+            "entity_extractor", ENTITY_MODEL, llm, escalation, messages, state, _parse_entities
+        )
+        llm_entities = _parse_entities(tiered.response)
     except Exception as e:
-        print(f"❌ Entity extraction error: {e}")
-        state["entities"] = {}
-        return state
\ No newline at end of file
+        logger.error("Entity extraction error: %s", e)
+        return _result(entities or {}, "rules" if unresolved else "llm", tiered)
+    
+    if unresolved:
+        return _result(_merge(entities, llm_entities, unresolved), "rules+llm", tiered)
+    return _result(llm_entities, "llm", tiered)
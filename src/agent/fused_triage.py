@@ -0,0 +1,186 @@
+"""Single-call triage node: classification, entities and routing in one LLM call"""
+import json
+from typing import Dict
+from dotenv import load_dotenv
+
+from langchain_core.messages import SystemMessage, HumanMessage
+from langsmith import traceable
+
+from src.agent.entity_extractor import extract_entities_rule_based
+from src.agent.llm import default_model, get_llm
+from src.agent.local_classifier import get_local_model
+from src.agent.routing_policy import routing_policy
+from src.agent.state import TicketState
+from src.agent.token_budget import budget_fallback, can_afford, usage_update
+from src.log import get_logger
+from src.prompts.fused_triage import FUSED_TRIAGE_SYSTEM, get_fused_prompt
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+FUSED_MODEL = default_model()
+llm = get_llm("fused_triage", FUSED_MODEL)
+
+VALID_INTENTS = ["billing", "technical", "account", "sales", "general"]
+VALID_PRIORITIES = ["low", "medium", "high", "critical"]
+
+def _build_messages(state: TicketState) -> list:
+    return [
+        SystemMessage(content=FUSED_TRIAGE_SYSTEM),
+        HumanMessage(content=get_fused_prompt(state["query"], state.get("context") or {}))
+    ]
+
+def _apply_triage(response) -> Dict:
+    """
+    Parse the fused JSON response into the same state keys the 4-node
+    graph fills. An unusable answer gets the safe fallback, still with the
+    call's token usage.
+    """
+    try:
+        return _parse_triage(response)
+    except (ValueError, TypeError, AttributeError) as e:
+        return {**_apply_fallback(e), **usage_update("fused_triage", response)}
+
+def _parse_triage(response) -> Dict:
+    content = response.content.strip()
+    if content.startswith("```json"):
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif content.startswith("```"):
+        content = content.split("```")[1].split("```")[0].strip()
+    
+    result = json.loads(content)
+    
+    intent = result.get("intent", "general")
+    if intent not in VALID_INTENTS:
+        logger.warning("Invalid intent %r, defaulting to 'general'", intent)
+        intent = "general"
+    
+    action = result.get("action")
+    if action not in ("auto_resolve", "escalate"):
+        action = "escalate"
+    
+    priority = result.get("priority")
+    if priority not in VALID_PRIORITIES:
+        priority = "medium"
+    
+    update = {
+        "intent": intent,
+        "confidence": float(result.get("confidence", 0.5)),
+        "reasoning": result.get("reasoning", "No reasoning provided"),
+        "entities": result.get("entities") or {},
+        "extraction_path": "fused",
+        "action": action,
+        "team": result.get("team") if action == "escalate" else None,
+        "priority": priority,
+        "routing_path": "fused",
+        "model_used": FUSED_MODEL
+    }
+    
+    update.update(usage_update("fused_triage", response))
+    
+    logger.info("Fused triage complete", extra={
+        "intent": update["intent"],
+        "confidence": round(update["confidence"], 3),
+        "action": update["action"],
+        "team": update["team"],
+        "priority": update["priority"]
+    })
+    
+    return update
+
+def _budget_triage(state: TicketState) -> Dict:
+    """
+    Triage without the LLM once the token budget can't cover the call:
+    local intent model, rule-based entities and the routing policy table
+    (regardless of confidence), else escalate to the intent's first-line team.
+    """
+    query = state["query"]
+    model = get_local_model()
+    intent, confidence = model.predict(query) if model is not None else ("general", 0.0)
+    entities, _ = extract_entities_rule_based(query)
+    
+    context = state.get("context") or {}
+    user_tier = context.get("user_profile", {}).get("tier", "unknown")
+    has_faqs = len(context.get("relevant_faqs", [])) > 0
+    decision = routing_policy.lookup(
+        intent, user_tier, has_faqs, entities.get("has_urgent_language", False), 1.0
+    ) or {
+        "action": "escalate",
+        "team": f"{intent}_tier1" if intent in ("billing", "technical") else intent,
+        "priority": "medium"
+    }
+    
+    logger.info("Fused triage on the budget path", extra={
+        "intent": intent,
+        "confidence": round(confidence, 3),
+        "action": decision["action"],
+        "team": decision.get("team")
+    })
+    
+    return {
+        "intent": intent,
+        "confidence": confidence,
+        "reasoning": "Token budget exhausted",
+        "entities": entities,
+        "extraction_path": "fused",
+        "action": decision["action"],
+        "team": decision.get("team"),
+        "priority": decision["priority"],
+        "routing_path": "budget",
+        **budget_fallback("fused_triage", state)
+    }
+
+def _apply_fallback(error: Exception) -> Dict:
+    logger.error("Fused triage error: %s", error)
+    # Same safe defaults as the individual nodes
+    return {
+        "intent": "general",
+        "confidence": 0.0,
+        "reasoning": f"Error: {str(error)}",
+        "entities": {},
+        "extraction_path": "fused",
+        "action": "escalate",
+        "team": "general",
+        "priority": "medium",
+        "routing_path": "fallback"
+    }
+
+@traceable(name="fused_triage", metadata={"step": "fused_triage"})
+def fused_triage(state: TicketState) -> Dict:
+    """
+    Classify, extract entities and route in a single LLM call.
+    
+    Expects context to be retrieved beforehand; it is injected into the
+    prompt so the model can make the routing decision in the same call.
+    """
+    logger.debug("Fused triage")
+    
+    messages = _build_messages(state)
+    if not can_afford(state, messages):
+        return _budget_triage(state)
+    
+    try:
+        response = llm.invoke(messages)
+    except Exception as e:
+        return _apply_fallback(e)
+    
+    return _apply_triage(response)
+
+@traceable(name="fused_triage", metadata={"step": "fused_triage"})
+async def afused_triage(state: TicketState) -> Dict:
+    """
+    Async version of fused_triage.
+    """
+    logger.debug("Fused triage")
+    
+    messages = _build_messages(state)
+    if not can_afford(state, messages):
+        return _budget_triage(state)
+    
+    try:
+        response = await llm.ainvoke(messages)
+    except Exception as e:
+        return _apply_fallback(e)
+    
+    return _apply_triage(response)
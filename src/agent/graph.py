@@ -1,32 +1,85 @@
 """Complete agent graph using LangGraph"""
-from langgraph.graph import StateGraph, END
+import functools
+import os
+import time
+
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, START, END
 from src.agent.state import TicketState
-from src.agent.classifier import classify_intent
-from src.agent.entity_extractor import extract_entities
-from src.agent.context_retriever import retrieve_context
-from src.agent.router import route_ticket
+from src.log import ticket_context
+from src.metrics import instrument_node
+from src.agent.classifier import classify_intent, aclassify_intent
+from src.agent.entity_extractor import extract_entities, aextract_entities
+from src.agent.context_retriever import retrieve_context, aretrieve_context
+from src.agent.router import route_ticket, aroute_ticket
+from src.agent.fused_triage import fused_triage, afused_triage
+
+PIPELINE_MODES = ("standard", "fused")
+DEFAULT_PIPELINE_MODE = os.getenv("PIPELINE_MODE", "standard")
+
+def _timed(func, name: str):
+    """
+    Add this node's wall time (ms) to the update under node_timings, and
+    tag everything the node logs with the ticket_id.
+    functools.wraps keeps the node's signature visible, so RunnableLambda
+    still passes config through (the LangSmith run tree depends on it).
+    """
+    @functools.wraps(func)
+    def wrapper(state, **kwargs):
+        start = time.perf_counter()
+        with ticket_context(state.get("ticket_id")):
+            update = func(state, **kwargs)
+        return {**update, "node_timings": {name: (time.perf_counter() - start) * 1000}}
+    return wrapper
+
+def _atimed(afunc, name: str):
+    @functools.wraps(afunc)
+    async def wrapper(state, **kwargs):
+        start = time.perf_counter()
+        with ticket_context(state.get("ticket_id")):
+            update = await afunc(state, **kwargs)
+        return {**update, "node_timings": {name: (time.perf_counter() - start) * 1000}}
+    return wrapper
+
+def _node(func, afunc, name: str) -> RunnableLambda:
+    """
+    Wrap a sync/async node pair so agent.invoke() uses the sync version
+    and agent.ainvoke() uses the async one. Both record their latency
+    in state["node_timings"] and in the Prometheus node metrics.
+    """
+    return RunnableLambda(
+        instrument_node(name, _timed(func, name)),
+        afunc=instrument_node(name, _atimed(afunc, name)),
+        name=name
+    )
 
 def build_agent_graph():
     """
     Build the complete support triage agent graph.
     
     Flow:
-    START → classify → extract → retrieve → route → END
+    START ─┬→ classify ─┬→ retrieve → route → END
+           └→ extract  ─┘
+    
+    Classification and entity extraction are independent LLM calls, so
+    they run as parallel branches and join before context retrieval.
     """
     
     # Create graph
     workflow = StateGraph(TicketState)
     
     # Add nodes
-    workflow.add_node("classify", classify_intent)
-    workflow.add_node("extract", extract_entities)
-    workflow.add_node("retrieve", retrieve_context)
-    workflow.add_node("route", route_ticket)
-    
-    # Define edges (sequential flow for now)
-    workflow.set_entry_point("classify")
-    workflow.add_edge("classify", "extract")
-    workflow.add_edge("extract", "retrieve")
+    workflow.add_node("classify", _node(classify_intent, aclassify_intent, "classify"))
+    workflow.add_node("extract", _node(extract_entities, aextract_entities, "extract"))
+    workflow.add_node("retrieve", _node(retrieve_context, aretrieve_context, "retrieve"))
+    workflow.add_node("route", _node(route_ticket, aroute_ticket, "route"))
+    
+    # Fan out: classify and extract start together
+    workflow.add_edge(START, "classify")
+    workflow.add_edge(START, "extract")
+    
+    # Join: retrieve waits for both branches
+    workflow.add_edge(["classify", "extract"], "retrieve")
     workflow.add_edge("retrieve", "route")
     workflow.add_edge("route", END)
     
@@ -35,5 +88,39 @@ def build_agent_graph():
     
     return agent
 
-# Create the agent instance
-agent = build_agent_graph()
\ No newline at end of file
+def build_fused_agent_graph():
+    """
+    Build the single-LLM-call triage graph.
+    
+    Flow:
+    START → retrieve → fused_triage → END
+    
+    Context is retrieved first (without an intent) and injected into one
+    structured call that returns intent, entities and routing together.
+    Fills the same TicketState keys as the standard graph.
+    """
+    workflow = StateGraph(TicketState)
+    
+    workflow.add_node("retrieve", _node(retrieve_context, aretrieve_context, "retrieve"))
+    workflow.add_node("fused_triage", _node(fused_triage, afused_triage, "fused_triage"))
+    
+    workflow.add_edge(START, "retrieve")
+    workflow.add_edge("retrieve", "fused_triage")
+    workflow.add_edge("fused_triage", END)
+    
+    return workflow.compile()
+
+# Create the agent instances
+agent = build_agent_graph()
+fused_agent = build_fused_agent_graph()
+
+def get_agent(mode: str = None):
+    """
+    Return the compiled graph for a pipeline mode.
+    
+    Falls back to the PIPELINE_MODE env var when mode is not given.
+    """
+    mode = mode or DEFAULT_PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode '{mode}', expected one of {PIPELINE_MODES}")
+    return fused_agent if mode == "fused" else agent
\ No newline at end of file
@@ -0,0 +1,275 @@
+"""Lightweight local intent classifier (TF-IDF + softmax regression on NumPy)
+
+Train and export the model with:
+
+    python -m src.agent.local_classifier train
+
+The exported .npz is loaded once at startup by src/agent/classifier.py,
+which answers from this model first and only calls the LLM when its
+confidence is below LOCAL_CLASSIFIER_THRESHOLD.
+"""
+import argparse
+import os
+import random
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.log import get_logger
+
+logger = get_logger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+DEFAULT_MODEL_PATH = os.path.join(DATA_DIR, "intent_model.npz")
+
+INTENTS = ["billing", "technical", "account", "sales", "general"]
+
+_AMOUNT = re.compile(r"\$\s?\d[\d,]*(?:\.\d+)?")
+_ORDER = re.compile(r"#\s?\d+")
+_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_NUMBER = re.compile(r"\d+")
+_WORD = re.compile(r"[a-z_']+")
+
+def _words(text: str) -> List[str]:
+    text = text.lower()
+    text = _AMOUNT.sub(" _amount_ ", text)
+    text = _ORDER.sub(" _order_ ", text)
+    text = _DATE.sub(" _date_ ", text)
+    text = _NUMBER.sub(" _num_ ", text)
+    words = [w.strip("'") for w in _WORD.findall(text)]
+    return [w for w in words if w]
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased unigrams and bigrams, with amounts, order IDs, dates and
+    other numbers replaced by placeholder tokens so templated tickets that
+    only differ in values map to the same features.
+    """
+    words = _words(text)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class LocalIntentModel:
+    """TF-IDF features with a multinomial logistic regression on top."""
+    
+    def __init__(self, vocab: List[str], idf: np.ndarray, weights: np.ndarray,
+                 bias: np.ndarray, classes: List[str]):
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.idf = idf.astype(np.float32)
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.classes = list(classes)
+    
+    def _features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        counts = Counter(t for t in tokenize(text) if t in self.vocab)
+        if not counts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        idx = np.fromiter((self.vocab[t] for t in counts), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        values = tf * self.idf[idx]
+        values /= np.linalg.norm(values)
+        return idx, values
+    
+    def predict_proba(self, text: str) -> np.ndarray:
+        idx, values = self._features(text)
+        logits = self.bias + values @ self.weights[idx]
+        logits = logits - logits.max()
+        exp = np.exp(logits)
+        return exp / exp.sum()
+    
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Return (intent, confidence) for a ticket.
+        
+        Confidence is the class probability scaled by the share of words
+        the model has seen in training, so mostly-unknown text never gets
+        a confident answer and falls through to the LLM.
+        """
+        proba = self.predict_proba(text)
+        best = int(proba.argmax())
+        words = _words(text)
+        coverage = sum(w in self.vocab for w in words) / len(words) if words else 0.0
+        return self.classes[best], float(proba[best]) * coverage
+    
+    def save(self, path: str):
+        vocab = [None] * len(self.vocab)
+        for term, i in self.vocab.items():
+            vocab[i] = term
+        np.savez_compressed(
+            path,
+            vocab=np.array(vocab),
+            idf=self.idf,
+            weights=self.weights,
+            bias=self.bias,
+            classes=np.array(self.classes)
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> "LocalIntentModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                vocab=data["vocab"].tolist(),
+                idf=data["idf"],
+                weights=data["weights"],
+                bias=data["bias"],
+                classes=data["classes"].tolist()
+            )
+
+def train(texts: List[str], labels: List[str], epochs: int = 800, lr: float = 10.0,
+          l2: float = 1e-3, classes: List[str] = None) -> LocalIntentModel:
+    """Fit TF-IDF + softmax regression with full-batch gradient descent."""
+    classes = classes or INTENTS
+    docs = [Counter(tokenize(t)) for t in texts]
+    
+    doc_freq = Counter(term for doc in docs for term in doc)
+    vocab = sorted(doc_freq)
+    index = {term: i for i, term in enumerate(vocab)}
+    n_docs = len(docs)
+    idf = np.log((1 + n_docs) / (1 + np.array([doc_freq[t] for t in vocab], dtype=np.float64))) + 1.0
+    
+    X = np.zeros((n_docs, len(vocab)), dtype=np.float64)
+    for row, doc in enumerate(docs):
+        for term, count in doc.items():
+            X[row, index[term]] = count * idf[index[term]]
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    X /= np.where(norms == 0, 1, norms)
+    
+    y = np.array([classes.index(label) for label in labels])
+    Y = np.eye(len(classes))[y]
+    
+    W = np.zeros((len(vocab), len(classes)))
+    b = np.zeros(len(classes))
+    for _ in range(epochs):
+        logits = X @ W + b
+        logits -= logits.max(axis=1, keepdims=True)
+        P = np.exp(logits)
+        P /= P.sum(axis=1, keepdims=True)
+        grad = P - Y
+        W -= lr * (X.T @ grad / n_docs + l2 * W)
+        b -= lr * grad.mean(axis=0)
+    
+    return LocalIntentModel(vocab, idf, W, b, classes)
+
+def build_training_set(samples_per_template: int = 20,
+                       seed: int = 7) -> Tuple[List[str], List[str], List[int]]:
+    """
+    Every template in generate_mock_data filled with random values.
+    
+    Returns texts, labels and the template each example came from: fills
+    of one template share all their features once values are replaced by
+    placeholders, so evaluation must hold out whole templates.
+    src/data/test_tickets.json is left out; test_classifier.py measures
+    the classifier on it.
+    """
+    from src.data.generate_mock_data import TICKET_TEMPLATES
+    
+    rng = random.Random(seed)
+    texts, labels, groups = [], [], []
+    
+    template_id = 0
+    for intent, templates in TICKET_TEMPLATES.items():
+        for template in templates:
+            for _ in range(samples_per_template):
+                texts.append(template.format(
+                    amount=rng.randint(50, 500),
+                    plan_price=rng.choice([49, 99, 199]),
+                    order_id=rng.randint(10000, 99999),
+                    date=f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+                ))
+                labels.append(intent)
+                groups.append(template_id)
+            template_id += 1
+    
+    return texts, labels, groups
+
+def template_folds(labels: List[str], groups: List[int], k: int = 5) -> List[List[int]]:
+    """
+    Split example indices into k folds by template: fold i holds the
+    i-th, (i+k)-th, ... template of every intent, so each fold tests on
+    templates the model was not trained on.
+    """
+    templates = defaultdict(list)
+    for label, group in zip(labels, groups):
+        if group not in templates[label]:
+            templates[label].append(group)
+    fold_of = {
+        group: i % k
+        for intent_templates in templates.values()
+        for i, group in enumerate(intent_templates)
+    }
+    folds = [[] for _ in range(k)]
+    for row, group in enumerate(groups):
+        folds[fold_of[group]].append(row)
+    return [fold for fold in folds if fold]
+
+def evaluate(model: LocalIntentModel, texts: List[str], labels: List[str],
+             threshold: float) -> Dict:
+    """Accuracy per intent and how much traffic the model answers at this threshold."""
+    per_intent = defaultdict(lambda: {"total": 0, "correct": 0, "local": 0, "local_correct": 0})
+    for text, label in zip(texts, labels):
+        intent, confidence = model.predict(text)
+        stats = per_intent[label]
+        stats["total"] += 1
+        stats["correct"] += intent == label
+        if confidence >= threshold:
+            stats["local"] += 1
+            stats["local_correct"] += intent == label
+    return dict(per_intent)
+
+_model: Optional[LocalIntentModel] = None
+_model_loaded = False
+
+def get_local_model(path: str = None) -> Optional[LocalIntentModel]:
+    """Load the exported model once; returns None if it has not been trained."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        path = path or os.getenv("LOCAL_CLASSIFIER_MODEL_PATH", DEFAULT_MODEL_PATH)
+        if os.path.exists(path):
+            _model = LocalIntentModel.load(path)
+        else:
+            logger.warning("Local intent model not found at %s, using the LLM only", path)
+        _model_loaded = True
+    return _model
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and export the local intent classifier")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--samples-per-template", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.85")))
+    args = parser.parse_args()
+    
+    texts, labels, groups = build_training_set(args.samples_per_template)
+    
+    # Cross-validate by template (a row split would test on copies of the
+    # training templates), then refit on everything for export
+    report = defaultdict(Counter)
+    for test_idx in template_folds(labels, groups, args.folds):
+        held_out = set(test_idx)
+        train_idx = [i for i in range(len(texts)) if i not in held_out]
+        model = train([texts[i] for i in train_idx], [labels[i] for i in train_idx])
+        fold = evaluate(model, [texts[i] for i in test_idx], [labels[i] for i in test_idx], args.threshold)
+        for intent, stats in fold.items():
+            report[intent].update(stats)
+    
+    print(f"\nHeld-out templates ({args.folds}-fold):")
+    print(f"\n{'Intent':<12} {'Total':<7} {'Acc':<8} {'Local %':<9} {'Local acc':<10}")
+    print("-" * 50)
+    for intent in INTENTS:
+        stats = report.get(intent)
+        if not stats:
+            continue
+        local_acc = stats["local_correct"] / stats["local"] if stats["local"] else 0.0
+        print(f"{intent:<12} {stats['total']:<7} {stats['correct'] / stats['total']:<8.1%} "
+              f"{stats['local'] / stats['total']:<9.1%} {local_acc:<10.1%}")
+    
+    model = train(texts, labels)
+    model.save(args.output)
+    print(f"\n✓ Trained on {len(texts)} examples, {len(model.vocab)} features")
+    print(f"✓ Saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Per-node model tiers: a small model first, a larger one on escalation
+
+Each LLM node calls its own model, by default a fast, small one:
+
+    CLASSIFIER_MODEL   intent classifier
+    ENTITY_MODEL       entity extractor
+    ROUTER_MODEL       router
+    SMALL_MODEL        default for all three (Haiku)
+
+When the small model's answer does not parse as JSON, or (for the
+classifier) its confidence is below ESCALATION_CONFIDENCE_THRESHOLD, the
+node re-runs the same prompt on ESCALATION_MODEL (default DEFAULT_MODEL,
+Sonnet). A node configured with the escalation model itself never
+escalates. Escalations are skipped when the request's token budget
+can't cover them.
+"""
+import os
+from collections import defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+
+from src.agent.llm import default_model, get_llm
+from src.agent.token_budget import budget_fallback, can_afford, usage_update
+from src.log import get_logger
+from src.metrics import LLM_ESCALATIONS, LLM_FIRST_TIER_CALLS
+
+SMALL_MODEL = os.getenv("SMALL_MODEL", "claude-3-5-haiku-20241022")
+ESCALATION_MODEL = os.getenv("ESCALATION_MODEL") or default_model()
+ESCALATION_THRESHOLD = float(os.getenv("ESCALATION_CONFIDENCE_THRESHOLD", "0.7"))
+
+logger = get_logger(__name__)
+
+# Per node: first-tier calls and how many of them were escalated
+escalation_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "escalated": 0})
+
+def get_escalation_stats() -> Dict[str, Dict]:
+    """First-tier calls, escalations and escalation rate per node."""
+    return {
+        node: {**stats, "rate": stats["escalated"] / stats["calls"] if stats["calls"] else 0.0}
+        for node, stats in escalation_stats.items()
+    }
+
+def node_model(env_var: str) -> str:
+    """The model a node calls first."""
+    return os.getenv(env_var) or SMALL_MODEL
+
+def escalation_llm(node: str, model: str) -> Optional[BaseChatModel]:
+    """Chat model to escalate to, or None if the node already runs on it."""
+    if model == ESCALATION_MODEL:
+        return None
+    return get_llm(node, ESCALATION_MODEL)
+
+class TieredResponse(NamedTuple):
+    response: AIMessage   # the answer: the escalation model's, if it ran
+    model: str            # model that produced it
+    update: Dict          # token usage of every call, plus any budget fallback
+
+def _escalation_reason(response: AIMessage, parse: Callable,
+                       confidence_threshold: Optional[float]) -> Optional[str]:
+    try:
+        result = parse(response)
+    except (ValueError, TypeError):
+        return "parse_error"
+    # Valid JSON that isn't an object (a list, a bare string) is no answer either
+    if not isinstance(result, dict):
+        return "parse_error"
+    if confidence_threshold is not None:
+        try:
+            confidence = float(result.get("confidence", 1.0))
+        except (ValueError, TypeError):
+            return "parse_error"
+        if confidence < confidence_threshold:
+            return "low_confidence"
+    return None
+
+class _Escalation:
+    """Bookkeeping shared by invoke_tiered and ainvoke_tiered."""
+    
+    def __init__(self, node: str, model: str, state: Dict, messages: List[BaseMessage]):
+        self.node = node
+        self.model = model
+        self.state = state
+        self.messages = messages
+        self.responses: List[AIMessage] = []
+        self.extra: Dict = {}
+        escalation_stats[node]["calls"] += 1
+        LLM_FIRST_TIER_CALLS.labels(node).inc()
+    
+    def wanted(self, second: Optional[BaseChatModel], parse: Callable,
+               confidence_threshold: Optional[float]) -> bool:
+        """Whether the first answer should be re-run on the escalation model."""
+        if second is None:
+            return False
+        reason = _escalation_reason(self.responses[0], parse, confidence_threshold)
+        if reason is None:
+            return False
+    
+        spent = usage_update(self.node, *self.responses)["total_tokens"]
+        state = {**self.state, "total_tokens": (self.state.get("total_tokens") or 0) + spent}
+        if not can_afford(state, self.messages):
+            self.extra = budget_fallback(self.node, state)
+            return False
+    
+        escalation_stats[self.node]["escalated"] += 1
+        LLM_ESCALATIONS.labels(self.node, reason).inc()
+        logger.info("Escalating to the larger model", extra={
+            "node": self.node,
+            "reason": reason,
+            "from_model": self.model,
+            "to_model": ESCALATION_MODEL
+        })
+        return True
+    
+    def failed(self, error: Exception):
+        # Keep the small model's answer rather than failing the node
+        logger.warning("Escalation call failed, keeping the first answer: %s", error, extra={"node": self.node})
+    
+    def result(self) -> TieredResponse:
+        model = ESCALATION_MODEL if len(self.responses) > 1 else self.model
+        update = {**usage_update(self.node, *self.responses), **self.extra}
+        return TieredResponse(self.responses[-1], model, update)
+
+def invoke_tiered(node: str, model: str, first: BaseChatModel, second: Optional[BaseChatModel],
+                  messages: List[BaseMessage], state: Dict, parse: Callable,
+                  confidence_threshold: Optional[float] = None) -> TieredResponse:
+    """
+    Call the node's first-choice model, and the escalation model if the
+    answer does not parse(), or its "confidence" is below
+    confidence_threshold. Errors from the first call propagate.
+    """
+    escalation = _Escalation(node, model, state, messages)
+    escalation.responses.append(first.invoke(messages))
+    if escalation.wanted(second, parse, confidence_threshold):
+        try:
+            escalation.responses.append(second.invoke(messages))
+        except Exception as e:
+            escalation.failed(e)
+    return escalation.result()
+
+async def ainvoke_tiered(node: str, model: str, first: BaseChatModel, second: Optional[BaseChatModel],
+                         messages: List[BaseMessage], state: Dict, parse: Callable,
+                         confidence_threshold: Optional[float] = None) -> TieredResponse:
+    """Async version of invoke_tiered."""
+    escalation = _Escalation(node, model, state, messages)
+    escalation.responses.append(await first.ainvoke(messages))
+    if escalation.wanted(second, parse, confidence_threshold):
+        try:
+            escalation.responses.append(await second.ainvoke(messages))
+        except Exception as e:
+            escalation.failed(e)
+    return escalation.result()
@@ -1,20 +1,39 @@
 """Route tickets based on classification and context"""
 import os
 from dotenv import load_dotenv
-from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import SystemMessage, HumanMessage
 from langsmith import traceable
 import json
+from collections import Counter
+from typing import Dict
 
+from src.agent.llm import get_llm
+from src.agent.model_tiers import TieredResponse, ainvoke_tiered, escalation_llm, invoke_tiered, node_model
 from src.agent.state import TicketState
+from src.agent.routing_policy import routing_policy
+from src.agent import triage_cache
+from src.agent.token_budget import budget_fallback, can_afford
+from src.log import get_logger
 
 load_dotenv()
 
-llm = ChatAnthropic(
-    model=os.getenv("DEFAULT_MODEL", "claude-sonnet-4-20250514"),
-    temperature=0,
-    api_key=os.getenv("ANTHROPIC_API_KEY")
-)
+logger = get_logger(__name__)
+
+ROUTER_MODEL = node_model("ROUTER_MODEL")
+llm = get_llm("router", ROUTER_MODEL)
+# Re-runs answers that don't parse (None if llm already is it)
+escalation = escalation_llm("router", ROUTER_MODEL)
+
+# "hybrid" = routing policy first, LLM for unmatched/low-confidence tickets
+# "llm"    = always ask the LLM
+ROUTING_MODE = os.getenv("ROUTING_MODE", "hybrid")
+
+# How often each routing path was taken (policy vs llm)
+routing_stats = Counter()
+
+def get_routing_stats() -> Dict[str, int]:
+    """Counts of tickets per routing path."""
+    return dict(routing_stats)
 
 ROUTING_SYSTEM = """You are a support ticket routing expert.
 
@@ -38,19 +57,40 @@ Return JSON:
   "reasoning": "Why this decision"
 }"""
 
-@traceable(name="route_ticket", metadata={"step": "routing"})
-def route_ticket(state: TicketState) -> TicketState:
-    """
-    Determine routing decision based on all available context.
-    """
-    print(f"\n{'='*60}")
-    print(f"🎯 Making routing decision...")
-    print(f"{'='*60}\n")
-    
-    # Prepare context summary
+def _routing_features(state: TicketState) -> tuple:
+    """The features both the policy table and the LLM prompt route on."""
     user_tier = state["context"]["user_profile"].get("tier", "unknown")
     has_faqs = len(state["context"].get("relevant_faqs", [])) > 0
     has_urgent_language = state["entities"].get("has_urgent_language", False)
+    return user_tier, has_faqs, has_urgent_language
+
+def _policy_decision(state: TicketState):
+    """Routing decision from the policy table, or None to fall through to the LLM."""
+    if ROUTING_MODE == "llm":
+        return None
+    
+    user_tier, has_faqs, has_urgent_language = _routing_features(state)
+    decision = routing_policy.lookup(
+        state["intent"], user_tier, has_faqs, has_urgent_language, state["confidence"]
+    )
+    if decision is None:
+        return None
+    
+    return _result(decision, "policy")
+
+def _cached_decision(state: TicketState):
+    """Previous LLM routing decision for the same canonical query, intent and tier."""
+    user_tier, _, _ = _routing_features(state)
+    cached = triage_cache.get_routing(state["query"], state["intent"], user_tier)
+    if cached is None:
+        return None
+    
+    return {**_result(cached, "cache"), "cache_hits": ["route"]}
+
+def _build_messages(state: TicketState) -> list:
+    """Summarize classification, entities and context into the routing prompt."""
+    # Prepare context summary
+    user_tier, has_faqs, has_urgent_language = _routing_features(state)
     
     context_summary = f"""
 Ticket Info:
@@ -61,40 +101,129 @@ Ticket Info:
 - Query: "{state['query']}"
 """
     
-    messages = [
+    return [
         SystemMessage(content=ROUTING_SYSTEM),
         HumanMessage(content=context_summary)
     ]
+
+def _parse_decision(response) -> Dict:
+    """The JSON routing decision in an LLM response (raises JSONDecodeError)."""
+    content = response.content.strip()
+    if content.startswith("```json"):
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif content.startswith("```"):
+        content = content.split("```")[1].split("```")[0].strip()
+    
+    return json.loads(content)
+
+def _apply_decision(tiered: TieredResponse, state: TicketState) -> Dict:
+    """
+    Parse the LLM routing decision into a state update and cache it. An
+    unusable answer gets the safe fallback; either way the tokens of the
+    calls are kept.
+    """
+    try:
+        decision = _parse_decision(tiered.response)
+        update = _result(decision, "llm")
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return {**_apply_fallback(e), **tiered.update}
+    update.update(tiered.update)
+    
+    user_tier, _, _ = _routing_features(state)
+    triage_cache.put_routing(state["query"], state["intent"], user_tier, decision)
+    
+    return update
+
+def _result(decision: Dict, path: str) -> Dict:
+    routing_stats[path] += 1
+    
+    update = {
+        "action": decision["action"],
+        "team": decision.get("team"),
+        "priority": decision["priority"],
+        "routing_path": path
+    }
+    
+    logger.info("Routing decision", extra={
+        "path": path,
+        "action": update["action"],
+        "team": update["team"],
+        "priority": update["priority"]
+    })
+    logger.debug("Routing reasoning: %s", decision["reasoning"])
+    
+    return update
+
+def _budget_decision(state: TicketState) -> Dict:
+    """
+    Routing without the LLM once the token budget can't cover the call:
+    the policy table regardless of confidence, else escalate to the
+    intent's first-line team.
+    """
+    user_tier, has_faqs, has_urgent_language = _routing_features(state)
+    intent = state.get("intent") or "general"
+    decision = routing_policy.lookup(intent, user_tier, has_faqs, has_urgent_language, 1.0) or {
+        "action": "escalate",
+        "team": f"{intent}_tier1" if intent in ("billing", "technical") else intent,
+        "priority": "medium",
+        "reasoning": "Token budget exhausted"
+    }
+    return {**_result(decision, "budget"), **budget_fallback("router", state)}
+
+def _apply_fallback(error: Exception) -> Dict:
+    logger.error("Routing error: %s", error)
+    # Safe fallback
+    return {
+        "action": "escalate",
+        "team": "general",
+        "priority": "medium",
+        "routing_path": "fallback"
+    }
+
+@traceable(name="route_ticket", metadata={"step": "routing"})
+def route_ticket(state: TicketState) -> Dict:
+    """
+    Determine routing decision based on all available context.
+    
+    Common feature combinations are decided by the routing policy table
+    without an LLM call. The rest are looked up in the triage cache and
+    only go to the LLM on a miss.
+    """
+    logger.debug("Making routing decision")
+    
+    update = _policy_decision(state) or _cached_decision(state)
+    if update is not None:
+        return update
+    
+    messages = _build_messages(state)
+    if not can_afford(state, messages):
+        return _budget_decision(state)
     
     try:
-        response = llm.invoke(messages)
-        
-        # Parse JSON
-        content = response.content.strip()
-        if content.startswith("```json"):
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif content.startswith("```"):
-            content = content.split("```")[1].split("```")[0].strip()
-        
-        decision = json.loads(content)
-        
-        state["action"] = decision["action"]
-        state["team"] = decision.get("team")
-        state["priority"] = decision["priority"]
-        
-        print(f"✅ Routing decision:")
-        print(f"   Action: {state['action']}")
-        if state['team']:
-            print(f"   Team: {state['team']}")
-        print(f"   Priority: {state['priority']}")
-        print(f"   Reasoning: {decision['reasoning']}")
-        
-        return state
-        
+        tiered = invoke_tiered("router", ROUTER_MODEL, llm, escalation, messages, state, _parse_decision)
     except Exception as e:
-        print(f"❌ Routing error: {e}")
-        # Safe fallback
-        state["action"] = "escalate"
-        state["team"] = "general"
-        state["priority"] = "medium"
-        return state
\ No newline at end of file
+        return _apply_fallback(e)
+    
+    return _apply_decision(tiered, state)
+
+@traceable(name="route_ticket", metadata={"step": "routing"})
+async def aroute_ticket(state: TicketState) -> Dict:
+    """
+    Async version of route_ticket.
+    """
+    logger.debug("Making routing decision")
+    
+    update = _policy_decision(state) or _cached_decision(state)
+    if update is not None:
+        return update
+    
+    messages = _build_messages(state)
+    if not can_afford(state, messages):
+        return _budget_decision(state)
+    
+    try:
+        tiered = await ainvoke_tiered("router", ROUTER_MODEL, llm, escalation, messages, state, _parse_decision)
+    except Exception as e:
+        return _apply_fallback(e)
+    
+    return _apply_decision(tiered, state)
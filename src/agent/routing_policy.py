@@ -0,0 +1,79 @@
+"""Declarative routing policy evaluated through a precomputed lookup table"""
+import itertools
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+DEFAULT_POLICY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "routing_policy.json"
+)
+
+INTENTS = ("billing", "technical", "account", "sales", "general")
+TIERS = ("free", "pro", "enterprise", "unknown")
+
+# (intent, tier, has_faqs, urgent)
+PolicyKey = Tuple[str, str, bool, bool]
+
+def _matches(condition, value) -> bool:
+    if isinstance(condition, list):
+        return value in condition
+    return condition == value
+
+class RoutingPolicy:
+    """
+    Routing rules keyed on the same features the LLM router sees.
+    
+    Rules are expanded once, at load time, over every combination of
+    intent, tier, has_faqs and urgent language into a dict. Routing a
+    ticket is then a single dict lookup plus a confidence check.
+    """
+    
+    def __init__(self, policy: Dict):
+        self.default_min_confidence = float(policy.get("default_min_confidence", 0.8))
+        self.rules = policy.get("rules", [])
+        self.table: Dict[PolicyKey, Dict] = {}
+    
+        for key in itertools.product(INTENTS, TIERS, (True, False), (True, False)):
+            rule = self._first_match(key)
+            if rule is not None:
+                self.table[key] = self._decision(rule, key)
+    
+    @classmethod
+    def load(cls, path: str = None) -> "RoutingPolicy":
+        """Load a policy from a JSON file (ROUTING_POLICY_PATH by default)."""
+        path = path or os.getenv("ROUTING_POLICY_PATH", DEFAULT_POLICY_PATH)
+        with open(path, "r") as f:
+            return cls(json.load(f))
+    
+    def _first_match(self, key: PolicyKey) -> Optional[Dict]:
+        features = dict(zip(("intent", "tier", "has_faqs", "urgent"), key))
+        for rule in self.rules:
+            when = rule.get("when", {})
+            if all(_matches(condition, features[name]) for name, condition in when.items()):
+                return rule
+        return None
+    
+    def _decision(self, rule: Dict, key: PolicyKey) -> Dict:
+        intent = key[0]
+        team = rule.get("team")
+        return {
+            "action": rule["action"],
+            "team": team.format(intent=intent) if team else None,
+            "priority": rule["priority"],
+            "reasoning": f"Routing policy rule '{rule.get('name', 'unnamed')}'",
+            "min_confidence": float(rule.get("min_confidence", self.default_min_confidence)),
+        }
+    
+    def lookup(self, intent: str, tier: str, has_faqs: bool, urgent: bool,
+               confidence: float) -> Optional[Dict]:
+        """
+        Return the policy decision for these features, or None when no
+        rule matches or the classification is not confident enough.
+        """
+        decision = self.table.get((intent, tier, bool(has_faqs), bool(urgent)))
+        if decision is None or (confidence or 0.0) < decision["min_confidence"]:
+            return None
+        return decision
+
+# Loaded once at import (service startup)
+routing_policy = RoutingPolicy.load()
@@ -1,9 +1,27 @@
 """State schema for the support triage agent"""
-from typing import TypedDict, Literal, Optional, Dict, Any
+import operator
+from typing import Annotated, TypedDict, Literal, Optional, Dict, Any, List
+
+def merge_dicts(left: Optional[Dict], right: Optional[Dict]) -> Dict:
+    """Reducer for per-node dicts: each node adds its own key."""
+    return {**(left or {}), **(right or {})}
+
+def add_token_usage(left: Optional[Dict], right: Optional[Dict]) -> Dict:
+    """Reducer for per-node token usage: counts for the same node are summed."""
+    merged = {node: dict(counts) for node, counts in (left or {}).items()}
+    for node, counts in (right or {}).items():
+        totals = merged.setdefault(node, {})
+        for key, value in counts.items():
+            totals[key] = totals.get(key, 0) + value
+    return merged
 
 class TicketState(TypedDict):
     """
     State that flows through the agent graph.
+    
+    Nodes return partial updates. Classification and entity extraction
+    run in parallel and write disjoint keys; keys that several nodes may
+    write in the same step carry a reducer (e.g. total_tokens is summed).
     """
     # Input data
     ticket_id: str
@@ -19,20 +37,28 @@ class TicketState(TypedDict):
     
     # NEW: Entity extraction results
     entities: Optional[Dict[str, Any]]
+    extraction_path: Optional[str]  # rules, rules+llm, llm or fused
     
     # NEW: Retrieved context
     context: Optional[Dict[str, Any]]
+    prefetched_context: Optional[Dict[str, Any]]  # CRM data bulk-fetched for a batch
     
     # NEW: Routing decision
     action: Optional[Literal["auto_resolve", "escalate"]]
     team: Optional[str]
     priority: Optional[str]
+    routing_path: Optional[str]  # policy, llm, fallback or fused
     response: Optional[str]
     
     # Metadata
     timestamp: str
     model_used: str
-    total_tokens: int
+    total_tokens: Annotated[int, operator.add]
+    token_usage: Annotated[Dict[str, Dict[str, int]], add_token_usage]  # LLM node -> input/output tokens
+    token_budget: Optional[int]  # per-request override of TOKEN_BUDGET_PER_REQUEST
+    budget_fallbacks: Annotated[List[str], operator.add]  # nodes that skipped the LLM to stay in budget
+    cache_hits: Annotated[List[str], operator.add]  # nodes answered from the triage cache
+    node_timings: Annotated[Dict[str, float], merge_dicts]  # node name -> wall time in ms
 
 IntentType = Literal["billing", "technical", "account", "sales", "general"]
 ActionType = Literal["auto_resolve", "escalate"]
\ No newline at end of file
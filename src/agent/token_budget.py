@@ -0,0 +1,66 @@
+"""Per-node token accounting and per-request token budgets
+
+Every LLM-calling node adds its usage to state["token_usage"] (input and
+output tokens per node) and state["total_tokens"] via usage_update().
+
+A request may carry a token budget (TicketRequest.token_budget, else
+TOKEN_BUDGET_PER_REQUEST; unset or 0 = unlimited). Before each LLM call
+a node checks can_afford(): when the estimated cost of the call no
+longer fits in what is left, the node takes its cheap path instead
+(local model, rules or the routing policy) and records it with
+budget_fallback(). Nodes running in parallel check the budget
+independently, so the budget is a soft limit.
+"""
+import os
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+from src.log import get_logger
+from src.metrics import BUDGET_FALLBACKS
+
+# Default budget for requests that do not set one; 0 = unlimited
+TOKEN_BUDGET = int(os.getenv("TOKEN_BUDGET_PER_REQUEST", "0"))
+
+# Output tokens assumed for a call when checking it against the budget
+EXPECTED_OUTPUT_TOKENS = int(os.getenv("TOKEN_BUDGET_OUTPUT_ESTIMATE", "200"))
+
+logger = get_logger(__name__)
+
+def usage_update(node: str, *responses) -> Dict:
+    """total_tokens and token_usage state update for a node's LLM response(s)."""
+    input_tokens = output_tokens = 0
+    for response in responses:
+        usage = (getattr(response, "response_metadata", None) or {}).get("usage", {})
+        input_tokens += usage.get("input_tokens", 0) or 0
+        output_tokens += usage.get("output_tokens", 0) or 0
+    return {
+        "total_tokens": input_tokens + output_tokens,
+        "token_usage": {node: {"input_tokens": input_tokens, "output_tokens": output_tokens}}
+    }
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough cost of a call: ~4 characters per prompt token plus the expected output."""
+    return sum(len(str(m.content)) for m in messages) // 4 + EXPECTED_OUTPUT_TOKENS
+
+def remaining(state: Dict) -> Optional[int]:
+    """Tokens left in this request's budget, or None if it has none."""
+    budget = state.get("token_budget")
+    if budget is None:
+        budget = TOKEN_BUDGET or None
+    if budget is None:
+        return None
+    return budget - (state.get("total_tokens") or 0)
+
+def can_afford(state: Dict, messages: List[BaseMessage]) -> bool:
+    left = remaining(state)
+    return left is None or estimate_tokens(messages) <= left
+
+def budget_fallback(node: str, state: Dict) -> Dict:
+    """Record that node skipped its LLM call; merge the result into its update."""
+    BUDGET_FALLBACKS.labels(node).inc()
+    logger.info("Token budget exhausted, using the cheap path", extra={
+        "node": node,
+        "remaining_tokens": remaining(state)
+    })
+    return {"budget_fallbacks": [node]}
@@ -0,0 +1,120 @@
+"""Cache of LLM classification and routing decisions keyed on canonicalized queries"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from src.cache import TTLCache, MISSING
+
+CACHE_ENABLED = os.getenv("TRIAGE_CACHE_ENABLED", "true").lower() == "true"
+CACHE_SIZE = int(os.getenv("TRIAGE_CACHE_SIZE", "10000"))
+CACHE_TTL_S = float(os.getenv("TRIAGE_CACHE_TTL_S", "3600"))
+
+# One pass over the query; the group name is the placeholder
+_SLOT_PATTERN = re.compile(
+    r"(?P<AMOUNT>\$\s?\d[\d,]*(?:\.\d+)?)"
+    r"|(?P<ORDER_ID>#\s?\d+)"
+    r"|(?P<DATE>\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b)"
+    r"|(?P<NUM>\b\d+(?:\.\d+)?\b)"
+)
+_WHITESPACE = re.compile(r"\s+")
+
+# (placeholder, original text) in order of appearance
+Slots = List[Tuple[str, str]]
+
+classification_cache = TTLCache("classification", maxsize=CACHE_SIZE, ttl=CACHE_TTL_S)
+routing_cache = TTLCache("routing", maxsize=CACHE_SIZE, ttl=CACHE_TTL_S)
+
+def canonicalize(query: str) -> Tuple[str, Slots]:
+    """
+    Replace amounts, order IDs, dates and other numbers with placeholders.
+    
+    "I need a refund for order #48213" and "...order #51002" both become
+    "i need a refund for order <ORDER_ID>". The original values are
+    returned as slots so they can be put back into a cached decision.
+    """
+    slots: Slots = []
+    
+    def replace(match: re.Match) -> str:
+        slots.append((match.lastgroup, match.group(0)))
+        return f"<{match.lastgroup}>"
+    
+    canonical = _SLOT_PATTERN.sub(replace, query.lower())
+    return _WHITESPACE.sub(" ", canonical).strip(), slots
+
+def _core(value: str) -> str:
+    """A slot value without its "$" or "#", as the LLM often writes it back."""
+    return value.lstrip("$# ")
+
+def _to_template(text: str, slots: Slots) -> str:
+    """Swap this query's slot values in text for indexed placeholders."""
+    # Longest values first so "$199" is replaced before "$19"
+    for i, (name, value) in sorted(enumerate(slots), key=lambda s: len(s[1][1]), reverse=True):
+        text = text.replace(value, f"<{name}_{i}>")
+        core = _core(value)
+        if core != value:
+            text = re.sub(rf"(?<![\w<]){re.escape(core)}(?!\w)", f"<{name}_{i}_CORE>", text)
+    return text
+
+def _from_template(text: str, slots: Slots) -> str:
+    """Fill indexed placeholders with the slot values of the current query."""
+    for i, (name, value) in enumerate(slots):
+        text = text.replace(f"<{name}_{i}>", value).replace(f"<{name}_{i}_CORE>", _core(value))
+    return text
+
+# Classification is keyed on the canonical query alone: classify runs
+# before retrieve, so the user tier is not known yet and the prompt does
+# not use it. Routing does depend on the tier and is keyed on it.
+
+def get_classification(query: str) -> Optional[Dict]:
+    """Cached classification for a query with the same canonical form, or None."""
+    if not CACHE_ENABLED:
+        return None
+    
+    canonical, slots = canonicalize(query)
+    cached = classification_cache.get(canonical)
+    if cached is MISSING:
+        return None
+    
+    return {**cached, "reasoning": _from_template(cached["reasoning"], slots)}
+
+def put_classification(query: str, update: Dict):
+    if not CACHE_ENABLED:
+        return
+    
+    canonical, slots = canonicalize(query)
+    classification_cache.set(canonical, {
+        "intent": update["intent"],
+        "confidence": update["confidence"],
+        "reasoning": _to_template(update["reasoning"], slots),
+        "model_used": update.get("model_used", "")
+    })
+
+def get_routing(query: str, intent: str, tier: str) -> Optional[Dict]:
+    """Cached routing decision for (canonical query, intent, user tier), or None."""
+    if not CACHE_ENABLED:
+        return None
+    
+    canonical, slots = canonicalize(query)
+    cached = routing_cache.get((canonical, intent, tier))
+    if cached is MISSING:
+        return None
+    
+    return {**cached, "reasoning": _from_template(cached["reasoning"], slots)}
+
+def put_routing(query: str, intent: str, tier: str, decision: Dict):
+    if not CACHE_ENABLED:
+        return
+    
+    canonical, slots = canonicalize(query)
+    routing_cache.set((canonical, intent, tier), {
+        "action": decision["action"],
+        "team": decision.get("team"),
+        "priority": decision["priority"],
+        "reasoning": _to_template(decision.get("reasoning", ""), slots)
+    })
+
+def get_cache_stats() -> Dict[str, Dict]:
+    return {
+        "classification": classification_cache.stats(),
+        "routing": routing_cache.stats()
+    }
@@ -0,0 +1,268 @@
+"""Single-pass, vectorized aggregation of runs for the trace reports
+
+Runs are read once, in chunks. Each chunk becomes NumPy columns (step,
+latency, tokens, error flag, start time) and is folded into per-step
+accumulators with bincount, so latency, token, error and bottleneck
+reports all come from the same pass.
+
+Percentiles are exact by default (the latency column is kept and sorted
+once, grouped by step). With exact=False only a log-bucketed histogram
+per step is kept: memory is bounded regardless of the number of runs,
+percentiles are within LatencyHistogram.relative_error, and aggregators
+built over different windows or machines can be merged.
+"""
+import itertools
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_PERCENTILES = (50, 95, 99)
+CHUNK_SIZE = 65_536
+
+def grouped_percentiles(groups: np.ndarray, values: np.ndarray, num_groups: int,
+                        percentiles: Sequence[float]) -> np.ndarray:
+    """
+    Percentiles of values within each group, linear interpolation like
+    np.percentile. Returns a (num_groups, len(percentiles)) array, NaN
+    for empty groups. One lexsort for all groups.
+    """
+    result = np.full((num_groups, len(percentiles)), np.nan)
+    if len(values) == 0:
+        return result
+    
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    counts = np.bincount(groups, minlength=num_groups)
+    starts = np.cumsum(counts) - counts
+    present = counts > 0
+    
+    for j, q in enumerate(percentiles):
+        position = starts[present] + (counts[present] - 1) * (q / 100)
+        lo = np.floor(position).astype(np.int64)
+        hi = np.ceil(position).astype(np.int64)
+        weight = position - lo
+        result[present, j] = sorted_values[lo] * (1 - weight) + sorted_values[hi] * weight
+    return result
+
+class LatencyHistogram:
+    """
+    Mergeable per-step latency histogram with log-spaced buckets.
+    
+    Bucket i covers [min_s * growth**i, min_s * growth**(i+1)), so a
+    quantile read from the bucket's geometric midpoint is within
+    relative_error of the true value (values outside [min_s, max_s] are
+    clamped into the first/last bucket).
+    """
+    
+    def __init__(self, min_s: float = 1e-4, max_s: float = 600.0, growth: float = 1.04):
+        self.min_s = min_s
+        self.growth = growth
+        self.num_buckets = int(np.ceil(np.log(max_s / min_s) / np.log(growth))) + 1
+        self.counts: Dict[str, np.ndarray] = {}
+    
+    @property
+    def relative_error(self) -> float:
+        return (self.growth - 1) / 2
+    
+    def _buckets(self, latencies: np.ndarray) -> np.ndarray:
+        index = np.floor(np.log(np.maximum(latencies, self.min_s) / self.min_s) / np.log(self.growth))
+        return np.minimum(index, self.num_buckets - 1).astype(np.int64)
+    
+    def add(self, codes: np.ndarray, latencies: np.ndarray, names: List[str]):
+        """Add latencies (seconds) for step codes indexing into names."""
+        if len(latencies) == 0:
+            return
+        keys = codes.astype(np.int64) * self.num_buckets + self._buckets(latencies)
+        counts = np.bincount(keys, minlength=len(names) * self.num_buckets)
+        counts = counts.reshape(len(names), self.num_buckets)
+        for code in np.flatnonzero(counts.any(axis=1)):
+            self._counts_for(names[code])[:] += counts[code]
+    
+    def _counts_for(self, name: str) -> np.ndarray:
+        if name not in self.counts:
+            self.counts[name] = np.zeros(self.num_buckets, dtype=np.int64)
+        return self.counts[name]
+    
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        if (other.min_s, other.growth, other.num_buckets) != (self.min_s, self.growth, self.num_buckets):
+            raise ValueError("histograms have different bucket layouts")
+        for name, counts in other.counts.items():
+            self._counts_for(name)[:] += counts
+        return self
+    
+    def quantiles(self, name: str, percentiles: Sequence[float]) -> List[float]:
+        """Approximate percentiles (seconds) of one step's latencies."""
+        counts = self.counts.get(name)
+        if counts is None or not counts.any():
+            return [float("nan")] * len(percentiles)
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(percentiles) / 100 * (cumulative[-1] - 1)
+        buckets = np.searchsorted(cumulative, ranks, side="right")
+        return list(self.min_s * self.growth ** (buckets + 0.5))
+
+class RunAggregator:
+    """
+    Folds runs (RunRecord or rows in RunRecord field order) into per-step
+    totals in chunks. Feed it with add() or aggregate(), then read the
+    reports; merge() combines aggregators built separately.
+    """
+    
+    def __init__(self, exact: bool = True):
+        self.exact = exact
+        self.steps: Dict[str, int] = {}
+        self.step_names: List[str] = []
+        self.histogram = LatencyHistogram()
+        self.error_messages = Counter()
+        self.runs = 0
+        self.first_start: Optional[float] = None
+        self.last_start: Optional[float] = None
+    
+        # Per step (index = step code)
+        self.step_runs = np.zeros(0, dtype=np.int64)
+        self.latency_count = np.zeros(0, dtype=np.int64)
+        self.latency_sum = np.zeros(0)
+        self.latency_max = np.zeros(0)
+        self.errors = np.zeros(0, dtype=np.int64)
+        self.input_tokens = np.zeros(0, dtype=np.int64)
+        self.output_tokens = np.zeros(0, dtype=np.int64)
+        self.llm_calls = np.zeros(0, dtype=np.int64)
+    
+        # Only kept for exact percentiles
+        self._latency_codes: List[np.ndarray] = []
+        self._latency_values: List[np.ndarray] = []
+    
+    _PER_STEP = ("step_runs", "latency_count", "latency_sum", "latency_max",
+                 "errors", "input_tokens", "output_tokens", "llm_calls")
+    
+    def _codes(self, names: Sequence[Optional[str]]) -> np.ndarray:
+        steps = self.steps
+        for name in set(names) - steps.keys():
+            steps[name] = len(self.step_names)
+            self.step_names.append(name)
+        grow = len(self.step_names) - len(self.step_runs)
+        if grow:
+            for attr in self._PER_STEP:
+                current = getattr(self, attr)
+                setattr(self, attr, np.concatenate([current, np.zeros(grow, dtype=current.dtype)]))
+        return np.fromiter((steps[name] for name in names), dtype=np.int32, count=len(names))
+    
+    def add(self, rows: Sequence[Sequence]):
+        """Fold one chunk of rows: (run_id, name, start_time, latency_s, input_tokens, output_tokens, error)."""
+        if not rows:
+            return
+        _, names, start_times, latencies, input_tokens, output_tokens, errors = zip(*rows)
+        n = len(rows)
+        self.runs += n
+    
+        codes = self._codes(names)
+        num_steps = len(self.step_names)
+        # None -> NaN; a zero latency is treated as missing, as before
+        latencies = np.array(latencies, dtype=np.float64)
+        input_tokens = np.array(input_tokens, dtype=np.int64)
+        output_tokens = np.array(output_tokens, dtype=np.int64)
+        failed = np.fromiter((e is not None for e in errors), dtype=bool, count=n)
+        start_times = np.array(start_times, dtype=np.float64)
+    
+        # Unnamed runs only count towards totals, not steps
+        named = np.fromiter((name is not None for name in names), dtype=bool, count=n)
+        timed = named & (latencies > 0)
+    
+        self.step_runs += np.bincount(codes[named], minlength=num_steps)
+        self.latency_count += np.bincount(codes[timed], minlength=num_steps)
+        self.latency_sum += np.bincount(codes[timed], weights=latencies[timed], minlength=num_steps)
+        np.maximum.at(self.latency_max, codes[timed], latencies[timed])
+        self.errors += np.bincount(codes[failed & named], minlength=num_steps)
+    
+        used_tokens = (input_tokens > 0) | (output_tokens > 0)
+        self.input_tokens += np.bincount(codes[used_tokens], weights=input_tokens[used_tokens],
+                                         minlength=num_steps).astype(np.int64)
+        self.output_tokens += np.bincount(codes[used_tokens], weights=output_tokens[used_tokens],
+                                          minlength=num_steps).astype(np.int64)
+        self.llm_calls += np.bincount(codes[used_tokens], minlength=num_steps)
+    
+        for i in np.flatnonzero(failed):
+            self.error_messages[str(errors[i])[:100]] += 1
+    
+        valid_starts = start_times[~np.isnan(start_times)]
+        if len(valid_starts):
+            lo, hi = float(valid_starts.min()), float(valid_starts.max())
+            self.first_start = lo if self.first_start is None else min(self.first_start, lo)
+            self.last_start = hi if self.last_start is None else max(self.last_start, hi)
+    
+        self.histogram.add(codes[timed], latencies[timed], self.step_names)
+        if self.exact:
+            self._latency_codes.append(codes[timed])
+            self._latency_values.append(latencies[timed])
+    
+    def aggregate(self, runs: Iterable, chunk_size: int = CHUNK_SIZE) -> "RunAggregator":
+        """Fold every run from an iterable (or a StoredRuns view, read in raw chunks)."""
+        if hasattr(runs, "iter_chunks"):
+            chunks = runs.iter_chunks(chunk_size)
+        else:
+            iterator = iter(runs)
+            chunks = iter(lambda: list(itertools.islice(iterator, chunk_size)), [])
+        for chunk in chunks:
+            self.add(chunk)
+        return self
+    
+    def merge(self, other: "RunAggregator") -> "RunAggregator":
+        """Add another aggregator's totals (and latencies, if both are exact)."""
+        remap = self._codes(other.step_names)
+        for attr in self._PER_STEP:
+            if attr == "latency_max":
+                np.maximum.at(self.latency_max, remap, other.latency_max)
+            else:
+                np.add.at(getattr(self, attr), remap, getattr(other, attr))
+        self.runs += other.runs
+        self.error_messages.update(other.error_messages)
+        self.histogram.merge(other.histogram)
+        for bound, pick in (("first_start", min), ("last_start", max)):
+            values = [v for v in (getattr(self, bound), getattr(other, bound)) if v is not None]
+            setattr(self, bound, pick(values) if values else None)
+        if self.exact and other.exact:
+            self._latency_codes.extend(remap[codes] for codes in other._latency_codes)
+            self._latency_values.extend(other._latency_values)
+        else:
+            self.exact = False
+            self._latency_codes, self._latency_values = [], []
+        return self
+    
+    def latency_by_step(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Dict]:
+        """Count, mean, max and percentiles (ms) of each step's latency."""
+        if self.exact and self._latency_values:
+            values = grouped_percentiles(
+                np.concatenate(self._latency_codes), np.concatenate(self._latency_values),
+                len(self.step_names), percentiles
+            )
+        else:
+            values = np.array([self.histogram.quantiles(name, percentiles) for name in self.step_names])
+    
+        report = {}
+        for code in np.flatnonzero(self.latency_count):
+            name = self.step_names[code]
+            count = int(self.latency_count[code])
+            report[name] = {
+                "count": count,
+                "mean_ms": self.latency_sum[code] / count * 1000,
+                "max_ms": self.latency_max[code] * 1000,
+                **{f"p{q:g}_ms": values[code, j] * 1000 for j, q in enumerate(percentiles)}
+            }
+        return report
+    
+    def token_usage(self) -> Dict[str, int]:
+        total_input = int(self.input_tokens.sum())
+        total_output = int(self.output_tokens.sum())
+        return {
+            "input_tokens": total_input,
+            "output_tokens": total_output,
+            "total_tokens": total_input + total_output,
+            "llm_calls": int(self.llm_calls.sum())
+        }
+    
+    def errors_by_step(self) -> Dict[str, int]:
+        return {self.step_names[code]: int(self.errors[code]) for code in np.flatnonzero(self.errors)}
+
+def aggregate(runs: Iterable, exact: bool = True, chunk_size: int = CHUNK_SIZE) -> RunAggregator:
+    """One pass over runs; see RunAggregator."""
+    return RunAggregator(exact=exact).aggregate(runs, chunk_size)
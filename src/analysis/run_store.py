@@ -0,0 +1,227 @@
+"""Local SQLite store of LangSmith runs for incremental trace analysis
+
+Runs are flattened to RunRecord rows (the fields the analyzer reports
+on) and upserted by run ID. Each project keeps the time range its
+completed syncs covered in full (low- and high-water marks), so the
+next sync only asks LangSmith for runs outside it. Reads stream from a
+cursor in chunks, so analyzing millions of runs never holds them all in
+memory.
+"""
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+DEFAULT_STORE_PATH = os.getenv("TRACE_STORE_PATH", "traces/runs.db")
+
+class RunRecord(NamedTuple):
+    """One run, reduced to what the analysis reports need."""
+    run_id: str
+    name: Optional[str]
+    start_time: Optional[float]   # epoch seconds, UTC
+    latency_s: Optional[float]
+    input_tokens: int = 0
+    output_tokens: int = 0
+    error: Optional[str] = None
+
+_COLUMNS = RunRecord._fields
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    project TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    name TEXT,
+    start_time REAL,
+    latency_s REAL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (project, run_id)
+);
+CREATE INDEX IF NOT EXISTS runs_by_time ON runs (project, start_time);
+CREATE TABLE IF NOT EXISTS sync_state (
+    project TEXT PRIMARY KEY,
+    high_water REAL NOT NULL,
+    synced_at TEXT NOT NULL,
+    low_water REAL
+);
+"""
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    # LangSmith returns naive datetimes in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def _latency(run) -> Optional[float]:
+    """Latency in seconds (handles different attribute names)"""
+    if getattr(run, "latency", None):
+        return run.latency
+    if getattr(run, "end_time", None) and getattr(run, "start_time", None):
+        return (run.end_time - run.start_time).total_seconds()
+    return None
+
+def _tokens(run) -> tuple:
+    """(input, output) tokens, from wherever this run recorded them"""
+    input_tokens = 0
+    output_tokens = 0
+    
+    # Method 1: Check outputs
+    outputs = getattr(run, "outputs", None)
+    if outputs and isinstance(outputs, dict):
+        input_tokens = outputs.get("total_tokens", 0) or outputs.get("input_tokens", 0)
+        output_tokens = outputs.get("output_tokens", 0)
+    
+    # Method 2: Check extra metadata
+    extra = getattr(run, "extra", None)
+    if extra and isinstance(extra, dict):
+        usage = extra.get("usage", {})
+        if usage:
+            input_tokens = usage.get("input_tokens", 0)
+            output_tokens = usage.get("output_tokens", 0)
+    
+    # Method 3: Check if run has prompt_tokens/completion_tokens
+    if hasattr(run, "prompt_tokens"):
+        input_tokens = run.prompt_tokens or 0
+    if hasattr(run, "completion_tokens"):
+        output_tokens = run.completion_tokens or 0
+    
+    return int(input_tokens or 0), int(output_tokens or 0)
+
+def _error(run) -> Optional[str]:
+    if getattr(run, "error", None):
+        return str(run.error)
+    if getattr(run, "status", None) == "error":
+        return "Error (no message)"
+    return None
+
+def to_record(run) -> RunRecord:
+    """Flatten a LangSmith Run into a RunRecord."""
+    input_tokens, output_tokens = _tokens(run)
+    return RunRecord(
+        run_id=str(run.id),
+        name=run.name,
+        start_time=_epoch(run.start_time),
+        latency_s=_latency(run),
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        error=_error(run)
+    )
+
+class StoredRuns:
+    """
+    Re-iterable view of a project's stored runs since a point in time.
+    Each iteration is a fresh streaming query, so several reports can
+    walk the same window without loading it into a list.
+    """
+    
+    def __init__(self, store: "RunStore", project: str, since: Optional[float] = None):
+        self.store = store
+        self.project = project
+        self.since = since
+    
+    def __iter__(self) -> Iterator[RunRecord]:
+        return self.store.iter_runs(self.project, self.since)
+    
+    def iter_chunks(self, chunk_size: int = 10_000) -> Iterator[List[tuple]]:
+        return self.store.iter_chunks(self.project, self.since, chunk_size)
+    
+    def __len__(self) -> int:
+        return self.store.count(self.project, self.since)
+
+class RunStore:
+    """SQLite-backed run store, keyed by (project, run ID)."""
+    
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sync_state)")}
+        if "low_water" not in columns:
+            # Stores written before low_water existed: their range is unknown,
+            # so the next sync fetches its whole window again
+            self.conn.execute("ALTER TABLE sync_state ADD COLUMN low_water REAL")
+    
+    def upsert(self, project: str, records: Iterable[RunRecord], batch_size: int = 1000) -> int:
+        """
+        Insert or replace records in batches of batch_size, committing each
+        batch. A run fetched again (e.g. it was still running last time)
+        replaces its earlier row. Returns the number of records written.
+        """
+        sql = (
+            f"INSERT OR REPLACE INTO runs (project, {', '.join(_COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' * len(_COLUMNS))})"
+        )
+        written = 0
+        batch = []
+        for record in records:
+            batch.append((project, *record))
+            if len(batch) >= batch_size:
+                with self.conn:
+                    self.conn.executemany(sql, batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            with self.conn:
+                self.conn.executemany(sql, batch)
+            written += len(batch)
+        return written
+    
+    def synced_range(self, project: str) -> Optional[Tuple[float, float]]:
+        """
+        (low, high) start times (epoch seconds) that completed syncs have
+        fetched every run between, or None if nothing is known.
+        """
+        row = self.conn.execute(
+            "SELECT low_water, high_water FROM sync_state WHERE project = ?", (project,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return row[0], row[1]
+    
+    def set_synced_range(self, project: str, low: float, high: float):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (project, low_water, high_water, synced_at) VALUES (?, ?, ?, ?)",
+                (project, low, high, datetime.utcnow().isoformat())
+            )
+    
+    def _where(self, project: str, since: Optional[float]) -> tuple:
+        if since is None:
+            return "project = ?", (project,)
+        return "project = ? AND start_time >= ?", (project, since)
+    
+    def iter_chunks(self, project: str, since: Optional[float] = None,
+                    chunk_size: int = 10_000) -> Iterator[List[tuple]]:
+        """Stream stored runs as lists of raw rows (RunRecord field order)."""
+        where, params = self._where(project, since)
+        cursor = self.conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM runs WHERE {where}", params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+    
+    def iter_runs(self, project: str, since: Optional[float] = None,
+                  chunk_size: int = 10_000) -> Iterator[RunRecord]:
+        """Stream stored runs, chunk_size rows at a time."""
+        for rows in self.iter_chunks(project, since, chunk_size):
+            for row in rows:
+                yield RunRecord(*row)
+    
+    def count(self, project: str, since: Optional[float] = None) -> int:
+        where, params = self._where(project, since)
+        return self.conn.execute(f"SELECT COUNT(*) FROM runs WHERE {where}", params).fetchone()[0]
+    
+    def runs(self, project: str, since: Optional[float] = None) -> StoredRuns:
+        return StoredRuns(self, project, since)
+    
+    def close(self):
+        self.conn.close()
@@ -1,47 +1,124 @@
-"""Analyze LangSmith traces to find optimization opportunities"""
+"""Analyze LangSmith traces to find optimization opportunities
+
+    python -m src.analysis.trace_analyzer                    # LangSmith project
+    python -m src.analysis.trace_analyzer --files traces/    # offline, JSONL trace files
+"""
+import argparse
 import os
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from dotenv import load_dotenv
 from langsmith import Client
-from collections import defaultdict
-import statistics
+from src.analysis.aggregate import RunAggregator, aggregate
+from src.analysis.run_store import RunStore, to_record
+from src.analysis.trace_files import TraceFileSource
 
 load_dotenv()
 
+# Re-fetch this far behind the high-water mark, to pick up runs that were
+# still in progress (or not yet ingested by LangSmith) at the last sync
+SYNC_OVERLAP_S = float(os.getenv("TRACE_SYNC_OVERLAP_S", "600"))
+
 class TraceAnalyzer:
-    """Analyze agent performance from LangSmith traces"""
+    """
+    Analyze agent performance from LangSmith traces, or offline from
+    trace files (JSONL, optionally compressed) when `files` is given.
+    """
+    
+    def __init__(self, project_name: str = None, store: RunStore = None, files=None):
+        self.project_name = project_name or os.getenv("LANGCHAIN_PROJECT", "default")
+        self.source = TraceFileSource(files) if files else None
+        # Trace files need neither the LangSmith client nor the run store
+        self.client = Client() if self.source is None else None
+        self.store = None if self.source is not None else store or RunStore()
     
-    def __init__(self, project_name: str = None):
-        self.client = Client()
-        self.project_name = project_name or os.getenv("LANGCHAIN_PROJECT")
+    def sync_runs(self, hours: int = 24, limit: int = None) -> int:
+        """
+        Stream the runs of the last `hours` that the store does not have
+        yet from LangSmith into the local store: runs newer than its
+        synced range, and older ones when the window reaches further back
+        than earlier syncs did. list_runs pages lazily, so runs are
+        written batch by batch and never all held in memory. Returns the
+        number of runs written.
+        
+        LangSmith returns the newest runs first, so a fetch cut off by
+        `limit` misses the oldest runs of its span; the synced range is
+        only extended over spans fetched in full.
+        """
+        window_start = time.time() - hours * 3600
+        synced = self.store.synced_range(self.project_name)
+        
+        if synced is None or synced[1] < window_start:
+            # Nothing synced that overlaps the window: fetch all of it
+            written, newest = self._fetch_span(window_start, None, limit)
+            if limit is None or written < limit:
+                self.store.set_synced_range(self.project_name, window_start, newest or window_start)
+            return written
+        
+        low, high = synced
+        # Re-fetch a little behind the high-water mark for runs that were
+        # still in progress (or not yet ingested) at the last sync
+        written, newest = self._fetch_span(max(window_start, high - SYNC_OVERLAP_S), None, limit)
+        if (limit is None or written < limit) and newest:
+            high = max(high, newest)
+        
+        if window_start < low:
+            count, _ = self._fetch_span(window_start, low, limit)
+            written += count
+            if limit is None or count < limit:
+                low = window_start
+        
+        # Only reached once every span has been stored, so an interrupted
+        # sync is retried from the same point
+        self.store.set_synced_range(self.project_name, low, high)
+        return written
+    
+    def _fetch_span(self, start: float, end: float = None, limit: int = None) -> tuple:
+        """Store the runs started in [start, end); returns (count, newest start time or None)."""
+        newest = [None]
+        # list_runs has no end_time; bound older spans with a filter instead
+        run_filter = f'lt(start_time, "{datetime.utcfromtimestamp(end).isoformat()}")' if end is not None else None
+        
+        def records():
+            for run in self.client.list_runs(
+                project_name=self.project_name,
+                start_time=datetime.utcfromtimestamp(start),
+                filter=run_filter,
+                limit=limit
+            ):
+                record = to_record(run)
+                if record.start_time and (newest[0] is None or record.start_time > newest[0]):
+                    newest[0] = record.start_time
+                yield record
+        
+        written = self.store.upsert(self.project_name, records())
+        if limit is not None and written >= limit:
+            print(f"⚠️  Fetched the newest {limit} runs only; older runs in the window were not synced")
+        return written, newest[0]
+    
+    def get_recent_runs(self, hours: int = 24, limit: int = None):
+        """
+        Sync new runs from LangSmith, then return the stored runs from the
+        last `hours` as a re-iterable, streaming view. With trace files,
+        stream those instead (hours=None reads every run in them).
+        """
+        if self.source is not None:
+            print(f"\n📊 Reading runs from {len(self.source.paths)} trace files...")
+            since = time.time() - hours * 3600 if hours else None
+            return self.source.window(since)
         
-    def get_recent_runs(self, hours: int = 24, limit: int = 100):
-        """Fetch recent runs from LangSmith"""
         print(f"\n📊 Fetching runs from last {hours} hours...")
         
-        # Calculate time window
-        start_time = datetime.now() - timedelta(hours=hours)
+        fetched = self.sync_runs(hours=hours, limit=limit)
+        runs = self.store.runs(self.project_name, since=time.time() - hours * 3600)
         
-        # Fetch runs
-        runs = list(self.client.list_runs(
-            project_name=self.project_name,
-            start_time=start_time,
-            limit=limit
-        ))
-        
-        print(f"✓ Found {len(runs)} runs\n")
+        print(f"✓ Found {len(runs)} runs ({fetched} fetched from LangSmith)\n")
         return runs
     
-    def _get_latency(self, run):
-        """Get latency from run object (handles different attribute names)"""
-        # Try different possible attribute names
-        if hasattr(run, 'latency') and run.latency:
-            return run.latency
-        elif hasattr(run, 'total_tokens') and run.end_time and run.start_time:
-            return (run.end_time - run.start_time).total_seconds()
-        elif run.end_time and run.start_time:
-            return (run.end_time - run.start_time).total_seconds()
-        return None
+    @staticmethod
+    def _aggregate(runs) -> RunAggregator:
+        """Reports accept runs or an aggregator already built from them."""
+        return runs if isinstance(runs, RunAggregator) else aggregate(runs)
     
     def analyze_latency(self, runs):
         """Analyze latency by step"""
@@ -49,33 +126,19 @@ class TraceAnalyzer:
         print("⏱️  LATENCY ANALYSIS")
         print("="*70)
         
-        step_latencies = defaultdict(list)
-        
-        for run in runs:
-            if run.name:
-                latency = self._get_latency(run)
-                if latency:
-                    step_latencies[run.name].append(latency)
+        step_latencies = self._aggregate(runs).latency_by_step()
         
         if not step_latencies:
             print("\n⚠️  No latency data available\n")
             return step_latencies
         
-        print(f"\n{'Step':<25} {'Count':<8} {'P50':<10} {'P95':<10} {'Max':<10}")
+        print(f"\n{'Step':<25} {'Count':<8} {'P50':<10} {'P95':<10} {'P99':<10} {'Max':<10}")
         print("-"*70)
         
         for step_name in sorted(step_latencies.keys()):
-            latencies = step_latencies[step_name]
-            
-            if len(latencies) > 0:
-                # Convert to milliseconds
-                latencies_ms = [l * 1000 for l in latencies]
-                
-                p50 = statistics.median(latencies_ms)
-                p95 = statistics.quantiles(latencies_ms, n=20)[18] if len(latencies_ms) > 1 else latencies_ms[0]
-                max_lat = max(latencies_ms)
-                
-                print(f"{step_name:<25} {len(latencies):<8} {p50:<10.0f} {p95:<10.0f} {max_lat:<10.0f}")
+            stats = step_latencies[step_name]
+            print(f"{step_name:<25} {stats['count']:<8} {stats['p50_ms']:<10.0f} {stats['p95_ms']:<10.0f} "
+                  f"{stats['p99_ms']:<10.0f} {stats['max_ms']:<10.0f}")
         
         print()
         return step_latencies
@@ -86,40 +149,11 @@ class TraceAnalyzer:
         print("💰 TOKEN USAGE & COST ANALYSIS")
         print("="*70)
         
-        total_tokens = 0
-        total_input = 0
-        total_output = 0
-        llm_calls = 0
-        
-        for run in runs:
-            # Check for token usage in different places
-            input_tokens = 0
-            output_tokens = 0
-            
-            # Method 1: Check outputs
-            if hasattr(run, 'outputs') and run.outputs and isinstance(run.outputs, dict):
-                input_tokens = run.outputs.get('total_tokens', 0) or run.outputs.get('input_tokens', 0)
-                output_tokens = run.outputs.get('output_tokens', 0)
-            
-            # Method 2: Check extra metadata
-            if hasattr(run, 'extra') and run.extra and isinstance(run.extra, dict):
-                usage = run.extra.get('usage', {})
-                if usage:
-                    input_tokens = usage.get('input_tokens', 0)
-                    output_tokens = usage.get('output_tokens', 0)
-            
-            # Method 3: Check if run has prompt_tokens/completion_tokens
-            if hasattr(run, 'prompt_tokens'):
-                input_tokens = run.prompt_tokens or 0
-            if hasattr(run, 'completion_tokens'):
-                output_tokens = run.completion_tokens or 0
-            
-            if input_tokens > 0 or output_tokens > 0:
-                total_input += input_tokens
-                total_output += output_tokens
-                llm_calls += 1
-        
-        total_tokens = total_input + total_output
+        usage = self._aggregate(runs).token_usage()
+        total_input = usage["input_tokens"]
+        total_output = usage["output_tokens"]
+        total_tokens = usage["total_tokens"]
+        llm_calls = usage["llm_calls"]
         
         if llm_calls == 0:
             print("\n⚠️  No token usage data available")
@@ -161,26 +195,9 @@ class TraceAnalyzer:
         print("❌ ERROR ANALYSIS")
         print("="*70)
         
-        errors = defaultdict(int)
-        error_steps = defaultdict(int)
-        
-        for run in runs:
-            error = None
-            
-            # Check different error attributes
-            if hasattr(run, 'error') and run.error:
-                error = run.error
-            elif hasattr(run, 'status') and run.status == 'error':
-                error = "Error (no message)"
-            
-            if error:
-                # Count by error type
-                error_msg = str(error)[:100]
-                errors[error_msg] += 1
-                
-                # Count by step
-                if run.name:
-                    error_steps[run.name] += 1
+        stats = self._aggregate(runs)
+        errors = stats.error_messages
+        error_steps = stats.errors_by_step()
         
         if not errors:
             print("\n✅ No errors found!\n")
@@ -217,19 +234,11 @@ class TraceAnalyzer:
         print("🔍 BOTTLENECK IDENTIFICATION")
         print("="*70)
         
-        step_latencies = defaultdict(list)
-        
-        for run in runs:
-            if run.name:
-                latency = self._get_latency(run)
-                if latency:
-                    step_latencies[run.name].append(latency)
-        
         # Find slowest steps
-        avg_latencies = {}
-        for step, latencies in step_latencies.items():
-            if latencies:
-                avg_latencies[step] = statistics.mean(latencies)
+        avg_latencies = {
+            step: stats["mean_ms"] / 1000
+            for step, stats in self._aggregate(runs).latency_by_step(percentiles=()).items()
+        }
         
         if not avg_latencies:
             print("\n⚠️  No latency data available\n")
@@ -258,29 +267,44 @@ class TraceAnalyzer:
         
         print()
     
-    def run_full_analysis(self, hours: int = 24):
-        """Run complete analysis"""
+    def run_full_analysis(self, hours: int = 24, exact: bool = True):
+        """
+        Run complete analysis. All reports share one pass over the runs;
+        exact=False keeps only mergeable histograms (approximate
+        percentiles, bounded memory) for very large windows.
+        """
         print("\n" + "="*70)
         print(f"🔬 FULL AGENT ANALYSIS - {self.project_name}")
         print("="*70)
         
         runs = self.get_recent_runs(hours=hours)
+        stats = aggregate(runs, exact=exact)
         
-        if not runs:
+        if not stats.runs:
             print("⚠️  No runs found in the specified time window")
             return
         
-        self.analyze_latency(runs)
-        self.analyze_token_usage(runs)
-        self.analyze_errors(runs)
-        self.analyze_intent_accuracy(runs)
-        self.identify_bottlenecks(runs)
+        print(f"✓ Aggregated {stats.runs} runs\n")
+        
+        self.analyze_latency(stats)
+        self.analyze_token_usage(stats)
+        self.analyze_errors(stats)
+        self.analyze_intent_accuracy(stats)
+        self.identify_bottlenecks(stats)
         
         print("="*70)
         print("✅ Analysis complete!")
-        print(f"🔗 View detailed traces: https://smith.langchain.com/")
+        if self.source is None:
+            print(f"🔗 View detailed traces: https://smith.langchain.com/")
         print("="*70 + "\n")
 
 if __name__ == "__main__":
-    analyzer = TraceAnalyzer()
-    analyzer.run_full_analysis(hours=24)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Analyze agent traces")
+    parser.add_argument("--files", nargs="+", help="Trace files, directories or globs (.jsonl, .jsonl.gz, ...) instead of LangSmith")
+    parser.add_argument("--hours", type=float, default=24, help="Time window; 0 = every run in the trace files")
+    parser.add_argument("--project", help="LangSmith project (default: LANGCHAIN_PROJECT)")
+    parser.add_argument("--approximate", action="store_true", help="Histogram percentiles, bounded memory")
+    args = parser.parse_args()
+    
+    analyzer = TraceAnalyzer(project_name=args.project, files=args.files)
+    analyzer.run_full_analysis(hours=args.hours, exact=not args.approximate)
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""Trace files: run records as JSON lines, optionally compressed
+
+Lets the analyzer work without LangSmith or network access. Each line
+is one run:
+
+    {"run_id": "...", "name": "classify", "start_time": 1734000000.12,
+     "latency_s": 0.41, "input_tokens": 310, "output_tokens": 42,
+     "error": null}
+
+A record with "rollup": true (the API's per-ticket root record) repeats
+the tokens of its child node records; its tokens are not counted again.
+start_time may also be an ISO timestamp, and exported LangSmith runs
+(id, start_time, end_time, error/status, extra.usage, ...) are read as
+well. Files ending in .gz, .bz2 or .xz are decompressed on the fly.
+
+TraceFileSource streams the files in chunks, so memory stays bounded
+however many runs they hold. TraceExporter is what the API uses to
+write its own per-node timings in this format (TRACE_EXPORT_PATH).
+"""
+import atexit
+import bz2
+import glob
+import gzip
+import json
+import lzma
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from src.analysis.run_store import RunRecord
+
+_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+def _open(path: str, mode: str):
+    opener = _OPENERS.get(os.path.splitext(path)[1], open)
+    return opener(path, mode + "t", encoding="utf-8")
+
+def _timestamp(value) -> Optional[float]:
+    if value is None or isinstance(value, (int, float)):
+        return value
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def record_from_dict(data: Dict) -> RunRecord:
+    """Our own trace lines, or a LangSmith run exported as JSON."""
+    start_time = _timestamp(data.get("start_time"))
+    
+    latency = data.get("latency_s")
+    if latency is None and data.get("latency_ms") is not None:
+        latency = data["latency_ms"] / 1000
+    if latency is None and data.get("end_time") and start_time is not None:
+        latency = _timestamp(data["end_time"]) - start_time
+    
+    usage = (data.get("extra") or {}).get("usage") or {}
+    # total_tokens alone counts as input, as in the LangSmith outputs
+    input_tokens = usage.get("input_tokens") or data.get("input_tokens") or data.get("prompt_tokens") \
+        or data.get("total_tokens") or 0
+    output_tokens = usage.get("output_tokens") or data.get("output_tokens") or data.get("completion_tokens") or 0
+    if data.get("rollup"):
+        input_tokens = output_tokens = 0
+    
+    error = data.get("error")
+    if not error and data.get("status") == "error":
+        error = "Error (no message)"
+    
+    return RunRecord(
+        run_id=str(data.get("run_id") or data.get("id")),
+        name=data.get("name"),
+        start_time=start_time,
+        latency_s=latency,
+        input_tokens=int(input_tokens),
+        output_tokens=int(output_tokens),
+        error=str(error) if error else None
+    )
+
+def expand_paths(paths: Union[str, Sequence[str]]) -> List[str]:
+    """Files, directories (every trace file inside) and glob patterns, sorted."""
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in os.listdir(path)
+                if ".jsonl" in name
+            )
+        else:
+            files.extend(glob.glob(path) or [path])
+    return sorted(files)
+
+class TraceFileSource:
+    """
+    Re-iterable, streaming view of the runs in trace files, optionally
+    limited to runs that started at or after `since` (epoch seconds).
+    """
+    
+    def __init__(self, paths: Union[str, Sequence[str]], since: Optional[float] = None):
+        self.paths = expand_paths(paths)
+        self.since = since
+    
+    def window(self, since: Optional[float]) -> "TraceFileSource":
+        return TraceFileSource(self.paths, since)
+    
+    def __iter__(self) -> Iterator[RunRecord]:
+        for path in self.paths:
+            with _open(path, "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = record_from_dict(json.loads(line))
+                    if self.since is None or (record.start_time or 0) >= self.since:
+                        yield record
+    
+    def iter_chunks(self, chunk_size: int = 10_000) -> Iterator[List[RunRecord]]:
+        chunk = []
+        for record in self:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+class TraceExporter:
+    """
+    Appends run records to a trace file from a background thread, so the
+    request path only puts a dict on a queue. A .gz path is written as
+    gzip members, which readers decompress as one stream.
+    """
+    
+    def __init__(self, path: str, flush_interval_s: float = 1.0):
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._queue: "queue.SimpleQueue[Optional[Dict]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def export(self, records: Iterable[Dict]):
+        for record in records:
+            self._queue.put(record)
+    
+    def _run(self):
+        with _open(self.path, "a") as f:
+            while True:
+                try:
+                    record = self._queue.get(timeout=self.flush_interval_s)
+                except queue.Empty:
+                    # Idle: make what was written so far visible to readers
+                    f.flush()
+                    continue
+                if record is None:
+                    return
+                f.write(json.dumps(record, default=str) + "\n")
+    
+    def close(self):
+        """Write out everything queued so far and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+def ticket_records(ticket_id: str, started_at: float, latency_s: float, node_timings_ms: Dict[str, float],
+                   node_tokens: Optional[Dict[str, Dict[str, int]]] = None, error: Optional[str] = None,
+                   **metadata) -> List[Dict]:
+    """
+    Trace lines for one triaged ticket: a "triage_ticket" root record and
+    one record per graph node (node start times are not tracked, so they
+    carry the ticket's start time). node_tokens maps node name to its
+    input_tokens and output_tokens; the root carries their sums, marked
+    as a rollup so readers don't count them twice.
+    """
+    node_tokens = node_tokens or {}
+    root = {
+        "run_id": uuid.uuid4().hex,
+        "name": "triage_ticket",
+        "ticket_id": ticket_id,
+        "start_time": started_at,
+        "latency_s": latency_s,
+        "input_tokens": sum(usage.get("input_tokens", 0) for usage in node_tokens.values()),
+        "output_tokens": sum(usage.get("output_tokens", 0) for usage in node_tokens.values()),
+        "rollup": True,
+        "error": error,
+        **metadata
+    }
+    return [root] + [
+        {
+            "run_id": uuid.uuid4().hex,
+            "parent_run_id": root["run_id"],
+            "name": node,
+            "ticket_id": ticket_id,
+            "start_time": started_at,
+            "latency_s": ms / 1000,
+            "input_tokens": node_tokens.get(node, {}).get("input_tokens", 0),
+            "output_tokens": node_tokens.get(node, {}).get("output_tokens", 0),
+            "error": None
+        }
+        for node, ms in node_timings_ms.items()
+    ]
@@ -0,0 +1,85 @@
+"""In-process LRU cache with TTL expiry and hit/miss/eviction counters"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+from src.metrics import register_cache
+
+# Returned by get() on a miss, so None can be cached as a real value
+MISSING = object()
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after ttl seconds.
+    
+    Safe to share between threads (sync graph path) and coroutines
+    (async path). stats() exposes counters, which every cache also
+    exports to Prometheus under its name.
+    """
+    
+    def __init__(self, name: str, maxsize: int = 10_000, ttl: float = 3600.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        register_cache(name, self)
+    
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+    
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+    
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop one entry. Returns True if it was cached."""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
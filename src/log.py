@@ -0,0 +1,165 @@
+"""Structured, level-gated logging for the agent and tools
+
+Modules log through get_logger(__name__) with %-style arguments and
+extra={...} fields, so a disabled level costs one integer comparison
+and nothing is formatted. Enabled records are handed to a queue with
+only msg % args resolved; a background thread formats them (text or
+JSON) and writes them, so concurrent requests never contend on the
+stream lock.
+
+    LOG_LEVEL        DEBUG | INFO | WARNING | ERROR (default INFO)
+    LOG_FORMAT       text | json (default text)
+    LOG_SAMPLE_RATE  fraction of tickets whose DEBUG/INFO records are
+                     kept (default 1.0); warnings and errors always are
+
+Every record carries the ticket_id of the ticket being processed, set
+by the API and by each graph node through ticket_context().
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Logger trees configured here (modules log under their __name__)
+NAMESPACES = ("src", "api")
+
+ticket_id_var: ContextVar[Optional[str]] = ContextVar("ticket_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "ticket_id"}
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+@contextmanager
+def ticket_context(ticket_id: Optional[str]):
+    """Tag every record logged inside the block with ticket_id."""
+    token = ticket_id_var.set(ticket_id)
+    try:
+        yield
+    finally:
+        ticket_id_var.reset(token)
+
+class TicketFilter(logging.Filter):
+    """
+    Stamps the current ticket_id on each record and applies sampling.
+    
+    Sampling is per ticket (a stable hash of ticket_id), so a sampled
+    ticket keeps all of its records and an unsampled one logs only
+    warnings and errors.
+    """
+    
+    def __init__(self, sample_rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self._threshold = int(sample_rate * 10_000)
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        ticket_id = ticket_id_var.get()
+        record.ticket_id = ticket_id
+        if self.sample_rate >= 1.0 or record.levelno >= logging.WARNING or ticket_id is None:
+            return True
+        return zlib.crc32(ticket_id.encode()) % 10_000 < self._threshold
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, ticket_id, msg and extra fields."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "ticket_id": getattr(record, "ticket_id", None),
+            "msg": record.getMessage(),
+            **_fields(record)
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with extra fields appended as key=value."""
+    
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(ticket_id)s] %(message)s")
+    
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "ticket_id"):
+            record.ticket_id = None
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+    
+    The stock prepare() runs the formatter on the logging thread; this
+    one only resolves msg % args (the arguments may change after the
+    call returns) and enqueues a copy of the record.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sample_rate: float = LOG_SAMPLE_RATE,
+              stream=None):
+    """
+    (Re)configure the src/ and api/ logger trees. Called once at import
+    with the environment settings; call again to change level, format or
+    stream.
+    """
+    global _listener
+    
+    if _listener is not None:
+        _listener.stop()
+    
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+    
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(TicketFilter(sample_rate))
+    
+    for namespace in NAMESPACES:
+        root = logging.getLogger(namespace)
+        for old in list(root.handlers):
+            root.removeHandler(old)
+        root.addHandler(handler)
+        root.setLevel(level)
+        root.propagate = False
+    
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a module under src/ or api/ (pass __name__)."""
+    return logging.getLogger(name)
+
+@atexit.register
+def _flush():
+    # Write out whatever is still queued when the process exits
+    if _listener is not None:
+        _listener.stop()
+
+configure()
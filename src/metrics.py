@@ -0,0 +1,164 @@
+"""Prometheus metrics for graph nodes, tools, LLM calls and caches
+
+Everything is recorded in-process with prometheus_client and exposed in
+text format by GET /metrics. Label children are bound once when a node
+or tool is wrapped, so recording a call is a couple of microseconds.
+"""
+import functools
+import inspect
+import time
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+# Graph nodes
+NODE_LATENCY = Histogram("triage_node_duration_seconds", "Graph node latency", ["node"], buckets=LATENCY_BUCKETS)
+NODE_IN_FLIGHT = Gauge("triage_node_in_flight", "Graph node executions in progress", ["node"])
+NODE_ERRORS = Counter("triage_node_errors_total", "Graph node executions that raised", ["node"])
+
+# CRM / knowledge-base tools (upstream calls, not cache hits)
+TOOL_LATENCY = Histogram("triage_tool_duration_seconds", "CRM/KB tool call latency", ["tool"], buckets=LATENCY_BUCKETS)
+TOOL_IN_FLIGHT = Gauge("triage_tool_in_flight", "CRM/KB tool calls in progress", ["tool"])
+TOOL_ERRORS = Counter("triage_tool_errors_total", "CRM/KB tool calls that raised", ["tool"])
+
+# LLM calls
+LLM_LATENCY = Histogram("triage_llm_duration_seconds", "LLM call latency", ["node", "model"], buckets=LATENCY_BUCKETS)
+LLM_IN_FLIGHT = Gauge("triage_llm_in_flight", "LLM calls in progress", ["node"])
+LLM_ERRORS = Counter("triage_llm_errors_total", "LLM calls that failed", ["node", "model"])
+LLM_TOKENS = Counter("triage_llm_tokens_total", "LLM tokens used", ["node", "model", "type"])
+LLM_FIRST_TIER_CALLS = Counter("triage_llm_first_tier_calls_total", "LLM calls on a node's first-choice (small) model", ["node"])
+LLM_ESCALATIONS = Counter("triage_llm_escalations_total", "Small-model answers re-run on the escalation model", ["node", "reason"])
+BUDGET_FALLBACKS = Counter("triage_token_budget_fallbacks_total", "LLM calls skipped because the request's token budget ran out", ["node"])
+
+# Duplicate triage requests answered without running the graph again
+DEDUPLICATED = Counter("triage_deduplicated_requests_total", "Duplicate triage requests served from another request's run", ["source"])
+
+# Async triage jobs
+JOB_QUEUE_DEPTH = Gauge("triage_job_queue_depth", "Triage jobs waiting in the queue")
+JOB_WAIT = Histogram("triage_job_queue_wait_seconds", "Time jobs spent queued before a worker took them", buckets=LATENCY_BUCKETS)
+JOBS = Counter("triage_jobs_total", "Triage jobs by status (queued on submit, then succeeded or failed)", ["status"])
+
+# HTTP
+HTTP_LATENCY = Histogram("triage_http_request_duration_seconds", "HTTP request latency", ["route"], buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge("triage_http_requests_in_flight", "HTTP requests in progress")
+HTTP_REQUESTS = Counter("triage_http_requests_total", "HTTP requests", ["route", "method", "status"])
+
+def _timed_call(latency, in_flight, errors, func: Callable) -> Callable:
+    """Wrap a sync or async callable to record latency, in-flight and errors."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            in_flight.inc()
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+                in_flight.dec()
+        return async_wrapper
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - start)
+            in_flight.dec()
+    return wrapper
+
+def instrument_node(name: str, func: Callable) -> Callable:
+    return _timed_call(NODE_LATENCY.labels(name), NODE_IN_FLIGHT.labels(name), NODE_ERRORS.labels(name), func)
+
+def instrument_tool(name: str) -> Callable:
+    """Decorator for CRM/KB tool functions (sync or async)."""
+    def decorator(func: Callable) -> Callable:
+        return _timed_call(TOOL_LATENCY.labels(name), TOOL_IN_FLIGHT.labels(name), TOOL_ERRORS.labels(name), func)
+    return decorator
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Callback handler attached to each node's chat model by get_llm()."""
+    
+    # Called on the event loop for async runs instead of an executor thread
+    run_inline = True
+    
+    def __init__(self, node: str, model: str):
+        self.node = node
+        self.model = model
+        self.in_flight = LLM_IN_FLIGHT.labels(node)
+        self._started: Dict[UUID, float] = {}
+    
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List, *, run_id: UUID, **kwargs):
+        self._started[run_id] = time.perf_counter()
+        self.in_flight.inc()
+    
+    def _finish(self, run_id: UUID) -> Optional[float]:
+        start = self._started.pop(run_id, None)
+        if start is None:
+            return None
+        self.in_flight.dec()
+        return time.perf_counter() - start
+    
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        elapsed = self._finish(run_id)
+        message = getattr(response.generations[0][0], "message", None) if response.generations else None
+        metadata = getattr(message, "response_metadata", None) or {}
+        model = metadata.get("model") or self.model
+    
+        if elapsed is not None:
+            LLM_LATENCY.labels(self.node, model).observe(elapsed)
+        usage = metadata.get("usage") or {}
+        if usage.get("input_tokens"):
+            LLM_TOKENS.labels(self.node, model, "input").inc(usage["input_tokens"])
+        if usage.get("output_tokens"):
+            LLM_TOKENS.labels(self.node, model, "output").inc(usage["output_tokens"])
+    
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._finish(run_id)
+        LLM_ERRORS.labels(self.node, self.model).inc()
+
+class _CacheCollector:
+    """Reads hit/miss counters from every registered TTLCache at scrape time."""
+    
+    def __init__(self):
+        self.caches = {}
+    
+    def collect(self):
+        hits = CounterMetricFamily("triage_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("triage_cache_misses", "Cache misses", labels=["cache"])
+        evictions = CounterMetricFamily("triage_cache_evictions", "Entries evicted by size", labels=["cache"])
+        ratio = GaugeMetricFamily("triage_cache_hit_ratio", "Hits / lookups since start", labels=["cache"])
+        size = GaugeMetricFamily("triage_cache_entries", "Entries currently cached", labels=["cache"])
+    
+        for name, cache in list(self.caches.items()):
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            evictions.add_metric([name], stats["evictions"])
+            ratio.add_metric([name], stats["hit_ratio"])
+            size.add_metric([name], stats["size"])
+    
+        return [hits, misses, evictions, ratio, size]
+
+_cache_collector = _CacheCollector()
+REGISTRY.register(_cache_collector)
+
+def register_cache(name: str, cache):
+    """Export a cache's stats() under the given name (called by TTLCache)."""
+    _cache_collector.caches[name] = cache
@@ -0,0 +1,85 @@
+"""Prompts for single-call (fused) triage"""
+
+FUSED_TRIAGE_SYSTEM = """You are an expert customer support triage assistant.
+
+For each ticket, do three things in one pass: classify it, extract entities, and decide routing.
+
+1. Intent - one of:
+**billing** - Payment issues, refunds, invoices, subscription changes, pricing questions
+**technical** - Bugs, errors, performance issues, feature not working, API problems
+**account** - Login issues, password resets, profile changes, account deletion
+**sales** - Pricing inquiries, plan comparisons, upgrades, demos, pre-sales questions
+**general** - Everything else, vague requests, or unclear intent
+Pick the PRIMARY concern; default to "general" when ambiguous.
+
+2. Entities (null or [] when absent):
+- order_id: order or transaction number (#12345 or 12345)
+- amount: dollar amount ($99 or 99)
+- product_name: specific product or feature
+- error_message: specific error code or message
+- urgency_keywords: urgent, asap, emergency, critical, down
+
+3. Routing:
+- action: "auto_resolve" (FAQ answers it) or "escalate" (needs human)
+- team when escalating: "billing_tier1", "billing_tier2", "technical_tier1", "technical_tier2", "account", "sales"
+- priority: "low", "medium", "high", "critical"
+Enterprise users and urgent language raise priority. Low confidence should escalate.
+
+Respond with JSON only:
+{
+  "intent": "category_name",
+  "confidence": 0.95,
+  "reasoning": "Brief classification reasoning",
+  "entities": {
+    "order_id": "12345" or null,
+    "amount": 99.00 or null,
+    "product_name": "string" or null,
+    "error_message": "string" or null,
+    "urgency_keywords": [],
+    "has_urgent_language": false
+  },
+  "action": "auto_resolve" or "escalate",
+  "team": "team_name" or null,
+  "priority": "low/medium/high/critical",
+  "routing_reasoning": "Brief routing reasoning"
+}"""
+
+def get_fused_prompt(query: str, context: dict) -> str:
+    """
+    Generate the user prompt for fused triage.
+    
+    Args:
+        query: The support ticket text
+        context: Context retrieved before the call (CRM profile, orders,
+            ticket history, FAQ candidates)
+    """
+    profile = context.get("user_profile") or {}
+    orders = context.get("orders") or []
+    tickets = context.get("ticket_history") or []
+    faqs = context.get("relevant_faqs") or []
+    
+    prompt = f"""Triage this support ticket:
+
+Ticket: "{query}"
+
+Customer:
+- Tier: {profile.get('tier', 'unknown')}
+- Plan: {profile.get('current_plan', 'unknown')}
+- Account status: {profile.get('account_status', 'unknown')}
+- Previous tickets: {len(tickets)}
+"""
+
+    if orders:
+        recent = ", ".join(f"#{o['order_id']} ${o['amount']} ({o['status']})" for o in orders[:3])
+        prompt += f"- Recent orders: {recent}\n"
+    
+    if faqs:
+        prompt += "\nCandidate FAQs:\n"
+        for faq in faqs[:3]:
+            prompt += f"- {faq['question']}\n"
+    else:
+        prompt += "\nCandidate FAQs: none\n"
+    
+    prompt += "\nRespond in JSON format."
+    
+    return prompt
@@ -0,0 +1,236 @@
+"""TTL cache with single-flight request coalescing for CRM lookups"""
+import asyncio
+import functools
+import inspect
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.cache import TTLCache, MISSING
+
+CRM_CACHE_ENABLED = os.getenv("CRM_CACHE_ENABLED", "true").lower() == "true"
+CRM_CACHE_SIZE = int(os.getenv("CRM_CACHE_SIZE", "10000"))
+CRM_CACHE_TTL_S = float(os.getenv("CRM_CACHE_TTL_S", "60"))
+
+class CRMCache:
+    """
+    Caches CRM lookups per resource (profile, orders, tickets) by user ID.
+    
+    Concurrent misses for the same user and resource share one upstream
+    call ("single flight"): the first caller fetches, the others wait for
+    its result. Works for both the sync and async tool functions, which
+    share one cache per resource.
+    
+    Invalidation bumps a generation counter for what it drops; a fetch
+    that started before it does not store its (possibly stale) result.
+    """
+    
+    def __init__(self, maxsize: int = CRM_CACHE_SIZE, ttl: float = CRM_CACHE_TTL_S,
+                 enabled: bool = CRM_CACHE_ENABLED):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.caches: Dict[str, TTLCache] = {}
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, Future] = {}
+        self._ainflight: Dict[tuple, asyncio.Task] = {}
+        # Bumped by invalidate: per (resource, user_id), and per resource when it is cleared
+        self._generations: Dict[tuple, int] = {}
+        self._epochs: Dict[str, int] = {}
+    
+    def _cache(self, resource: str) -> TTLCache:
+        if resource not in self.caches:
+            self.caches[resource] = TTLCache(f"crm_{resource}", maxsize=self.maxsize, ttl=self.ttl)
+        return self.caches[resource]
+    
+    def _generation(self, resource: str, user_id: str) -> tuple:
+        return self._epochs.get(resource, 0), self._generations.get((resource, user_id), 0)
+    
+    def _set(self, resource: str, cache: TTLCache, user_id: str, value, generation: tuple):
+        # Invalidated while the fetch was in flight: the value may predate the change
+        if self._generation(resource, user_id) == generation:
+            cache.set(user_id, value)
+    
+    def cached(self, resource: str) -> Callable:
+        """Decorator for a CRM lookup taking user_id as its only argument."""
+        cache = self._cache(resource)
+    
+        def decorator(fn: Callable) -> Callable:
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(user_id: str):
+                    if not self.enabled:
+                        return await fn(user_id)
+                    value = cache.get(user_id)
+                    if value is not MISSING:
+                        return value
+                    return await self._afetch(resource, cache, fn, user_id)
+                return async_wrapper
+    
+            @functools.wraps(fn)
+            def wrapper(user_id: str):
+                if not self.enabled:
+                    return fn(user_id)
+                value = cache.get(user_id)
+                if value is not MISSING:
+                    return value
+                return self._fetch(resource, cache, fn, user_id)
+            return wrapper
+    
+        return decorator
+    
+    def cached_bulk(self, resource: str) -> Callable:
+        """
+        Decorator for a bulk CRM lookup taking a collection of user IDs and
+        returning {user_id: value}. IDs are de-duplicated, cached users are
+        answered locally and only the misses go upstream, in one call.
+        Results fill the same cache as the single-user lookup.
+        """
+        cache = self._cache(resource)
+        
+        def decorator(fn: Callable) -> Callable:
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(user_ids: Iterable[str]) -> Dict:
+                    found, missing = self._split(cache, user_ids)
+                    if missing:
+                        generations = self._generations_of(resource, missing)
+                        found.update(self._store(resource, cache, await fn(missing), generations))
+                    return found
+                return async_wrapper
+            
+            @functools.wraps(fn)
+            def wrapper(user_ids: Iterable[str]) -> Dict:
+                found, missing = self._split(cache, user_ids)
+                if missing:
+                    generations = self._generations_of(resource, missing)
+                    found.update(self._store(resource, cache, fn(missing), generations))
+                return found
+            return wrapper
+        
+        return decorator
+    
+    def _split(self, cache: TTLCache, user_ids: Iterable[str]) -> Tuple[Dict, List[str]]:
+        unique = list(dict.fromkeys(user_ids))
+        if not self.enabled:
+            return {}, unique
+        
+        found, missing = {}, []
+        for user_id in unique:
+            value = cache.get(user_id)
+            if value is MISSING:
+                missing.append(user_id)
+            else:
+                found[user_id] = value
+        return found, missing
+    
+    def _generations_of(self, resource: str, user_ids: List[str]) -> Dict[str, tuple]:
+        return {user_id: self._generation(resource, user_id) for user_id in user_ids}
+    
+    def _store(self, resource: str, cache: TTLCache, fetched: Dict, generations: Dict[str, tuple]) -> Dict:
+        if self.enabled:
+            for user_id, value in fetched.items():
+                if user_id in generations:
+                    self._set(resource, cache, user_id, value, generations[user_id])
+        return fetched
+    
+    def _fetch(self, resource: str, cache: TTLCache, fn: Callable, user_id: str):
+        key = (resource, user_id)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+    
+        if not leader:
+            return future.result()
+    
+        generation = self._generation(resource, user_id)
+        try:
+            value = fn(user_id)
+            self._set(resource, cache, user_id, value, generation)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                # invalidate may already have replaced it with a newer fetch
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+    
+    async def _afetch(self, resource: str, cache: TTLCache, fn: Callable, user_id: str):
+        # Tasks belong to one event loop, so key on the loop as well
+        key = (id(asyncio.get_running_loop()), resource, user_id)
+        task = self._ainflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # The upstream call runs in its own task, so the caller that
+            # started it timing out does not cancel it for the others
+            generation = self._generation(resource, user_id)
+            task = self._ainflight[key] = asyncio.create_task(
+                self._aload(resource, cache, fn, user_id, generation)
+            )
+            task.add_done_callback(lambda done: self._afetched(key, done))
+        # shield: a caller timing out must not cancel the shared call
+        return await asyncio.shield(task)
+    
+    async def _aload(self, resource: str, cache: TTLCache, fn: Callable, user_id: str, generation: tuple):
+        value = await fn(user_id)
+        self._set(resource, cache, user_id, value, generation)
+        return value
+    
+    def _afetched(self, key: tuple, task: asyncio.Task):
+        if self._ainflight.get(key) is task:
+            del self._ainflight[key]
+        # Mark retrieved so asyncio does not warn when every caller gave up
+        if not task.cancelled():
+            task.exception()
+    
+    def invalidate(self, user_id: Optional[str] = None, resource: Optional[str] = None) -> int:
+        """
+        Drop cached entries. With no arguments, clears everything.
+        Lookups already in flight for them neither store their result nor
+        answer later callers. Returns the number of entries removed.
+        Raises ValueError for an unknown resource.
+        """
+        if resource is not None and resource not in self.caches:
+            raise ValueError(f"Unknown CRM resource '{resource}', expected one of {sorted(self.caches)}")
+        resources = [resource] if resource else list(self.caches)
+        caches = [self.caches[name] for name in resources]
+        
+        with self._lock:
+            for name in resources:
+                if user_id is None:
+                    self._epochs[name] = self._epochs.get(name, 0) + 1
+                else:
+                    self._generations[(name, user_id)] = self._generations.get((name, user_id), 0) + 1
+            # Later callers start a fresh lookup instead of joining a stale one
+            for key in list(self._inflight):
+                if key[0] in resources and (user_id is None or key[1] == user_id):
+                    del self._inflight[key]
+            for key in list(self._ainflight):
+                if key[1] in resources and (user_id is None or key[2] == user_id):
+                    del self._ainflight[key]
+        
+        if user_id is None:
+            removed = sum(len(cache) for cache in caches)
+            for cache in caches:
+                cache.clear()
+            return removed
+        return sum(cache.invalidate(user_id) for cache in caches)
+    
+    def stats(self) -> Dict:
+        return {
+            **{resource: cache.stats() for resource, cache in self.caches.items()},
+            "coalesced": self.coalesced
+        }
+
+# Shared by every CRM lookup in the process
+crm_cache = CRMCache()
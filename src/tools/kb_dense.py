@@ -0,0 +1,176 @@
+"""Dense knowledge-base retrieval on a memory-mapped embedding matrix
+
+Articles are embedded with a local, deterministic hashed n-gram
+embedder (no model download, no network). Build the matrix with:
+
+    python -m src.tools.kb_dense build
+
+The .npy file is memory-mapped at startup instead of re-embedding every
+article. It is rebuilt in memory when it does not match the articles.
+"""
+import argparse
+import json
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.log import get_logger
+from src.tools.kb_index import fingerprint
+
+logger = get_logger(__name__)
+
+DEFAULT_EMBEDDINGS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "kb_embeddings.npy"
+)
+EMBEDDING_DIM = int(os.getenv("KB_EMBEDDING_DIM", "512"))
+
+# Articles scoring below this cosine similarity are not returned
+MIN_SCORE = float(os.getenv("KB_DENSE_MIN_SCORE", "0.15"))
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of word unigrams and character 3-5 grams into a
+    fixed-size, L2-normalized vector. crc32 keeps it stable across
+    processes (Python's hash() is salted per run).
+    """
+    
+    def __init__(self, dim: int = EMBEDDING_DIM, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+    
+    def _features(self, text: str) -> List[str]:
+        features = []
+        lo, hi = self.ngram_range
+        for word in _WORD.findall(text.lower()):
+            features.append(f"w:{word}")
+            padded = f"<{word}>"
+            for n in range(lo, hi + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+    
+    def embed(self, text: str) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in self._features(text)), dtype=np.uint32)
+        signs = np.where(hashes >> 31, 1.0, -1.0)
+        vector = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+def _article_text(article: Dict) -> str:
+    return f"{article['question']} {article['question']} {article['answer']}"
+
+class DenseIndex:
+    """
+    Cosine-similarity search over a (num_articles, dim) float32 matrix.
+    
+    One query is a single matrix-vector product plus argpartition; a
+    batch of queries is a single matrix-matrix product.
+    """
+    
+    def __init__(self, articles: List[Dict], embeddings: np.ndarray,
+                 embedder: HashingEmbedder, min_score: float = MIN_SCORE):
+        self.articles = articles
+        self.embeddings = embeddings
+        self.embedder = embedder
+        self.min_score = min_score
+    
+        intents = sorted({a["intent"] for a in articles})
+        self._intent_codes = {intent: i for i, intent in enumerate(intents)}
+        self._doc_intent = np.array([self._intent_codes[a["intent"]] for a in articles], dtype=np.int16)
+    
+    @classmethod
+    def build(cls, articles: List[Dict], embedder: HashingEmbedder = None) -> "DenseIndex":
+        embedder = embedder or HashingEmbedder()
+        embeddings = embedder.embed_batch([_article_text(a) for a in articles])
+        return cls(list(articles), embeddings, embedder)
+    
+    def _top_k(self, scores: np.ndarray, top_k: int, intent: Optional[str]) -> List[Tuple[float, Dict]]:
+        if intent is not None:
+            code = self._intent_codes.get(intent)
+            scores = np.where(self._doc_intent == code, scores, -np.inf)
+    
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (float(scores[i]), self.articles[i])
+            for i in top
+            if scores[i] >= self.min_score
+        ]
+    
+    def search(self, query: str, top_k: int = 3, intent: Optional[str] = None) -> List[Tuple[float, Dict]]:
+        """Return up to top_k (score, article) pairs, best first."""
+        if not self.articles:
+            return []
+        scores = self.embeddings @ self.embedder.embed(query)
+        return self._top_k(scores, top_k, intent)
+    
+    def search_batch(self, queries: Sequence[str], top_k: int = 3,
+                     intents: Sequence[Optional[str]] = None) -> List[List[Tuple[float, Dict]]]:
+        """Score all queries against all articles with one matrix multiply."""
+        if not self.articles:
+            return [[] for _ in queries]
+        intents = intents or [None] * len(queries)
+        scores = self.embedder.embed_batch(queries) @ self.embeddings.T
+        return [self._top_k(row, top_k, intent) for row, intent in zip(scores, intents)]
+    
+    def save(self, path: str):
+        np.save(path, np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        with open(_meta_path(path), "w") as f:
+            json.dump({
+                "fingerprint": fingerprint(self.articles),
+                "dim": self.embedder.dim,
+                "ngram_range": list(self.embedder.ngram_range)
+            }, f)
+    
+    @classmethod
+    def load(cls, articles: List[Dict], path: str) -> "DenseIndex":
+        """Map the saved matrix read-only; pages are loaded lazily by the OS."""
+        with open(_meta_path(path), "r") as f:
+            meta = json.load(f)
+        if meta["fingerprint"] != fingerprint(articles):
+            raise ValueError("embeddings were built from different articles")
+        embedder = HashingEmbedder(dim=meta["dim"], ngram_range=tuple(meta["ngram_range"]))
+        embeddings = np.load(path, mmap_mode="r")
+        return cls(list(articles), embeddings, embedder)
+
+def _meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".meta.json"
+
+def load_or_build(articles: List[Dict], path: str = None) -> DenseIndex:
+    """Memory-map saved embeddings if they match the articles, else embed in memory."""
+    path = path or os.getenv("KB_EMBEDDINGS_PATH", DEFAULT_EMBEDDINGS_PATH)
+    if os.path.exists(path):
+        try:
+            return DenseIndex.load(articles, path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not use KB embeddings at %s (%s), embedding in memory", path, e)
+    return DenseIndex.build(articles)
+
+def main():
+    from src.tools.mock_knowledge_base import ARTICLES
+    
+    parser = argparse.ArgumentParser(description="Embed knowledge-base articles for dense retrieval")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--output", default=os.getenv("KB_EMBEDDINGS_PATH", DEFAULT_EMBEDDINGS_PATH))
+    args = parser.parse_args()
+    
+    index = DenseIndex.build(ARTICLES)
+    index.save(args.output)
+    print(f"✓ Embedded {len(index.articles)} articles ({index.embedder.dim} dims)")
+    print(f"✓ Saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""BM25 inverted index over knowledge-base articles
+
+Build and save the index with:
+
+    python -m src.tools.kb_index build
+
+src/tools/mock_knowledge_base.py loads the saved index at startup when
+it matches the current articles, and builds it in memory otherwise.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.log import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "kb_index.npz"
+)
+INDEX_VERSION = 1
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from get got has have how i if in is it
+its me my not of on or our so that the their them there this to up us was we were
+what when where which who why will with you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words without stopwords, with a plural "s" stripped."""
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+def fingerprint(articles: Iterable[Dict]) -> str:
+    """Hash of the indexed text, used to tell whether a saved index is stale."""
+    digest = hashlib.sha256()
+    for article in articles:
+        digest.update(f"{article['intent']}\x00{article['question']}\x00{article['answer']}\x01".encode())
+    return digest.hexdigest()
+
+class BM25Index:
+    """
+    Inverted index with BM25 weights precomputed per posting.
+    
+    Postings are stored CSR-style: one array of article IDs and one of
+    weights, sliced per term through offsets. A query only touches the
+    postings of its own terms, so search cost depends on how many
+    articles share those terms, not on corpus size. The question is
+    indexed twice (title boost) alongside the answer.
+    """
+    
+    def __init__(self, articles: List[Dict], terms: List[str], offsets: np.ndarray,
+                 doc_ids: np.ndarray, weights: np.ndarray, fingerprint: str):
+        self.articles = articles
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.fingerprint = fingerprint
+    
+        intents = sorted({a["intent"] for a in articles})
+        self._intent_codes = {intent: i for i, intent in enumerate(intents)}
+        self._doc_intent = np.array([self._intent_codes[a["intent"]] for a in articles], dtype=np.int16)
+    
+    @classmethod
+    def build(cls, articles: List[Dict], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Index articles, each a dict with intent, question and answer."""
+        docs = [Counter(tokenize(f"{a['question']} {a['question']} {a['answer']}")) for a in articles]
+        lengths = [sum(doc.values()) for doc in docs]
+        avg_length = sum(lengths) / len(lengths) if lengths else 1.0
+    
+        doc_freq = Counter(term for doc in docs for term in doc)
+        n_docs = len(docs)
+        idf = {
+            term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+    
+        postings = defaultdict(list)
+        for doc_id, (doc, length) in enumerate(zip(docs, lengths)):
+            norm = k1 * (1 - b + b * length / avg_length)
+            for term, tf in doc.items():
+                postings[term].append((doc_id, idf[term] * tf * (k1 + 1) / (tf + norm)))
+    
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+        flat = [p for t in terms for p in postings[t]]
+        doc_ids = np.fromiter((d for d, _ in flat), dtype=np.int32, count=len(flat))
+        weights = np.fromiter((w for _, w in flat), dtype=np.float32, count=len(flat))
+    
+        return cls(list(articles), terms, offsets, doc_ids, weights, fingerprint(articles))
+    
+    def search(self, query: str, top_k: int = 3, intent: Optional[str] = None) -> List[Tuple[float, Dict]]:
+        """Return up to top_k (score, article) pairs, best first. Only articles sharing a term score."""
+        slices = [
+            slice(self.offsets[i], self.offsets[i + 1])
+            for i in (self.terms.get(term) for term in set(tokenize(query)))
+            if i is not None
+        ]
+        if not slices:
+            return []
+    
+        ids = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        candidates, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+    
+        if intent is not None:
+            code = self._intent_codes.get(intent)
+            keep = self._doc_intent[candidates] == code if code is not None else np.zeros(len(candidates), bool)
+            candidates, scores = candidates[keep], scores[keep]
+    
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(float(scores[i]), self.articles[candidates[i]]) for i in order]
+    
+    def search_batch(self, queries: Sequence[str], top_k: int = 3,
+                     intents: Sequence[Optional[str]] = None) -> List[List[Tuple[float, Dict]]]:
+        intents = intents or [None] * len(queries)
+        return [self.search(query, top_k, intent) for query, intent in zip(queries, intents)]
+    
+    def save(self, path: str):
+        terms = [None] * len(self.terms)
+        for term, i in self.terms.items():
+            terms[i] = term
+        np.savez(
+            path,
+            version=INDEX_VERSION,
+            fingerprint=self.fingerprint,
+            articles=json.dumps(self.articles),
+            terms=np.array(terms),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            weights=self.weights
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError(f"Unsupported KB index version: {int(data['version'])}")
+            return cls(
+                articles=json.loads(str(data["articles"])),
+                terms=data["terms"].tolist(),
+                offsets=data["offsets"],
+                doc_ids=data["doc_ids"],
+                weights=data["weights"],
+                fingerprint=str(data["fingerprint"])
+            )
+
+def load_or_build(articles: List[Dict], path: str = None) -> BM25Index:
+    """
+    Load the saved index if it was built from these articles, otherwise
+    build it in memory (run the build command to persist it).
+    """
+    path = path or os.getenv("KB_INDEX_PATH", DEFAULT_INDEX_PATH)
+    if os.path.exists(path):
+        try:
+            index = BM25Index.load(path)
+            if index.fingerprint == fingerprint(articles):
+                return index
+            logger.warning("KB index at %s is stale, rebuilding in memory", path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not load KB index at %s (%s), rebuilding in memory", path, e)
+    return BM25Index.build(articles)
+
+def main():
+    from src.tools.mock_knowledge_base import ARTICLES
+    
+    parser = argparse.ArgumentParser(description="Build and save the knowledge-base search index")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--output", default=os.getenv("KB_INDEX_PATH", DEFAULT_INDEX_PATH))
+    args = parser.parse_args()
+    
+    index = BM25Index.build(ARTICLES)
+    index.save(args.output)
+    print(f"✓ Indexed {len(index.articles)} articles, {len(index.terms)} terms")
+    print(f"✓ Saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
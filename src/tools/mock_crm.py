@@ -1,9 +1,16 @@
 """Mock CRM system for testing"""
+import asyncio
 import time
 import random
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional
 from langsmith import traceable
 
+from src.log import get_logger
+from src.metrics import instrument_tool
+from src.tools.crm_cache import crm_cache
+
+logger = get_logger(__name__)
+
 # Mock user database
 MOCK_USERS = {
     "user_1234": {
@@ -52,24 +59,14 @@ MOCK_ORDERS = {
     ]
 }
 
-@traceable(name="crm_get_user")
-def get_user_profile(user_id: str) -> Optional[Dict]:
-    """
-    Fetch user profile from CRM.
-    This is traced as a separate step in LangSmith.
-    """
-    # Simulate API latency
-    time.sleep(random.uniform(0.1, 0.3))
-    
-    print(f"  📊 Fetching CRM data for {user_id}...")
-    
+def _lookup_user(user_id: str) -> Dict:
     user = MOCK_USERS.get(user_id)
     
     if user:
-        print(f"     ✓ Found user: {user['name']} ({user['tier']} tier)")
+        logger.debug("Fetched CRM profile", extra={"user_id": user_id, "tier": user["tier"]})
         return user
     else:
-        print(f"     ⚠️  User not found in CRM")
+        logger.info("User not found in CRM", extra={"user_id": user_id})
         # Return minimal data for unknown users
         return {
             "user_id": user_id,
@@ -79,39 +76,146 @@ def get_user_profile(user_id: str) -> Optional[Dict]:
             "total_tickets": 0
         }
 
+def _lookup_orders(user_id: str) -> list:
+    orders = MOCK_ORDERS.get(user_id, [])
+    logger.debug("Fetched order history", extra={"user_id": user_id, "orders": len(orders)})
+    
+    return orders
+
+def _lookup_tickets(user_id: str) -> list:
+    # Mock recent tickets
+    mock_tickets = [
+        {"ticket_id": "old_001", "intent": "billing", "resolved": True, "date": "2024-12-10"},
+        {"ticket_id": "old_002", "intent": "technical", "resolved": True, "date": "2024-12-15"},
+    ]
+    
+    logger.debug("Fetched ticket history", extra={"user_id": user_id, "tickets": len(mock_tickets)})
+    
+    return mock_tickets
+
+@crm_cache.cached("user_profile")
+@instrument_tool("crm_get_user")
+@traceable(name="crm_get_user")
+def get_user_profile(user_id: str) -> Optional[Dict]:
+    """
+    Fetch user profile from CRM.
+    This is traced as a separate step in LangSmith.
+    Cached per user (see src/tools/crm_cache.py); cache hits are not traced.
+    """
+    # Simulate API latency
+    time.sleep(random.uniform(0.1, 0.3))
+    return _lookup_user(user_id)
+
+@crm_cache.cached("user_profile")
+@instrument_tool("crm_get_user")
+@traceable(name="crm_get_user")
+async def aget_user_profile(user_id: str) -> Optional[Dict]:
+    """
+    Async version of get_user_profile.
+    """
+    await asyncio.sleep(random.uniform(0.1, 0.3))
+    return _lookup_user(user_id)
+
+@crm_cache.cached("orders")
+@instrument_tool("crm_get_orders")
 @traceable(name="crm_get_orders")
 def get_order_history(user_id: str) -> list:
     """
     Fetch user's order history.
     """
     time.sleep(random.uniform(0.05, 0.15))
-    
-    print(f"  💳 Fetching order history for {user_id}...")
-    
-    orders = MOCK_ORDERS.get(user_id, [])
-    
-    if orders:
-        print(f"     ✓ Found {len(orders)} orders")
-    else:
-        print(f"     ⚠️  No orders found")
-    
-    return orders
+    return _lookup_orders(user_id)
+
+@crm_cache.cached("orders")
+@instrument_tool("crm_get_orders")
+@traceable(name="crm_get_orders")
+async def aget_order_history(user_id: str) -> list:
+    """
+    Async version of get_order_history.
+    """
+    await asyncio.sleep(random.uniform(0.05, 0.15))
+    return _lookup_orders(user_id)
 
+@crm_cache.cached("tickets")
+@instrument_tool("crm_get_ticket_history")
 @traceable(name="crm_get_ticket_history")
 def get_ticket_history(user_id: str) -> list:
     """
     Fetch user's previous support tickets.
     """
     time.sleep(random.uniform(0.05, 0.15))
-    
-    print(f"  🎫 Fetching ticket history for {user_id}...")
-    
-    # Mock recent tickets
-    mock_tickets = [
-        {"ticket_id": "old_001", "intent": "billing", "resolved": True, "date": "2024-12-10"},
-        {"ticket_id": "old_002", "intent": "technical", "resolved": True, "date": "2024-12-15"},
-    ]
-    
-    print(f"     ✓ Found {len(mock_tickets)} previous tickets")
-    
-    return mock_tickets
\ No newline at end of file
+    return _lookup_tickets(user_id)
+
+@crm_cache.cached("tickets")
+@instrument_tool("crm_get_ticket_history")
+@traceable(name="crm_get_ticket_history")
+async def aget_ticket_history(user_id: str) -> list:
+    """
+    Async version of get_ticket_history.
+    """
+    await asyncio.sleep(random.uniform(0.05, 0.15))
+    return _lookup_tickets(user_id)
+
+# Bulk lookups: one round trip for a whole set of users, so batch triage
+# pays CRM latency per batch instead of per ticket
+
+@crm_cache.cached_bulk("user_profile")
+@instrument_tool("crm_get_users_bulk")
+@traceable(name="crm_get_users_bulk")
+def get_user_profiles_bulk(user_ids: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Fetch profiles for many users in one call.
+    Returns {user_id: profile}.
+    """
+    time.sleep(random.uniform(0.1, 0.3))
+    return {user_id: _lookup_user(user_id) for user_id in user_ids}
+
+@crm_cache.cached_bulk("user_profile")
+@instrument_tool("crm_get_users_bulk")
+@traceable(name="crm_get_users_bulk")
+async def aget_user_profiles_bulk(user_ids: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Async version of get_user_profiles_bulk.
+    """
+    await asyncio.sleep(random.uniform(0.1, 0.3))
+    return {user_id: _lookup_user(user_id) for user_id in user_ids}
+
+@crm_cache.cached_bulk("orders")
+@instrument_tool("crm_get_orders_bulk")
+@traceable(name="crm_get_orders_bulk")
+def get_order_histories_bulk(user_ids: Iterable[str]) -> Dict[str, List]:
+    """
+    Fetch order history for many users in one call.
+    """
+    time.sleep(random.uniform(0.05, 0.15))
+    return {user_id: _lookup_orders(user_id) for user_id in user_ids}
+
+@crm_cache.cached_bulk("orders")
+@instrument_tool("crm_get_orders_bulk")
+@traceable(name="crm_get_orders_bulk")
+async def aget_order_histories_bulk(user_ids: Iterable[str]) -> Dict[str, List]:
+    """
+    Async version of get_order_histories_bulk.
+    """
+    await asyncio.sleep(random.uniform(0.05, 0.15))
+    return {user_id: _lookup_orders(user_id) for user_id in user_ids}
+
+@crm_cache.cached_bulk("tickets")
+@instrument_tool("crm_get_ticket_history_bulk")
+@traceable(name="crm_get_ticket_history_bulk")
+def get_ticket_histories_bulk(user_ids: Iterable[str]) -> Dict[str, List]:
+    """
+    Fetch previous support tickets for many users in one call.
+    """
+    time.sleep(random.uniform(0.05, 0.15))
+    return {user_id: _lookup_tickets(user_id) for user_id in user_ids}
+
+@crm_cache.cached_bulk("tickets")
+@instrument_tool("crm_get_ticket_history_bulk")
+@traceable(name="crm_get_ticket_history_bulk")
+async def aget_ticket_histories_bulk(user_ids: Iterable[str]) -> Dict[str, List]:
+    """
+    Async version of get_ticket_histories_bulk.
+    """
+    await asyncio.sleep(random.uniform(0.05, 0.15))
+    return {user_id: _lookup_tickets(user_id) for user_id in user_ids}
@@ -1,9 +1,21 @@
 """Mock knowledge base for FAQ retrieval"""
+import asyncio
+import logging
+import os
 import time
 import random
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence
 from langsmith import traceable
 
+from src.log import get_logger
+from src.metrics import instrument_tool
+from src.tools import kb_dense, kb_index as kb_bm25
+
+# bm25 (inverted index, lexical) or dense (hashed n-gram embeddings)
+KB_BACKEND = os.getenv("KB_BACKEND", "bm25")
+
+logger = get_logger(__name__)
+
 # Mock FAQ database
 FAQ_DATABASE = {
     "billing": [
@@ -56,43 +68,136 @@ FAQ_DATABASE = {
     ]
 }
 
+# Flat article list with stable IDs; this is what gets indexed
+ARTICLES = [
+    {"article_id": f"{intent}_{i}", "intent": intent, "question": faq["question"], "answer": faq["answer"]}
+    for intent, faqs in FAQ_DATABASE.items()
+    for i, faq in enumerate(faqs, 1)
+]
+
+# Built (or loaded from KB_INDEX_PATH / KB_EMBEDDINGS_PATH) once at startup
+if KB_BACKEND == "dense":
+    kb_index = kb_dense.load_or_build(ARTICLES)
+else:
+    kb_index = kb_bm25.load_or_build(ARTICLES)
+
+# Each intent's articles by their curated score, best first: the fallback
+# when no article matches the query
+INTENT_FAQS = {
+    intent: sorted(
+        (
+            {**article, "relevance_score": faq["relevance_score"]}
+            for article, faq in zip([a for a in ARTICLES if a["intent"] == intent], faqs)
+        ),
+        key=lambda article: article["relevance_score"],
+        reverse=True
+    )
+    for intent, faqs in FAQ_DATABASE.items()
+}
+
+def _intent_faqs(intent: Optional[str], top_k: int) -> List[Dict]:
+    """The intent's top FAQs by their curated score, as search returned before ranking."""
+    return [dict(faq) for faq in INTENT_FAQS.get(intent, [])[:top_k]]
+
+def _search(intent: Optional[str], query: str, top_k: int) -> List[Dict]:
+    # intent=None (fused mode, no classification yet) searches all intents
+    hits = kb_index.search(query, top_k=top_k, intent=intent)
+    
+    if not hits:
+        # No query term matched: fall back to the intent's top FAQs, so
+        # has_faqs (and with it the routing policy rule) does not depend
+        # on the wording
+        logger.info("No FAQs match the query, using the intent's top FAQs", extra={"intent": intent or "any"})
+        return _intent_faqs(intent, top_k)
+    
+    results = _results(hits)
+    
+    # Skip building the per-article list unless someone will see it
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("KB search", extra={
+            "intent": intent or "any",
+            "articles": [(faq["article_id"], faq["relevance_score"]) for faq in results]
+        })
+    
+    return results
+
+def _results(hits: list) -> List[Dict]:
+    return [{**article, "relevance_score": round(score, 3)} for score, article in hits]
+
+def _search_batch(queries: Sequence[str], intents: Optional[Sequence[Optional[str]]], top_k: int) -> List[List[Dict]]:
+    logger.debug("KB batch search", extra={"queries": len(queries), "backend": KB_BACKEND})
+    intents = intents or [None] * len(queries)
+    return [
+        _results(hits) if hits else _intent_faqs(intent, top_k)
+        for hits, intent in zip(kb_index.search_batch(queries, top_k=top_k, intents=intents), intents)
+    ]
+
+def _article(article_id: str) -> Dict:
+    # Mock article retrieval
+    return {
+        "article_id": article_id,
+        "title": "Complete Guide to Refunds",
+        "content": "Full article content here...",
+        "last_updated": "2024-12-01"
+    }
+
+@instrument_tool("kb_search")
 @traceable(name="kb_search")
-def search_knowledge_base(intent: str, query: str, top_k: int = 3) -> List[Dict]:
+def search_knowledge_base(intent: Optional[str], query: str, top_k: int = 3) -> List[Dict]:
     """
     Search knowledge base for relevant articles.
-    Returns top K most relevant FAQs.
+    Returns the top K FAQs ranked against the query by the KB_BACKEND
+    index (BM25 or dense), or the intent's top FAQs when none match.
+    Pass intent=None to search all intents.
     """
     # Simulate vector search latency
     time.sleep(random.uniform(0.1, 0.2))
-    
-    print(f"  📚 Searching knowledge base for '{intent}' intent...")
-    
-    faqs = FAQ_DATABASE.get(intent, [])
-    
-    if not faqs:
-        print(f"     ⚠️  No FAQs found for intent: {intent}")
-        return []
-    
-    # Return top K results (in real system, would use vector similarity)
-    results = faqs[:top_k]
-    
-    print(f"     ✓ Found {len(results)} relevant articles")
-    for i, faq in enumerate(results, 1):
-        print(f"       {i}. {faq['question']} (score: {faq['relevance_score']:.2f})")
-    
-    return results
+    return _search(intent, query, top_k)
+
+@instrument_tool("kb_search")
+@traceable(name="kb_search")
+async def asearch_knowledge_base(intent: Optional[str], query: str, top_k: int = 3) -> List[Dict]:
+    """
+    Async version of search_knowledge_base.
+    """
+    await asyncio.sleep(random.uniform(0.1, 0.2))
+    return _search(intent, query, top_k)
+
+@instrument_tool("kb_search_batch")
+@traceable(name="kb_search_batch")
+def search_knowledge_base_batch(queries: Sequence[str], intents: Optional[Sequence[Optional[str]]] = None,
+                                top_k: int = 3) -> List[List[Dict]]:
+    """
+    Search for many queries in one call; results line up with queries.
+    The dense backend scores the whole batch with one matrix multiply.
+    """
+    time.sleep(random.uniform(0.1, 0.2))
+    return _search_batch(queries, intents, top_k)
+
+@instrument_tool("kb_search_batch")
+@traceable(name="kb_search_batch")
+async def asearch_knowledge_base_batch(queries: Sequence[str], intents: Optional[Sequence[Optional[str]]] = None,
+                                       top_k: int = 3) -> List[List[Dict]]:
+    """
+    Async version of search_knowledge_base_batch.
+    """
+    await asyncio.sleep(random.uniform(0.1, 0.2))
+    return _search_batch(queries, intents, top_k)
 
+@instrument_tool("kb_get_article")
 @traceable(name="kb_get_article")
 def get_full_article(article_id: str) -> Dict:
     """
     Fetch complete article content.
     """
     time.sleep(random.uniform(0.05, 0.1))
-    
-    # Mock article retrieval
-    return {
-        "article_id": article_id,
-        "title": "Complete Guide to Refunds",
-        "content": "Full article content here...",
-        "last_updated": "2024-12-01"
-    }
\ No newline at end of file
+    return _article(article_id)
+
+@instrument_tool("kb_get_article")
+@traceable(name="kb_get_article")
+async def aget_full_article(article_id: str) -> Dict:
+    """
+    Async version of get_full_article.
+    """
+    await asyncio.sleep(random.uniform(0.05, 0.1))
+    return _article(article_id)
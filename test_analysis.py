@@ -0,0 +1,190 @@
+"""Test the offline trace analysis pieces (no LangSmith access needed)"""
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+os.environ.setdefault("LANGCHAIN_API_KEY", "test")
+
+from src.analysis import trace_analyzer
+from src.analysis.aggregate import grouped_percentiles
+from src.analysis.run_store import RunStore
+from src.analysis.trace_files import TraceExporter, TraceFileSource, record_from_dict, ticket_records
+
+class FakeLangSmith:
+    """list_runs over an in-memory run list: newest first, honouring limit and lt(start_time) filters."""
+    
+    runs = []
+    
+    def __init__(self):
+        self.calls = []
+    
+    def list_runs(self, project_name, start_time, filter=None, limit=None):
+        self.calls.append((start_time, filter))
+        end = None
+        if filter:
+            end = datetime.fromisoformat(filter.split('"')[1])
+        matching = [
+            run for run in sorted(self.runs, key=lambda r: r.start_time, reverse=True)
+            if run.start_time >= start_time and (end is None or run.start_time < end)
+        ]
+        return iter(matching[:limit] if limit else matching)
+
+def make_runs(hours_ago):
+    now = datetime.utcnow()
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(), name="classify_intent", start_time=now - timedelta(hours=h),
+            end_time=now - timedelta(hours=h) + timedelta(seconds=0.5), latency=None,
+            outputs={}, extra={}, error=None, status="success"
+        )
+        for h in hours_ago
+    ]
+
+def analyzer(path):
+    trace_analyzer.Client = FakeLangSmith
+    return trace_analyzer.TraceAnalyzer("test", store=RunStore(path))
+
+def test_sync_with_limit():
+    """A sync cut off by limit doesn't move the high-water mark past runs it skipped"""
+    print("\n" + "="*70)
+    print("Testing incremental sync with a limit")
+    print("="*70)
+    
+    FakeLangSmith.runs = make_runs([0.1, 0.2, 0.3, 0.4, 0.5, 0.6])
+    with tempfile.TemporaryDirectory() as tmp:
+        a = analyzer(os.path.join(tmp, "runs.db"))
+    
+        written = a.sync_runs(hours=1, limit=4)
+        assert written == 4
+        assert a.store.synced_range("test") is None
+    
+        # Without the limit the next sync fills in the two oldest runs
+        a.sync_runs(hours=1)
+        stored = a.store.count("test")
+        print(f"Stored after truncated + full sync: {stored}")
+        assert stored == 6
+        assert a.store.synced_range("test") is not None
+
+def test_sync_wider_window():
+    """Widening hours after a sync backfills the older span only"""
+    print("\n" + "="*70)
+    print("Testing a wider window after a sync")
+    print("="*70)
+    
+    FakeLangSmith.runs = make_runs([0.5, 1.5, 5, 10, 30])
+    with tempfile.TemporaryDirectory() as tmp:
+        a = analyzer(os.path.join(tmp, "runs.db"))
+    
+        a.sync_runs(hours=2)
+        assert a.store.count("test") == 2
+    
+        a.sync_runs(hours=24)
+        stored = a.store.count("test", since=time.time() - 24 * 3600)
+        print(f"Runs in the last 24h after widening: {stored}")
+        assert stored == 4
+        low, _ = a.store.synced_range("test")
+        assert low <= time.time() - 24 * 3600 + 60
+    
+        # The backfill was bounded by the old low-water mark
+        _, backfill_filter = a.client.calls[-1]
+        assert backfill_filter and backfill_filter.startswith("lt(start_time")
+
+def test_grouped_percentiles():
+    """Per-group percentiles agree with np.percentile; empty groups are NaN"""
+    print("\n" + "="*70)
+    print("Testing grouped percentiles")
+    print("="*70)
+    
+    rng = np.random.default_rng(7)
+    num_groups = 6
+    # Group 3 stays empty, group 5 has a single run
+    groups = np.append(rng.choice([0, 1, 2, 4], size=5000), 5)
+    values = rng.lognormal(mean=-1, sigma=1, size=len(groups))
+    percentiles = [0, 50, 90, 95, 99, 100]
+    
+    result = grouped_percentiles(groups, values, num_groups, percentiles)
+    assert result.shape == (num_groups, len(percentiles))
+    for group in range(num_groups):
+        in_group = values[groups == group]
+        if len(in_group) == 0:
+            assert np.isnan(result[group]).all()
+        else:
+            np.testing.assert_allclose(result[group], np.percentile(in_group, percentiles))
+    print(f"p50 per group: {np.round(result[:, 1], 3)}")
+    
+    single = grouped_percentiles(np.array([1]), np.array([0.5]), 2, [50, 99])
+    assert np.isnan(single[0]).all() and (single[1] == 0.5).all()
+    assert np.isnan(grouped_percentiles(np.array([], dtype=np.int64), np.array([]), 3, [50])).all()
+    print("✅ Matches np.percentile")
+
+def test_trace_file_round_trip():
+    """Records written by TraceExporter read back through TraceFileSource, plain and gzipped"""
+    print("\n" + "="*70)
+    print("Testing the trace file round trip")
+    print("="*70)
+    
+    started_at = time.time() - 60
+    records = ticket_records(
+        "ticket_1", started_at, 1.25,
+        {"classify": 400.0, "retrieve": 150.0, "route": 300.0},
+        node_tokens={"classify": {"input_tokens": 300, "output_tokens": 40},
+                     "route": {"input_tokens": 500, "output_tokens": 60}},
+        pipeline_mode="standard", user_id="user_1234"
+    )
+    records += ticket_records("ticket_2", started_at - 7200, 0.5, {"classify": 500.0}, error="timeout")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("traces.jsonl", "traces.jsonl.gz"):
+            path = os.path.join(tmp, name)
+            exporter = TraceExporter(path, flush_interval_s=0.01)
+            exporter.export(records[:3])
+            exporter.export(records[3:])
+            exporter.close()
+    
+            runs = list(TraceFileSource(path))
+            assert [run.run_id for run in runs] == [record["run_id"] for record in records]
+            by_name = {(run.name, run.start_time): run for run in runs}
+    
+            root = by_name[("triage_ticket", started_at)]
+            assert root.latency_s == 1.25 and root.error is None
+            # The root's rollup is not counted on top of its nodes
+            assert root.input_tokens == 0 and root.output_tokens == 0
+            classify = by_name[("classify", started_at)]
+            assert (classify.latency_s, classify.input_tokens, classify.output_tokens) == (0.4, 300, 40)
+            assert by_name[("retrieve", started_at)].input_tokens == 0
+            assert sum(run.input_tokens + run.output_tokens for run in runs) == 900
+            assert by_name[("triage_ticket", started_at - 7200)].error == "timeout"
+    
+            recent = TraceFileSource(path, since=time.time() - 3600)
+            assert len(recent) == 4
+            print(f"{name}: {len(runs)} runs read back, {len(recent)} in the last hour")
+    
+        # A directory reads every trace file in it
+        assert len(TraceFileSource(tmp)) == 2 * len(records)
+    
+    # Exported LangSmith runs: ISO times, extra.usage, status
+    run = record_from_dict({
+        "id": "abc", "name": "classify_intent", "start_time": "2024-12-01T10:00:00Z",
+        "end_time": "2024-12-01T10:00:02.5Z", "extra": {"usage": {"input_tokens": 10, "output_tokens": 5}},
+        "status": "error"
+    })
+    assert run.latency_s == 2.5 and (run.input_tokens, run.output_tokens) == (10, 5)
+    assert run.error == "Error (no message)"
+    print("✅ Trace files round trip")
+
+if __name__ == "__main__":
+    print("\n🧪 Trace Analysis Tests")
+    
+    test_sync_with_limit()
+    test_sync_wider_window()
+    test_grouped_percentiles()
+    test_trace_file_round_trip()
+    
+    print("\n" + "="*70)
+    print("✅ All tests completed!")
+    print("="*70 + "\n")
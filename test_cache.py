@@ -0,0 +1,219 @@
+"""Test the in-process caches (no API server or LLM needed)"""
+import asyncio
+import time
+
+from src.agent.triage_cache import canonicalize, _to_template, _from_template
+from src.cache import TTLCache, MISSING
+from src.tools.crm_cache import CRMCache
+
+def test_ttl_expiry():
+    """Entries expire after the cache TTL, or a per-entry TTL"""
+    print("\n" + "="*70)
+    print("Testing TTL expiry")
+    print("="*70)
+    
+    cache = TTLCache("test_ttl", maxsize=10, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == 1
+    
+    time.sleep(0.1)
+    print(f"After TTL: a={cache.get('a') is MISSING and 'expired'}, b={cache.get('b')}")
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+    assert cache.expirations == 1
+    print("✅ Expired entries are misses")
+
+def test_lru_eviction():
+    """Beyond maxsize the least recently used entry is evicted"""
+    print("\n" + "="*70)
+    print("Testing LRU eviction")
+    print("="*70)
+    
+    cache = TTLCache("test_lru", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")        # a is now more recent than b
+    cache.set("c", 3)
+    
+    print(f"Keys after eviction: {[k for k in 'abc' if cache.get(k) is not MISSING]}")
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1 and len(cache) == 2
+    print("✅ Least recently used entry evicted")
+
+def test_cached_none():
+    """None is a real value, distinct from a miss"""
+    cache = TTLCache("test_none", maxsize=2, ttl=60)
+    cache.set("a", None)
+    assert cache.get("a") is None
+    assert cache.get("missing") is MISSING
+    assert cache.hits == 1 and cache.misses == 1
+
+def test_canonicalize():
+    """Amounts, order IDs, dates and numbers become placeholders, in order of appearance"""
+    print("\n" + "="*70)
+    print("Testing query canonicalization")
+    print("="*70)
+    
+    canonical, slots = canonicalize("Refund  $19.99 and $1,299 for order #48213 on 2024-01-05, not $19.99 twice")
+    print(f"Canonical: {canonical}")
+    assert canonical == "refund <AMOUNT> and <AMOUNT> for order <ORDER_ID> on <DATE>, not <AMOUNT> twice"
+    assert slots == [
+        ("AMOUNT", "$19.99"), ("AMOUNT", "$1,299"), ("ORDER_ID", "#48213"),
+        ("DATE", "2024-01-05"), ("AMOUNT", "$19.99")
+    ]
+    
+    # Same wording with other values shares the cache key
+    other, _ = canonicalize("refund $5 and $250 for order #10001 on 2024-02-01, not $7 twice")
+    assert other == canonical
+    print("✅ Same canonical form for different values")
+
+def test_template_round_trip():
+    """A cached reasoning is stored with indexed placeholders and filled with the next query's values"""
+    print("\n" + "="*70)
+    print("Testing reasoning templates")
+    print("="*70)
+    
+    _, slots = canonicalize("Charged $19 and $199 for order #48213")
+    reasoning = "Refund $199 (not $19) for order 48213, see #48213"
+    template = _to_template(reasoning, slots)
+    print(f"Template: {template}")
+    # Longest value first, so $19 inside $199 is not replaced
+    assert template == "Refund <AMOUNT_1> (not <AMOUNT_0>) for order <ORDER_ID_2_CORE>, see <ORDER_ID_2>"
+    assert _from_template(template, slots) == reasoning
+    
+    # Repeated amounts map to the first slot holding that value
+    _, repeated = canonicalize("Charged $50 then $50 again")
+    assert _to_template("Two charges of $50", repeated) == "Two charges of <AMOUNT_0>"
+    
+    # A later query with the same canonical form gets its own entities back
+    _, new_slots = canonicalize("Charged $5 and $250 for order #10001")
+    filled = _from_template(template, new_slots)
+    print(f"Filled for the next query: {filled}")
+    assert filled == "Refund $250 (not $5) for order 10001, see #10001"
+    print("✅ Entities round trip through the template")
+
+def test_crm_single_flight():
+    """Concurrent misses for one user share one upstream call"""
+    print("\n" + "="*70)
+    print("Testing CRM single flight")
+    print("="*70)
+    
+    crm = CRMCache(enabled=True)
+    calls = []
+    
+    @crm.cached("profile")
+    async def get_profile(user_id: str):
+        calls.append(user_id)
+        await asyncio.sleep(0.05)
+        return {"user_id": user_id}
+    
+    async def run():
+        results = await asyncio.gather(*(get_profile("user_1234") for _ in range(10)))
+        assert all(result == {"user_id": "user_1234"} for result in results)
+        await get_profile("user_1234")      # cached now
+    
+    asyncio.run(run())
+    print(f"11 lookups -> {len(calls)} upstream call(s), coalesced {crm.coalesced}")
+    assert calls == ["user_1234"] and crm.coalesced == 9
+    print("✅ One upstream call per user")
+
+def test_crm_leader_timeout():
+    """The first caller timing out does not fail the callers sharing its lookup"""
+    print("\n" + "="*70)
+    print("Testing a CRM lookup whose first caller times out")
+    print("="*70)
+    
+    crm = CRMCache(enabled=True)
+    calls = []
+    
+    @crm.cached("orders")
+    async def get_orders(user_id: str):
+        calls.append(user_id)
+        await asyncio.sleep(0.1)
+        return [{"order_id": "12345"}]
+    
+    async def follower():
+        await asyncio.sleep(0.01)
+        return await asyncio.wait_for(get_orders("user_1234"), timeout=1)
+    
+    async def run():
+        return await asyncio.gather(
+            asyncio.wait_for(get_orders("user_1234"), timeout=0.02),
+            follower(),
+            return_exceptions=True
+        )
+    
+    leader, other = asyncio.run(run())
+    print(f"Leader: {type(leader).__name__}, follower: {other}")
+    assert isinstance(leader, asyncio.TimeoutError)
+    assert other == [{"order_id": "12345"}] and calls == ["user_1234"]
+    print("✅ Follower got the shared result")
+
+def test_crm_invalidate_in_flight():
+    """Invalidating mid-fetch: the stale result is not cached and later callers fetch again"""
+    print("\n" + "="*70)
+    print("Testing CRM invalidation during a lookup")
+    print("="*70)
+    
+    crm = CRMCache(enabled=True)
+    crm_data = {"plan": "free"}
+    calls = []
+    
+    @crm.cached("profile")
+    async def get_profile(user_id: str):
+        calls.append(user_id)
+        plan = crm_data["plan"]
+        await asyncio.sleep(0.05)
+        return {"user_id": user_id, "plan": plan}
+    
+    async def upgrade():
+        await asyncio.sleep(0.01)
+        crm_data["plan"] = "pro"
+        crm.invalidate("user_1234", "profile")
+        return await get_profile("user_1234")
+    
+    async def run():
+        stale, fresh = await asyncio.gather(get_profile("user_1234"), upgrade())
+        return stale, fresh, await get_profile("user_1234")
+    
+    stale, fresh, cached = asyncio.run(run())
+    print(f"In flight: {stale['plan']}, after invalidate: {fresh['plan']}, cached: {cached['plan']}")
+    assert stale["plan"] == "free"
+    assert fresh["plan"] == "pro" and cached["plan"] == "pro"
+    assert len(calls) == 2
+    print("✅ Stale lookup not cached")
+
+def test_crm_invalidate():
+    """Invalidation drops a user's entries; unknown resources are rejected"""
+    crm = CRMCache(enabled=True)
+    
+    @crm.cached("profile")
+    def get_profile(user_id: str):
+        return {"user_id": user_id}
+    
+    get_profile("user_1234")
+    assert crm.invalidate("user_1234", "profile") == 1
+    try:
+        crm.invalidate("user_1234", "profiles")
+        raise AssertionError("ValueError not raised")
+    except ValueError as e:
+        assert "profile" in str(e)
+
+if __name__ == "__main__":
+    print("\n🧪 Cache Tests")
+    
+    test_ttl_expiry()
+    test_lru_eviction()
+    test_cached_none()
+    test_canonicalize()
+    test_template_round_trip()
+    test_crm_single_flight()
+    test_crm_leader_timeout()
+    test_crm_invalidate_in_flight()
+    test_crm_invalidate()
+    
+    print("\n" + "="*70)
+    print("✅ All tests completed!")
+    print("="*70 + "\n")
@@ -0,0 +1,183 @@
+"""Test single-flight de-duplication and ticket_id replay (no API server or LLM needed)"""
+import asyncio
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from api.dedup import TriageDeduplicator, request_key
+from api.models import TicketRequest
+
+class FakeResponse(BaseModel):
+    ticket_id: str
+    run: int
+
+class FakeTriage:
+    """Counts graph runs; fails the first `failures` of them."""
+    
+    def __init__(self, delay: float = 0.05, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.runs = 0
+    
+    async def __call__(self, ticket: TicketRequest) -> FakeResponse:
+        self.runs += 1
+        run = self.runs
+        await asyncio.sleep(self.delay)
+        if run <= self.failures:
+            raise HTTPException(status_code=500, detail="Failed to process ticket: transient")
+        return FakeResponse(ticket_id=ticket.ticket_id or f"ticket_{run}", run=run)
+
+def test_request_key():
+    """Client ticket_id wins; otherwise identical content gives the same key"""
+    print("\n" + "="*70)
+    print("Testing request keys")
+    print("="*70)
+    
+    a = TicketRequest(user_id="user_1234", query="Refund for order #12345")
+    b = TicketRequest(user_id="user_1234", query="Refund for order #12345")
+    c = TicketRequest(user_id="user_5678", query="Refund for order #12345")
+    d = TicketRequest(ticket_id="T-1", user_id="user_1234", query="Refund for order #12345")
+    
+    assert request_key(a) == request_key(b)
+    assert request_key(a) != request_key(c)
+    assert request_key(d) == ("ticket_id", "T-1")
+    print("✅ Keys match for duplicates only")
+
+def test_inflight_coalescing():
+    """Concurrent duplicates share one run"""
+    print("\n" + "="*70)
+    print("Testing in-flight coalescing")
+    print("="*70)
+    
+    async def run():
+        dedup = TriageDeduplicator(enabled=True)
+        triage = FakeTriage()
+        ticket = TicketRequest(user_id="user_1234", query="Dashboard won't load")
+    
+        results = await asyncio.gather(*(dedup.run(ticket, lambda: triage(ticket)) for _ in range(10)))
+        print(f"10 duplicates -> {triage.runs} run(s), coalesced {dedup.coalesced}")
+        assert triage.runs == 1
+        assert len({result.run for result in results}) == 1
+        # Content keys are not replayed once the run is over
+        assert dedup.stats()["stored_results"] == 0
+        await dedup.run(ticket, lambda: triage(ticket))
+        assert triage.runs == 2
+    
+    asyncio.run(run())
+    print("✅ One run shared by all duplicates")
+
+def test_coalesced_ticket_ids():
+    """Duplicates matched by content share the run but keep their own ticket IDs"""
+    print("\n" + "="*70)
+    print("Testing ticket IDs of coalesced duplicates")
+    print("="*70)
+    
+    async def run():
+        dedup = TriageDeduplicator(enabled=True)
+        runs = []
+        ticket = TicketRequest(user_id="user_1234", query="Refund for order #12345")
+    
+        async def execute(ticket_id):
+            runs.append(ticket_id)
+            await asyncio.sleep(0.05)
+            return FakeResponse(ticket_id=ticket_id, run=len(runs))
+    
+        first, second = await asyncio.gather(
+            dedup.run(ticket, lambda: execute("job_a"), "job_a"),
+            dedup.run(ticket, lambda: execute("job_b"), "job_b")
+        )
+        print(f"Runs: {runs}, ticket IDs: {first.ticket_id}, {second.ticket_id}")
+        assert runs == ["job_a"] and dedup.coalesced == 1
+        assert first.ticket_id == "job_a" and second.ticket_id == "job_b"
+        assert first.run == second.run
+    
+    asyncio.run(run())
+    print("✅ Each caller got its own ticket ID")
+
+def test_ticket_id_replay():
+    """A ticket_id seen recently gets the stored response"""
+    print("\n" + "="*70)
+    print("Testing ticket_id replay")
+    print("="*70)
+    
+    async def run():
+        dedup = TriageDeduplicator(enabled=True, ttl=60)
+        triage = FakeTriage()
+        ticket = TicketRequest(ticket_id="T-100", user_id="user_1234", query="Why was I charged twice?")
+    
+        first = await dedup.run(ticket, lambda: triage(ticket))
+        second = await dedup.run(ticket, lambda: triage(ticket))
+        print(f"Runs: {triage.runs}, replayed: {dedup.replayed}")
+        assert triage.runs == 1 and dedup.replayed == 1
+        assert second == first
+    
+        # Expired results run again
+        dedup = TriageDeduplicator(enabled=True, ttl=0.05)
+        await dedup.run(ticket, lambda: triage(ticket))
+        await asyncio.sleep(0.1)
+        await dedup.run(ticket, lambda: triage(ticket))
+        assert triage.runs == 3
+    
+    asyncio.run(run())
+    print("✅ Duplicate ticket_id replayed until the TTL")
+
+def test_failure_not_cached():
+    """A failed shared run fails every waiter once, then a retry runs again"""
+    print("\n" + "="*70)
+    print("Testing that failures are not cached")
+    print("="*70)
+    
+    async def run():
+        dedup = TriageDeduplicator(enabled=True)
+        triage = FakeTriage(failures=1)
+        ticket = TicketRequest(ticket_id="T-200", user_id="user_1234", query="Password reset email never arrives")
+    
+        results = await asyncio.gather(
+            *(dedup.run(ticket, lambda: triage(ticket)) for _ in range(3)),
+            return_exceptions=True
+        )
+        print(f"Shared failure: {[type(r).__name__ for r in results]}, runs: {triage.runs}")
+        assert triage.runs == 1
+        assert all(isinstance(r, HTTPException) for r in results)
+    
+        retry = await dedup.run(ticket, lambda: triage(ticket))
+        print(f"Retry: run {retry.run}")
+        assert triage.runs == 2 and retry.run == 2
+    
+    asyncio.run(run())
+    print("✅ Retry after a failure triaged again")
+
+def test_cancelled_waiter():
+    """A caller that gives up does not cancel the run for the others"""
+    print("\n" + "="*70)
+    print("Testing a cancelled waiter")
+    print("="*70)
+    
+    async def run():
+        dedup = TriageDeduplicator(enabled=True)
+        triage = FakeTriage(delay=0.1)
+        ticket = TicketRequest(user_id="user_1234", query="Upgrade to the Pro plan")
+    
+        impatient = asyncio.wait_for(dedup.run(ticket, lambda: triage(ticket)), timeout=0.01)
+        patient = dedup.run(ticket, lambda: triage(ticket))
+        results = await asyncio.gather(impatient, patient, return_exceptions=True)
+        print(f"Results: {[type(r).__name__ for r in results]}")
+        assert isinstance(results[0], asyncio.TimeoutError)
+        assert isinstance(results[1], FakeResponse) and triage.runs == 1
+    
+    asyncio.run(run())
+    print("✅ Shared run survived the timeout")
+
+if __name__ == "__main__":
+    print("\n🧪 De-duplication Tests")
+    
+    test_request_key()
+    test_inflight_coalescing()
+    test_coalesced_ticket_ids()
+    test_ticket_id_replay()
+    test_failure_not_cached()
+    test_cancelled_waiter()
+    
+    print("\n" + "="*70)
+    print("✅ All tests completed!")
+    print("="*70 + "\n")
@@ -0,0 +1,119 @@
+"""Test rule-based entity extraction and its LLM fallback (no LLM calls)"""
+from langchain_core.messages import AIMessage
+
+import src.agent.entity_extractor as entity_extractor
+from src.agent.entity_extractor import extract_entities_rule_based
+from src.agent.model_tiers import TieredResponse
+
+def test_order_ids():
+    """Order IDs are found with or without '#'"""
+    print("\n" + "="*70)
+    print("Testing order IDs")
+    print("="*70)
+    
+    for query in ("Refund for order #12345", "Refund for order 12345", "order number 98765 never arrived"):
+        entities, unresolved = extract_entities_rule_based(query)
+        print(f"{query!r} -> {entities['order_id']}")
+        assert entities["order_id"] in ("12345", "98765")
+        assert unresolved == []
+    print("✅ Order IDs extracted")
+
+def test_amounts():
+    """Dollar amounts parse with thousands separators; bare numbers are left to the LLM"""
+    print("\n" + "="*70)
+    print("Testing amounts")
+    print("="*70)
+    
+    entities, unresolved = extract_entities_rule_based("I was charged $1,299.99 for order #12345")
+    print(f"$1,299.99 -> {entities['amount']}")
+    assert entities["amount"] == 1299.99 and unresolved == []
+    
+    # "99" could be an amount or an order number: not guessed
+    entities, unresolved = extract_entities_rule_based("I was charged 99 for order #12345")
+    print(f"charged 99 -> amount {entities['amount']}, unresolved {unresolved}")
+    assert entities["amount"] is None and entities["order_id"] == "12345"
+    assert unresolved == ["amount"]
+    
+    # Dates and numbers with units are not ambiguous
+    _, unresolved = extract_entities_rule_based("Upload took 30 seconds on 2024-01-05")
+    assert unresolved == []
+    print("✅ Amounts need a '$'")
+
+def test_urgency():
+    """Urgency keywords are matched as words, case-insensitively"""
+    print("\n" + "="*70)
+    print("Testing urgency keywords")
+    print("="*70)
+    
+    entities, _ = extract_entities_rule_based("URGENT: dashboard is down, need help ASAP")
+    print(f"Keywords: {entities['urgency_keywords']}")
+    assert entities["urgency_keywords"] == ["asap", "down", "urgent"]
+    assert entities["has_urgent_language"] is True
+    
+    entities, _ = extract_entities_rule_based("The download page is slow")
+    assert entities["urgency_keywords"] == [] and entities["has_urgent_language"] is False
+    print("✅ Urgency detected")
+
+def test_unresolved_fields():
+    """Fields the rules can't decide are listed for the LLM"""
+    print("\n" + "="*70)
+    print("Testing the unresolved field list")
+    print("="*70)
+    
+    cases = {
+        "I was charged 99": ["order_id", "amount"],
+        "Getting an error when I use the export feature": ["error_message", "product_name"],
+        "Error: \"Upload failed\" on file upload": [],
+        "Refund for order #12345 of $49.99": [],
+    }
+    for query, expected in cases.items():
+        _, unresolved = extract_entities_rule_based(query)
+        print(f"{query!r} -> {unresolved}")
+        assert unresolved == expected
+    print("✅ Unresolved fields listed")
+
+def test_llm_fallback():
+    """Hybrid mode calls the LLM only for unresolved fields, and rule results win elsewhere"""
+    print("\n" + "="*70)
+    print("Testing the LLM fallback")
+    print("="*70)
+    
+    prompts = []
+    
+    def fake_invoke(node, model, llm, escalation, messages, state, parse):
+        prompts.append(messages[-1].content)
+        answer = '{"order_id": "99", "amount": 99.0, "urgency_keywords": []}'
+        return TieredResponse(AIMessage(content=answer), model, {})
+    
+    original = entity_extractor.invoke_tiered, entity_extractor.EXTRACTION_MODE
+    entity_extractor.invoke_tiered, entity_extractor.EXTRACTION_MODE = fake_invoke, "hybrid"
+    try:
+        state = {"query": "Refund for order #12345"}
+        result = entity_extractor.extract_entities(state)
+        assert result["extraction_path"] == "rules" and prompts == []
+    
+        state = {"query": "I was charged 99 for order #12345"}
+        result = entity_extractor.extract_entities(state)
+    finally:
+        entity_extractor.invoke_tiered, entity_extractor.EXTRACTION_MODE = original
+    
+    print(f"Prompt: {prompts[0]!r}")
+    print(f"Path: {result['extraction_path']}, entities: {result['entities']}")
+    assert prompts[0].endswith("Only these fields are needed: amount")
+    assert result["extraction_path"] == "rules+llm"
+    assert result["entities"]["amount"] == 99.0
+    assert result["entities"]["order_id"] == "12345"
+    print("✅ LLM asked for the unresolved field only")
+
+if __name__ == "__main__":
+    print("\n🧪 Entity Extraction Tests")
+    
+    test_order_ids()
+    test_amounts()
+    test_urgency()
+    test_unresolved_fields()
+    test_llm_fallback()
+    
+    print("\n" + "="*70)
+    print("✅ All tests completed!")
+    print("="*70 + "\n")
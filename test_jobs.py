@@ -0,0 +1,141 @@
+"""Test the async job queue and worker pool (no API server or LLM needed)"""
+import asyncio
+
+import httpx
+from pydantic import BaseModel
+
+from api.jobs import JobQueue, QueueFull
+from api.models import TicketRequest
+
+class FakeResponse(BaseModel):
+    ticket_id: str
+    intent: str
+
+async def fake_triage(ticket: TicketRequest, prefetched_context=None, ticket_id=None) -> FakeResponse:
+    await asyncio.sleep(0.01)
+    return FakeResponse(ticket_id=ticket_id, intent="billing")
+
+async def wait_finished(queue: JobQueue, job_id: str, timeout: float = 5.0):
+    async def poll():
+        while queue.get(job_id).status in ("queued", "running"):
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+    return queue.get(job_id)
+
+def test_failing_callback():
+    """A callback that can't be delivered must not take its worker down"""
+    print("\n" + "="*70)
+    print("Testing a failing job callback")
+    print("="*70)
+    
+    async def run():
+        queue = JobQueue(fake_triage, workers=1, maxsize=10)
+        await queue.start()
+        try:
+            ticket = TicketRequest(user_id="user_1234", query="Refund for order #12345")
+    
+            # Invalid port: httpx raises before any request is sent
+            [bad] = queue.submit([ticket], callback_url="http://localhost:99999/hook")
+            bad = await wait_finished(queue, bad.job_id)
+            await asyncio.sleep(0.1)
+            print(f"Job with bad callback: {bad.status}")
+            assert bad.status == "succeeded"
+    
+            # The only worker is still alive and picks up the next job
+            [good] = queue.submit([ticket])
+            good = await wait_finished(queue, good.job_id)
+            print(f"Job submitted after it: {good.status}")
+            assert good.status == "succeeded"
+            assert all(not task.done() for task in queue._tasks)
+        finally:
+            await queue.stop()
+    
+    asyncio.run(run())
+    print("✅ Worker survived the failing callback")
+
+def test_failed_job():
+    """A handler error marks the job failed and the worker keeps going"""
+    print("\n" + "="*70)
+    print("Testing a failing job")
+    print("="*70)
+    
+    async def flaky(ticket, prefetched_context=None, ticket_id=None):
+        if ticket.query == "boom":
+            raise RuntimeError("upstream unavailable")
+        return await fake_triage(ticket, prefetched_context, ticket_id)
+    
+    async def run():
+        queue = JobQueue(flaky, workers=1, maxsize=10)
+        await queue.start()
+        try:
+            failed, ok = queue.submit([
+                TicketRequest(user_id="user_1", query="boom"),
+                TicketRequest(user_id="user_2", query="Dashboard won't load")
+            ])
+            failed = await wait_finished(queue, failed.job_id)
+            ok = await wait_finished(queue, ok.job_id)
+            print(f"Statuses: {failed.status}, {ok.status} ({failed.error})")
+            assert failed.status == "failed" and failed.error == "upstream unavailable"
+            assert ok.status == "succeeded" and ok.result.ticket_id == ok.ticket_id
+        finally:
+            await queue.stop()
+    
+    asyncio.run(run())
+    print("✅ Failure recorded, next job processed")
+
+def test_queue_full():
+    """A submission the queue can't hold is refused whole, with 429 from the API"""
+    print("\n" + "="*70)
+    print("Testing a full job queue")
+    print("="*70)
+    
+    import api.service as service
+    
+    async def run():
+        # No workers, so nothing drains the queue
+        queue = JobQueue(fake_triage, workers=0, maxsize=2)
+        await queue.start()
+        original, service.job_queue = service.job_queue, queue
+        try:
+            transport = httpx.ASGITransport(app=service.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                tickets = [{"user_id": f"user_{i}", "query": "Why was I charged twice?"} for i in range(3)]
+                response = await client.post("/triage/jobs", json={"tickets": tickets})
+                print(f"Status: {response.status_code}, Retry-After: {response.headers.get('retry-after')}")
+                assert response.status_code == 429
+                assert response.headers.get("retry-after") == "1"
+                assert queue.stats()["queued"] == 0
+    
+                response = await client.post("/triage/jobs", json={"tickets": tickets[:2]})
+                print(f"Two tickets: {response.status_code}")
+                assert response.status_code == 202
+    
+                try:
+                    queue.submit([TicketRequest(**tickets[2])])
+                    raise AssertionError("QueueFull not raised")
+                except QueueFull:
+                    pass
+    
+                response = await client.post(
+                    "/triage/jobs",
+                    json={"tickets": tickets[:1], "callback_url": "not a url"}
+                )
+                print(f"Malformed callback_url: {response.status_code}")
+                assert response.status_code == 422
+        finally:
+            service.job_queue = original
+            await queue.stop()
+    
+    asyncio.run(run())
+    print("✅ Full queue refused the whole submission")
+
+if __name__ == "__main__":
+    print("\n🧪 Job Queue Tests")
+    
+    test_failing_callback()
+    test_failed_job()
+    test_queue_full()
+    
+    print("\n" + "="*70)
+    print("✅ All tests completed!")
+    print("="*70 + "\n")
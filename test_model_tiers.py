@@ -0,0 +1,98 @@
+"""Test small-model-first calls and escalation to the larger model (no LLM calls)"""
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.agent.model_tiers import ESCALATION_MODEL, _escalation_reason, ainvoke_tiered, invoke_tiered
+
+class FakeLLM:
+    """Returns a fixed answer with usage metadata and counts its calls."""
+    
+    def __init__(self, content: str, input_tokens: int = 100, output_tokens: int = 20):
+        self.content = content
+        self.usage = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+        self.calls = 0
+    
+    def invoke(self, messages):
+        self.calls += 1
+        return AIMessage(content=self.content, response_metadata={"usage": self.usage})
+    
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+def parse(response):
+    return json.loads(response.content)
+
+MESSAGES = [HumanMessage(content="Classify: I was charged twice")]
+
+def test_low_confidence_escalates():
+    """A confidence below the threshold re-runs the prompt on the escalation model"""
+    print("\n" + "="*70)
+    print("Testing escalation on low confidence")
+    print("="*70)
+    
+    small = FakeLLM('{"intent": "billing", "confidence": 0.4}')
+    large = FakeLLM('{"intent": "billing", "confidence": 0.95}', input_tokens=100, output_tokens=30)
+    
+    tiered = invoke_tiered("test_classifier", "small-model", small, large, MESSAGES, {}, parse,
+                           confidence_threshold=0.7)
+    print(f"Model: {tiered.model}, usage: {tiered.update['token_usage']}")
+    assert small.calls == 1 and large.calls == 1
+    assert tiered.model == ESCALATION_MODEL
+    assert parse(tiered.response)["confidence"] == 0.95
+    # Both calls are paid for
+    assert tiered.update["total_tokens"] == 250
+    assert tiered.update["token_usage"]["test_classifier"] == {"input_tokens": 200, "output_tokens": 50}
+    
+    # Confident answers stay on the small model
+    small = FakeLLM('{"intent": "billing", "confidence": 0.9}')
+    tiered = asyncio.run(ainvoke_tiered("test_classifier", "small-model", small, large, MESSAGES, {}, parse,
+                                        confidence_threshold=0.7))
+    assert tiered.model == "small-model" and large.calls == 1
+    print("✅ Escalated only below the threshold")
+
+def test_budget_exhausted():
+    """No escalation when the request's token budget can't cover it"""
+    print("\n" + "="*70)
+    print("Testing escalation with the budget spent")
+    print("="*70)
+    
+    small = FakeLLM('{"intent": "billing", "confidence": 0.4}')
+    large = FakeLLM('{"intent": "billing", "confidence": 0.95}')
+    state = {"token_budget": 300, "total_tokens": 100}
+    
+    tiered = invoke_tiered("test_classifier", "small-model", small, large, MESSAGES, state, parse,
+                           confidence_threshold=0.7)
+    print(f"Model: {tiered.model}, fallbacks: {tiered.update.get('budget_fallbacks')}")
+    assert large.calls == 0
+    assert tiered.model == "small-model"
+    assert tiered.update["budget_fallbacks"] == ["test_classifier"]
+    assert tiered.update["total_tokens"] == 120
+    print("✅ Kept the small model's answer")
+
+def test_escalation_reason():
+    """Answers that aren't a JSON object count as parse errors"""
+    cases = {
+        '{"confidence": 0.9}': None,
+        '{"confidence": 0.5}': "low_confidence",
+        '{"confidence": "high"}': "parse_error",
+        '["billing"]': "parse_error",
+        '"billing"': "parse_error",
+        "not json": "parse_error",
+    }
+    for content, expected in cases.items():
+        assert _escalation_reason(AIMessage(content=content), parse, 0.7) == expected, content
+    # Without a threshold only parsing matters
+    assert _escalation_reason(AIMessage(content='{"confidence": 0.1}'), parse, None) is None
+
+if __name__ == "__main__":
+    print("\n🧪 Model Tier Tests")
+    
+    test_low_confidence_escalates()
+    test_budget_exhausted()
+    test_escalation_reason()
+    
+    print("\n" + "="*70)
+    print("✅ All tests completed!")
+    print("="*70 + "\n")
@@ -0,0 +1,72 @@
+"""Test the precomputed routing policy table against the rules written as if/elif (no LLM calls)"""
+import itertools
+from typing import Optional, Tuple
+
+from src.agent.routing_policy import INTENTS, TIERS, routing_policy
+
+def expected_route(intent: str, tier: str, has_faqs: bool, urgent: bool,
+                   confidence: float) -> Optional[Tuple[str, Optional[str], str]]:
+    """
+    The routing rules as a plain if/elif chain: (action, team, priority),
+    or None where the LLM router decides.
+    """
+    if confidence < 0.8:
+        return None
+    if urgent and intent in ("billing", "technical"):
+        if tier == "enterprise":
+            return "escalate", f"{intent}_tier2", "critical"
+        return "escalate", f"{intent}_tier1", "high"
+    elif urgent and intent == "account":
+        return "escalate", "account", "high"
+    elif tier == "enterprise" and intent in ("billing", "technical"):
+        return "escalate", f"{intent}_tier2", "high"
+    elif intent in ("account", "billing") and tier in ("free", "pro") and has_faqs and not urgent:
+        # Auto-resolving needs a more confident classification; below it the LLM decides
+        if confidence < 0.9:
+            return None
+        return "auto_resolve", None, "low"
+    elif intent == "billing":
+        return "escalate", "billing_tier1", "medium"
+    elif intent == "technical":
+        return "escalate", "technical_tier1", "medium"
+    elif intent == "account":
+        return "escalate", "account", "medium"
+    elif intent == "sales":
+        return "escalate", "sales", "high" if tier == "enterprise" else "medium"
+    return None
+
+def test_policy_matches_chain():
+    """Every intent x tier x FAQs x urgency x confidence combination routes the same way"""
+    print("\n" + "="*70)
+    print("Testing the routing policy table")
+    print("="*70)
+    
+    combinations = list(itertools.product(INTENTS, TIERS, (True, False), (True, False), (0.5, 0.85, 0.95)))
+    by_policy = 0
+    for intent, tier, has_faqs, urgent, confidence in combinations:
+        decision = routing_policy.lookup(intent, tier, has_faqs, urgent, confidence)
+        got = None if decision is None else (decision["action"], decision["team"], decision["priority"])
+        expected = expected_route(intent, tier, has_faqs, urgent, confidence)
+        assert got == expected, f"{(intent, tier, has_faqs, urgent, confidence)}: {got} != {expected}"
+        by_policy += got is not None
+    
+    print(f"{len(combinations)} combinations, {by_policy} routed by the policy, "
+          f"{len(combinations) - by_policy} left to the LLM")
+    print("✅ Policy table matches the rules")
+
+def test_unknown_features():
+    """Features outside the table fall through to the LLM"""
+    assert routing_policy.lookup("refund", "pro", True, False, 0.99) is None
+    assert routing_policy.lookup("billing", "gold", True, False, 0.99) is None
+    # A missing confidence counts as 0
+    assert routing_policy.lookup("billing", "pro", False, False, None) is None
+
+if __name__ == "__main__":
+    print("\n🧪 Routing Policy Tests")
+    
+    test_policy_matches_chain()
+    test_unknown_features()
+    
+    print("\n" + "="*70)
+    print("✅ All tests completed!")
+    print("="*70 + "\n")